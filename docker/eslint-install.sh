@@ -1,4 +1,5 @@
 #!/bin/bash
+set -e -o pipefail
 
 # Check for /src/package.json if it doesn't exist exit.
 if [ ! -e /src/package.json  ]; then
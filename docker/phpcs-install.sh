@@ -1,4 +1,6 @@
 #!/bin/sh
+set -e
+
 cd /tool || exit 1
 
 php /tool/composer.phar require "$1"
@@ -0,0 +1,180 @@
+from __future__ import absolute_import
+import errno
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# The active lint result cache. See configure_results()
+_results = {
+    'cache': None,
+}
+
+# The active GitHub response cache. See configure_responses()
+_responses = {
+    'cache': None,
+}
+
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock on `path` + '.lock'
+
+    Locks are shared between all processes on a host, and are
+    released when the context exits or the process dies.
+    """
+    ensure_dir(os.path.dirname(path))
+    with open(path + '.lock', 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def ensure_dir(path):
+    """Create a directory if it doesn't exist yet."""
+    if not path:
+        return
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def read_json(path, default=None):
+    """Read a JSON file, returning `default` if it is missing or invalid."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    """Atomically replace the JSON file at `path`."""
+    dirname = os.path.dirname(path)
+    ensure_dir(dirname)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname or None, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, path)
+    except Exception:
+        log.exception('Could not write %s', path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def configure_results(config):
+    """Create the lint result cache from application config.
+
+    Returns None when RESULT_CACHE is disabled.
+    """
+    if not config.get('RESULT_CACHE'):
+        _results['cache'] = None
+        return None
+    path = config.get('RESULT_CACHE_DIR')
+    if not path:
+        path = os.path.join(config.get('WORKSPACE', '/tmp'), '.results')
+    budget = int(config.get('RESULT_CACHE_BUDGET', 0) or 0)
+    _results['cache'] = ResultCache(path, budget)
+    return _results['cache']
+
+
+def results():
+    """Get the active lint result cache, or None if it is disabled."""
+    return _results['cache']
+
+
+def configure_responses(config):
+    """Create the GitHub response cache from application config.
+
+    Returns None when GITHUB_CACHE is disabled.
+    """
+    if not config.get('GITHUB_CACHE'):
+        _responses['cache'] = None
+        return None
+    path = config.get('GITHUB_CACHE_DIR')
+    if not path:
+        path = os.path.join(config.get('WORKSPACE', '/tmp'), '.github')
+    budget = int(config.get('GITHUB_CACHE_BUDGET', 0) or 0)
+    _responses['cache'] = ResultCache(path, budget)
+    return _responses['cache']
+
+
+def responses():
+    """Get the active GitHub response cache, or None if it is disabled."""
+    return _responses['cache']
+
+
+class ResultCache(object):
+    """Store lint results on disk by key.
+
+    Each entry is a JSON file. Entries are touched when they are read
+    so that evict() can remove the least recently used entries once
+    the cache is larger than `budget` bytes.
+    """
+
+    def __init__(self, path, budget=0):
+        self.path = path
+        self.budget = budget
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[0:2], key + '.json')
+
+    def get(self, key):
+        """Get the entry for key, or None if there isn't one."""
+        path = self._entry_path(key)
+        data = read_json(path)
+        if data is not None:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return data
+
+    def set(self, key, value):
+        """Store the entry for key."""
+        write_json(self._entry_path(key), value)
+
+    def evict(self):
+        """Remove the least recently used entries that exceed the budget.
+
+        Returns the number of removed entries.
+        """
+        if not self.budget:
+            return 0
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total += stat.st_size
+                entries.append((stat.st_mtime, path, stat.st_size))
+
+        removed = 0
+        for _, path, size in sorted(entries):
+            if total <= self.budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            log.info('Removed %s cache entries from %s', removed, self.path)
+        return removed
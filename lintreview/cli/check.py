@@ -0,0 +1,130 @@
+from __future__ import absolute_import
+import json
+import logging
+import os
+import sys
+
+import lintreview.cache as cache
+import lintreview.docker as docker
+import lintreview.git as git
+import lintreview.timing as timing
+import lintreview.tools as tools
+from lintreview.config import build_review_config, load_config
+from lintreview.diff import parse_diff, parse_diff_lines
+from lintreview.review import Problems
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('json', 'quickfix')
+
+
+def check(args):
+    """Review the changes in a local checkout without github.
+
+    Exits with 1 when problems are found, and 2 when the review fails.
+    """
+    try:
+        problems, summary = run_check(
+            args.path,
+            base=args.base,
+            diff_file=args.diff,
+            lintrc_file=args.lintrc,
+            all_lines=args.all)
+    except Exception as e:
+        sys.stderr.write('Check failed\n')
+        sys.stderr.write(str(e) + '\n')
+        sys.exit(2)
+
+    if args.format == 'quickfix':
+        output = format_quickfix(problems)
+    else:
+        output = format_json(problems)
+    sys.stdout.write(output)
+    if args.timings:
+        sys.stderr.write(json.dumps(summary, indent=2) + '\n')
+    if len(problems):
+        sys.exit(1)
+
+
+def run_check(path, base=None, diff_file=None, lintrc_file=None,
+              all_lines=False):
+    """Run the configured tools on the changes in the checkout at `path`.
+
+    The changes are read from `diff_file`, or from the diff between
+    `base` and HEAD. The .lintrc in `path` is used unless `lintrc_file`
+    is given. Returns the Problems found and a timing summary.
+    """
+    path = os.path.realpath(path)
+    app_config = load_config()
+    docker.configure(app_config)
+    cache.configure_results(app_config)
+
+    with timing.record() as timings:
+        with timing.span('load_changes'):
+            changes = load_changes(path, base, diff_file)
+        lintrc = read_file(lintrc_file or os.path.join(path, '.lintrc'))
+        config = build_review_config(lintrc, app_config)
+        if not config.linters():
+            raise ValueError('No linters are configured in the .lintrc')
+
+        problems = Problems(changes)
+        tool_list = tools.factory(config, problems, path)
+        files = changes.get_files(ignore_patterns=config.ignore_patterns())
+        timing.count('files', len(files))
+        with timing.span('run_tools'):
+            tools.run(tool_list, files, [], config.max_parallel_containers())
+        if not all_lines:
+            problems.limit_to_changes()
+        timing.count('problems', len(problems))
+
+    results = cache.results()
+    if results is not None:
+        results.evict()
+    return problems, timings.summary(path=path)
+
+
+def load_changes(path, base=None, diff_file=None):
+    """Get the DiffCollection to review from a diff file
+    or from the commits since `base`.
+    """
+    if diff_file == '-':
+        return parse_diff(sys.stdin.read())
+    if diff_file:
+        return parse_diff(read_file(diff_file))
+    if not base:
+        raise ValueError('Either a base ref or a diff file is required.')
+    return parse_diff_lines(git.diff_lines(path, base, 'HEAD'))
+
+
+def read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def format_json(problems):
+    data = []
+    for problem in problems:
+        data.append({
+            'filename': getattr(problem, 'filename', None),
+            'line': getattr(problem, 'line', None),
+            'level': problem.level,
+            'body': problem.body,
+        })
+    return json.dumps(data, indent=2) + '\n'
+
+
+def format_quickfix(problems):
+    """Format problems as `filename:line: message` lines
+    that editors can load into a quickfix list.
+    """
+    lines = []
+    for problem in problems:
+        body = ' '.join(problem.body.split('\n'))
+        filename = getattr(problem, 'filename', None)
+        if filename:
+            lines.append(u'{}:{}: {}'.format(filename, problem.line, body))
+        else:
+            lines.append(body)
+    if not lines:
+        return ''
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,6 @@
 import argparse
 
+from lintreview.cli.check import check, FORMATS
 from lintreview.cli.handlers import (
     register_hook,
     remove_hook,
@@ -22,6 +23,7 @@ def create_parser():
     add_unregister_command(commands)
     add_org_register_command(commands)
     add_org_unregister_command(commands)
+    add_check_command(commands)
 
     return parser
 
@@ -102,3 +104,47 @@ def add_org_unregister_command(subcommands_parser):
     remove.add_argument('org_name',
                         help="The login name of the organization.")
     remove.set_defaults(func=remove_org_hook)
+
+
+def add_check_command(subcommands_parser):
+    desc = (
+        "Review the changes in a local checkout without github.\n"
+        "The tools in the .lintrc are run on the files changed since\n"
+        "the base ref, or in the diff file.\n"
+    )
+
+    check_parser = subcommands_parser.add_parser('check', help=desc)
+    source = check_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        '-b', '--base',
+        help="The ref to review the changes since, e.g. origin/master. "
+             "Committed changes between the merge base and HEAD "
+             "are reviewed.")
+    source.add_argument(
+        '-d', '--diff',
+        help="A file containing the output of `git diff` to review. "
+             "Use - to read the diff from stdin.")
+    check_parser.add_argument(
+        '-c', '--lintrc',
+        help="The .lintrc file to use. Defaults to the .lintrc "
+             "in the checkout.")
+    check_parser.add_argument(
+        '-f', '--format',
+        choices=FORMATS,
+        default='json',
+        help="The output format. Defaults to json.")
+    check_parser.add_argument(
+        '--all',
+        action='store_true',
+        help="Report problems on all lines of the changed files, "
+             "not only the changed lines.")
+    check_parser.add_argument(
+        '--timings',
+        action='store_true',
+        help="Write the time spent in each stage and tool to stderr.")
+    check_parser.add_argument(
+        'path',
+        nargs='?',
+        default='.',
+        help="The checkout to review. Defaults to the current directory.")
+    check_parser.set_defaults(func=check)
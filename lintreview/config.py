@@ -1,4 +1,6 @@
 from __future__ import absolute_import
+import hashlib
+import json
 import os
 import logging.config
 
@@ -73,6 +75,40 @@ def boolean_value(value):
     raise ValueError(u'Could not convert `{}` to a boolean'.format(value))
 
 
+def bytes_value(value):
+    """Convert sizes like `512m` or `2g` into a number of bytes."""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = str(value).strip().lower().rstrip('b')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+# Resource limits tools can set in their .lintrc section. Each limit
+# maps to the application setting that provides its default and
+# maximum value.
+TOOL_LIMITS = (
+    ('timeout', 'TOOL_TIMEOUT', int),
+    ('cpus', 'TOOL_CPUS', float),
+    ('cpu_shares', 'TOOL_CPU_SHARES', int),
+    ('memory', 'TOOL_MEMORY_LIMIT', bytes_value),
+    ('pids_limit', 'TOOL_PIDS_LIMIT', int),
+)
+
+
+def limit_value(convert, value):
+    """Convert a resource limit, returning None for unset limits."""
+    if value is None or value == '':
+        return None
+    try:
+        value = convert(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    return value
+
+
 class ReviewConfig(object):
     """
     Provides a domain level API to a application
@@ -196,6 +232,51 @@ class ReviewConfig(object):
             return 'failure' if value else 'success'
         return 'failure'
 
+    def max_parallel_containers(self):
+        """Get the number of tool containers that can run at once.
+        """
+        try:
+            return max(1, int(self._data['MAX_PARALLEL_CONTAINERS']))
+        except Exception:
+            return 1
+
+    def sparse_checkout(self):
+        """Check whether reviews should only check out changed directories.
+        """
+        try:
+            return boolean_value(self._data['GIT_SPARSE_CHECKOUT'])
+        except Exception:
+            return False
+
+    def tool_limits(self, tool):
+        """Get the container resource limits for a tool.
+
+        Limits in the tool's .lintrc section can lower the limits
+        in the application config but not exceed them.
+        """
+        options = self.linter_config(tool)
+        limits = {}
+        for option, setting, convert in TOOL_LIMITS:
+            maximum = limit_value(convert, self._data.get(setting))
+            value = limit_value(convert, options.get(option))
+            if value and maximum:
+                value = min(value, maximum)
+            value = value or maximum
+            if value:
+                limits[option] = value
+        return limits
+
+    def fingerprint(self):
+        """Get a hash of the repository configuration.
+
+        Changes to the linters, their options, or the review settings
+        change the fingerprint.
+        """
+        sections = ('linters', 'files', 'branches', 'fixers', 'review')
+        data = dict((k, self._data.get(k)) for k in sections)
+        data = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf8')).hexdigest()
+
     def get(self, key, default=None):
         """Dict compatibility accessor for application config data
         """
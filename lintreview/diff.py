@@ -1,8 +1,13 @@
 from __future__ import absolute_import
+import codecs
 import fnmatch
 import re
 import logging
+import six
+from array import array
+from bisect import bisect_left
 from collections import namedtuple
+from itertools import chain
 
 log = logging.getLogger(__name__)
 
@@ -21,33 +26,118 @@ def parse_diff(text):
     """
     if not text:
         raise ParseError('No diff provided')
-    file_pattern = r'diff \-\-git a/.* b/.*'
-    blocks = re.split(file_pattern, text)
-    diffs = []
-    for chunk in blocks:
-        if len(chunk) == 0:
+    return parse_diff_lines(text.split('\n'))
+
+
+def parse_diff_lines(lines):
+    """Parse the lines of `git diff` output into a DiffCollection.
+
+    `lines` can be any iterable of lines without line endings, like
+    the output of a running git process. Each file's diff is parsed
+    once its lines have been read.
+    """
+    return DiffCollection(_file_diffs(lines))
+
+
+def _file_diffs(lines):
+    """Split diff lines by file and parse each file's diff"""
+    found = 0
+    filename = None
+    chunk = []
+    for line in lines:
+        if line.startswith('diff --git '):
+            if chunk:
+                yield parse_file_diff('\n'.join(chunk), filename)
+                found += 1
+            filename = _header_filename(line)
+            chunk = ['']
             continue
-        diffs.append(parse_file_diff(chunk))
-    if not diffs:
+        chunk.append(line)
+    if chunk and (found or filename or any(chunk)):
+        yield parse_file_diff('\n'.join(chunk), filename)
+        found += 1
+    if not found:
         msg = u'Could not parse any diffs from provided diff text.'
         raise ParseError(msg)
 
-    return DiffCollection(diffs)
 
+# Extended header lines that git emits for files without a text patch,
+# e.g. for mode changes, renames and binary files.
+EXTENDED_HEADERS = ('old mode', 'new mode', 'deleted file mode',
+                    'new file mode', 'similarity index',
+                    'dissimilarity index', 'rename from', 'rename to',
+                    'copy from', 'copy to', 'Binary files')
 
-def parse_file_diff(chunk):
-    filename = None
+
+def _header_filename(line):
+    """Get the new filename from a `diff --git a/old b/new` line"""
+    _, sep, name = line.rpartition(' b/')
+    if not sep:
+        return None
+    return _unquote(name)
+
+
+def _unquote(name):
+    """Undo the C style quoting git uses for unusual filenames"""
+    name = name.rstrip('\t')
+    if len(name) < 2 or not (name.startswith('"') and name.endswith('"')):
+        return name
+    escaped = name[1:-1].encode('utf-8')
+    return codecs.escape_decode(escaped)[0].decode('utf-8', 'replace')
+
+
+def _strip_prefix(name):
+    """Remove the a/ or b/ prefix from a filename in a diff header"""
+    name = _unquote(name)
+    if name[0:2] in ('a/', 'b/'):
+        return name[2:]
+    return name
+
+
+def parse_file_diff(chunk, filename=None):
+    """Parse the diff of a single file.
+
+    `filename` is the name from the `diff --git` line, and is used
+    for files that have no text patch.
+    """
+    old_name = None
+    new_name = None
+    status = 'modified'
+    extended = False
     patch = []
     for line in chunk.split('\n'):
-        # Ignore the - filename and index refspec
-        if line.startswith('---') or line.startswith('index'):
-            continue
-        if line.startswith('+++'):
-            filename = line[6:]
-            continue
-        if not filename:
+        if new_name is not None:
+            patch.append(line)
             continue
-        patch.append(line)
+        if line.startswith('--- '):
+            old_name = line[4:]
+        elif line.startswith('+++ '):
+            new_name = line[4:]
+        elif line.startswith('rename to '):
+            extended = True
+            status = 'renamed'
+            filename = _unquote(line[len('rename to '):])
+        elif line.startswith(EXTENDED_HEADERS):
+            extended = True
+
+    if new_name is not None:
+        if new_name == '/dev/null':
+            status = 'removed'
+            filename = _strip_prefix(old_name or '')
+        else:
+            filename = _strip_prefix(new_name)
+            status = 'added' if old_name == '/dev/null' else 'modified'
+
+    if new_name is None and extended and filename:
+        # No text changes, e.g. a pure rename or a binary file.
+        return DiffAdapter(
+            patch=None,
+            filename=filename,
+            sha=None,
+            status=status,
+            additions=0,
+            deletions=0,
+            changes=0)
 
     if not patch:
         msg = u'Could not parse diff for {}'.format(filename)
@@ -57,7 +147,7 @@ def parse_file_diff(chunk):
         patch='\n'.join(patch),
         filename=filename,
         sha=None,
-        status='modified',
+        status=status,
         # Placeholder values to quack like github data.
         additions=1,
         deletions=1,
@@ -68,6 +158,20 @@ class ParseError(RuntimeError):
     pass
 
 
+# Line numbers and positions are stored in arrays of C ints.
+LINE_TYPECODE = 'i'
+
+
+def _find(lines, lineno):
+    """Get the index of lineno in the sorted array lines, or -1"""
+    if not isinstance(lineno, six.integer_types):
+        return -1
+    i = bisect_left(lines, lineno)
+    if i < len(lines) and lines[i] == lineno:
+        return i
+    return -1
+
+
 class DiffCollection(object):
     """
     Collection of changes made in a pull request.
@@ -76,6 +180,7 @@ class DiffCollection(object):
 
     def __init__(self, contents):
         self._diffs = []
+        self._index = {}
         for change in contents:
             self._add(change)
 
@@ -96,6 +201,7 @@ class DiffCollection(object):
                       content.filename,
                       content.sha)
         self._diffs.append(change)
+        self._index.setdefault(change.filename, []).append(change)
 
     def _has_additions(self, content):
         """
@@ -149,8 +255,7 @@ class DiffCollection(object):
         """Get all the changes for a given file independant
         of which commit changed them.
         """
-        return [change for change in self._diffs
-                if change.filename == filename]
+        return list(self._index.get(filename, ()))
 
     def has_line_changed(self, filename, line):
         """Check whether or not a line has changed in a file.
@@ -159,29 +264,29 @@ class DiffCollection(object):
         are new and likely to be related to the lines
         changed in the pull request.
         """
-        changed = [change for change in self.all_changes(filename)
-                   if change.has_line_changed(line)]
-        return len(changed) > 0
+        for change in self._index.get(filename, ()):
+            if change.has_line_changed(line):
+                return True
+        return False
 
     def line_position(self, filename, line):
         """
         Find the line position for a given file + line
         """
-        changes = self.all_changes(filename)
-        if len(changes):
+        changes = self._index.get(filename)
+        if changes:
             return changes[0].line_position(line)
         return None
 
     def first_changed_line(self, filename):
         """Get the first changed line in a file diff.
         """
-        changes = self.all_changes(filename)
-        if len(changes):
+        changes = self._index.get(filename)
+        if changes:
             return changes[0].first_changed_line()
         return None
 
 
-
 class Diff(object):
     """Contains the changes for a single file.
 
@@ -197,6 +302,9 @@ class Diff(object):
             self._hunks = tuple(hunks)
         else:
             self._parse_hunks(patch)
+        self._lines, self._positions = self._merge_positions()
+        self._added = None
+        self._deleted = None
 
     def _parse_hunks(self, patch):
         """Parse the diff data into a collection of hunks.
@@ -207,7 +315,7 @@ class Diff(object):
         line intersects with the previous change we also care.
         """
         hunks = []
-        hunk_separator = r'(^\@\@ \-\d+,\d+ \+\d+(?:,\d+)? \@\@.*?\n)'
+        hunk_separator = r'(^\@\@ \-\d+(?:,\d+)? \+\d+(?:,\d+)? \@\@.*?\n)'
         blocks = re.split(hunk_separator, patch, 0, re.M)
 
         if len(blocks) and blocks[0] == '':
@@ -226,6 +334,31 @@ class Diff(object):
                 header = body = False
         self._hunks = tuple(hunks)
 
+    def _merge_positions(self):
+        """Merge the added lines and positions of each hunk
+        into sorted arrays.
+
+        Hunks are normally in line order and can be concatenated.
+        Otherwise the first hunk containing a line wins, as it did
+        when hunks were searched in order.
+        """
+        lines = array(LINE_TYPECODE)
+        positions = array(LINE_TYPECODE)
+        for hunk in self._hunks:
+            if lines and hunk._additions and hunk._additions[0] <= lines[-1]:
+                return self._merge_unordered()
+            lines.extend(hunk._additions)
+            positions.extend(hunk._positions)
+        return lines, positions
+
+    def _merge_unordered(self):
+        merged = {}
+        for hunk in reversed(self._hunks):
+            merged.update(zip(hunk._additions, hunk._positions))
+        lines = sorted(merged)
+        return (array(LINE_TYPECODE, lines),
+                array(LINE_TYPECODE, [merged[line] for line in lines]))
+
     @property
     def hunks(self):
         return self._hunks
@@ -261,24 +394,20 @@ class Diff(object):
         Find out if a particular line changed in this commit's
         diffs
         """
-        for hunk in self._hunks:
-            if hunk.has_line_changed(line):
-                return True
-        return False
+        return _find(self._lines, line) >= 0
 
     def added_lines(self):
         """Get the line numbers of lines that were added"""
-        adds = set()
-        for hunk in self._hunks:
-            adds = adds.union(hunk.added_lines())
-        return adds
+        if self._added is None:
+            self._added = frozenset(self._lines)
+        return self._added
 
     def deleted_lines(self):
         """Get the line numbers of lines that were deleted"""
-        dels = set()
-        for hunk in self._hunks:
-            dels = dels.union(hunk.deleted_lines())
-        return dels
+        if self._deleted is None:
+            self._deleted = frozenset(chain.from_iterable(
+                hunk._deletions for hunk in self._hunks))
+        return self._deleted
 
     def first_changed_line(self):
         """Get the first changed line in a file diff.
@@ -286,19 +415,18 @@ class Diff(object):
         Useful for repositioning file level errors to the
         first modified line.
         """
-        hunk = self._hunks[0]
-        for line in sorted(hunk.added_lines()):
-            return line
+        additions = self._hunks[0]._additions
+        if additions:
+            return additions[0]
 
     def line_position(self, lineno):
         """
         Find the line number position given a line number in the new
         file content.
         """
-        for hunk in self._hunks:
-            position = hunk.line_position(lineno)
-            if position:
-                return position
+        i = _find(self._lines, lineno)
+        if i >= 0:
+            return self._positions[i]
         return None
 
     def intersection(self, other):
@@ -320,12 +448,21 @@ class Hunk(object):
 
     Each Diff is made of multiple hunks of various sizes.
     Each Hunk begins with the ``@@`` delimiter.
+
+    Added lines, their positions and deleted lines are kept in
+    sorted arrays, as large diffs can have many thousands of hunks.
     """
-    start_line_pattern = re.compile('\@\@ \-(\d+),\d+ \+(\d+)(?:,\d+)? \@\@')
+    __slots__ = ('_header', '_patch', '_additions', '_positions',
+                 '_deletions', '_added', '_deleted')
+
+    start_line_pattern = re.compile(
+        '\@\@ \-(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? \@\@')
 
     def __init__(self, header, patch, offset):
         self._header = header
         self._patch = patch
+        self._added = None
+        self._deleted = None
         self._parse(patch, offset)
 
     def _parse(self, patch, offset):
@@ -341,24 +478,30 @@ class Hunk(object):
         line_num = int(match.group(2)) - 1
         old_line_num = int(match.group(1)) - 1
 
-        additions = []
-        deletions = []
-        line_map = {}
+        additions = array(LINE_TYPECODE)
+        positions = array(LINE_TYPECODE)
+        deletions = array(LINE_TYPECODE)
         for line in self._patch.split('\n'):
-            # Increment lines through additions and
-            # unchanged lines.
-            if not line.startswith('-'):
+            if line.startswith('\\'):
+                # '\ No newline at end of file' isn't a line of the file.
+                offset += 1
+                continue
+            if line.startswith('-'):
+                deleted = old_line_num + 1
+                if not deletions or deletions[-1] != deleted:
+                    deletions.append(deleted)
+            else:
+                # Increment lines through additions and
+                # unchanged lines.
                 line_num += 1
                 old_line_num += 1
-            if line.startswith('-'):
-                deletions.append(old_line_num + 1)
-            if line.startswith('+'):
-                additions.append(line_num)
-                line_map[line_num] = offset
+                if line.startswith('+'):
+                    additions.append(line_num)
+                    positions.append(offset)
             offset += 1
-        self._additions = set(additions)
-        self._deletions = set(deletions)
-        self._positions = line_map
+        self._additions = additions
+        self._positions = positions
+        self._deletions = deletions
 
     @property
     def patch(self):
@@ -367,19 +510,24 @@ class Hunk(object):
     def contains_line(self, lineno):
         """Check if a hunk contains the provided lineno
         in either its deletions or additions"""
-        return lineno in self._additions or lineno in self._deletions
+        return (_find(self._additions, lineno) >= 0 or
+                _find(self._deletions, lineno) >= 0)
 
     def has_line_changed(self, lineno):
         """Check if a line was added"""
-        return lineno in self._additions
+        return _find(self._additions, lineno) >= 0
 
     def added_lines(self):
         """Get the lines added in this hunk"""
-        return self._additions
+        if self._added is None:
+            self._added = frozenset(self._additions)
+        return self._added
 
     def deleted_lines(self):
         """Get the lines deleted in this hunk"""
-        return self._deletions
+        if self._deleted is None:
+            self._deleted = frozenset(self._deletions)
+        return self._deleted
 
     def line_position(self, line_number):
         """Find the line position given a line number in the
@@ -387,6 +535,7 @@ class Hunk(object):
 
         The line position is used to post github comments.
         """
-        if line_number in self._positions:
-            return self._positions[line_number]
+        i = _find(self._additions, line_number)
+        if i >= 0:
+            return self._positions[i]
         return None
@@ -1,11 +1,23 @@
 from __future__ import absolute_import
+import atexit
+import codecs
 import os
 import logging
 import hashlib
+import json
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from typing import Dict, List, Optional  # noqa: F401
 
 import six
 import docker
+import lintreview.cache as cache
+import lintreview.metrics as metrics
+import lintreview.timing as timing
+from docker.constants import DEFAULT_TIMEOUT_SECONDS
 from docker.errors import (
     ImageNotFound,
     APIError,
@@ -18,15 +30,148 @@ log = logging.getLogger(__name__)
 # The base path for all docker operations
 DOCKER_BASE = '/src'
 
+# Label applied to long lived containers managed by a ContainerPool
+POOL_LABEL = 'lintreview.pool'
+
+# Keeps pooled containers alive until commands are exec'd in them.
+POOL_COMMAND = ['sh', '-c', 'while true; do sleep 60; done']
+
+# The active container pool. See configure_pool()
+_pool = None
+
+# Label applied to tool images that are kept between reviews
+IMAGE_CACHE_LABEL = 'lintreview.image-cache'
+
+# Cached image settings. See configure_image_cache()
+_image_cache = {
+    'budget': 0,
+    'index': None,
+}
+
+# The docker clients shared by the current process. See _get_client()
+_client = {
+    'clients': {},
+    'pid': None,
+    'created': 0,
+}
+_client_lock = threading.Lock()
+
+# Default limits for streamed tool output. See configure_output_limits()
+_output_limits = {
+    'max_bytes': None,
+    'max_lines': None,
+}
+
+# The timeout for tool containers when no limit has been set.
+TOOL_TIMEOUT = 300
+
+# Exit status of processes killed by the kernel, as happens when
+# a container exceeds its memory limit.
+KILLED_STATUS = 137
+
+# Resource limits for the tool running on the current thread. See limits()
+_limits = threading.local()
+
+# Images run on the current thread. See record_images()
+_recording = threading.local()
+
+# Labels for containers run on the current thread. See labels()
+_labels = threading.local()
+
 
 class TimeoutError(Exception):
     """Exception for when we timeout waiting for docker."""
 
 
-def _get_client():
-    # type: () -> docker.DockerClient
-    """Get a docker client."""
-    return docker.from_env()
+class ResourceLimitError(Exception):
+    """Exception for when a container exceeds its resource limits."""
+
+
+class CommandError(Exception):
+    """Exception for container commands that did not succeed.
+
+    `status` is the exit status of the command, or None when the
+    container could not be started.
+    """
+
+    def __init__(self, output, status=None):
+        super(CommandError, self).__init__(output)
+        self.output = output
+        self.status = status
+
+
+def _get_client(timeout=DEFAULT_TIMEOUT_SECONDS):
+    # type: (Optional[int]) -> docker.DockerClient
+    """Get the docker client for the current process.
+
+    Clients are shared so that their keep-alive connections to the
+    docker daemon are reused between calls. One client is kept for
+    each request timeout. A `timeout` of None creates a client whose
+    reads never time out, which is used for exec and log streams.
+
+    Connections can't be shared with forked processes, so new clients
+    are made after a fork.
+    """
+    pid = os.getpid()
+    clients = _client['clients']
+    if _client['pid'] == pid and timeout in clients:
+        return clients[timeout]
+    with _client_lock:
+        if _client['pid'] != pid:
+            _client['clients'] = {}
+            _client['pid'] = pid
+        clients = _client['clients']
+        if timeout not in clients:
+            log.debug('Creating docker client for process %s', pid)
+            clients[timeout] = docker.from_env(timeout=timeout)
+            _client['created'] += 1
+        return clients[timeout]
+
+
+def reset_client():
+    # type: () -> None
+    """Discard the shared docker clients.
+
+    The next docker operation will create a new client.
+    """
+    with _client_lock:
+        if _client['pid'] == os.getpid():
+            for client in _client['clients'].values():
+                client.close()
+        _client['clients'] = {}
+        _client['pid'] = None
+
+
+def client_stats():
+    # type: () -> Dict[str, int]
+    """Get connection pool statistics for the shared docker clients."""
+    stats = {
+        'pid': os.getpid(),
+        'clients_created': _client['created'],
+        'pools': 0,
+        'connections': 0,
+        'requests': 0,
+    }
+    if _client['pid'] != os.getpid():
+        return stats
+    for client in list(_client['clients'].values()):
+        for adapter in client.api.adapters.values():
+            for pool in _adapter_pools(adapter):
+                stats['pools'] += 1
+                stats['connections'] += pool.num_connections
+                stats['requests'] += pool.num_requests
+    return stats
+
+
+def _adapter_pools(adapter):
+    """Get the urllib3 connection pools used by a transport adapter."""
+    pools = getattr(adapter, 'pools', None)
+    if pools is None:
+        manager = getattr(adapter, 'poolmanager', None)
+        pools = getattr(manager, 'pools', None)
+    if pools is None:
+        return []
+    return [pools[key] for key in pools.keys()]
 
 
 def replace_basedir(base, files):
@@ -62,6 +207,114 @@ def apply_base(value):
     return os.path.basename(value)
 
 
+@contextmanager
+def limits(values):
+    """Apply resource limits to containers run on the current thread.
+
+    `values` can contain `timeout` in seconds, `cpus`, `cpu_shares`,
+    `memory` in bytes and `pids_limit`.
+    """
+    previous = getattr(_limits, 'values', None)
+    _limits.values = values or {}
+    try:
+        yield
+    finally:
+        _limits.values = previous
+
+
+@contextmanager
+def record_images(images):
+    """Add the names of images run on the current thread to the
+    `images` set.
+    """
+    previous = getattr(_recording, 'images', None)
+    _recording.images = images
+    try:
+        yield
+    finally:
+        _recording.images = previous
+
+
+def _record_image(image):
+    images = getattr(_recording, 'images', None)
+    if images is not None:
+        images.add(image)
+
+
+@contextmanager
+def labels(values):
+    """Apply labels to containers run on the current thread.
+
+    Labelled containers can be stopped with remove_labeled().
+    """
+    previous = getattr(_labels, 'values', None)
+    _labels.values = values or {}
+    try:
+        yield
+    finally:
+        _labels.values = previous
+
+
+def remove_labeled(label, value):
+    # type: (str, str) -> int
+    """Force remove the containers with `label` set to `value`
+
+    Returns the number of removed containers.
+    """
+    client = _get_client()
+    selector = u'{}={}'.format(label, value)
+    removed = 0
+    for container in client.containers.list(filters={'label': selector}):
+        try:
+            container.remove(v=True, force=True)
+            removed += 1
+        except (NotFound, APIError):
+            pass
+    return removed
+
+
+def current_limits():
+    # type: () -> Dict[str, object]
+    """Get the resource limits that apply to the current thread."""
+    return getattr(_limits, 'values', None) or {}
+
+
+def _limit_args(values):
+    """Convert resource limits into container run arguments."""
+    args = {}
+    if values.get('cpus'):
+        args['nano_cpus'] = int(values['cpus'] * 1e9)
+    if values.get('cpu_shares'):
+        args['cpu_shares'] = values['cpu_shares']
+    if values.get('memory'):
+        # Disable swap so the memory limit is a hard limit.
+        args['mem_limit'] = values['memory']
+        args['memswap_limit'] = values['memory']
+    if values.get('pids_limit'):
+        args['pids_limit'] = values['pids_limit']
+    return args
+
+
+def _limit_key(values):
+    """Get a hashable form of resource limits"""
+    return tuple(sorted((k, v) for k, v in values.items() if k != 'timeout'))
+
+
+def _memory_error(values):
+    return ResourceLimitError(
+        u'The container exceeded its memory limit of {} bytes.'.format(
+            values['memory']))
+
+
+def _check_oom(container, values, status=KILLED_STATUS):
+    """Raise a ResourceLimitError if the container ran out of memory"""
+    if not values.get('memory') or status != KILLED_STATUS:
+        return
+    container.reload()
+    if container.attrs.get('State', {}).get('OOMKilled'):
+        raise _memory_error(values)
+
+
 def image_exists(name):
     # type: (str) -> bool
     """Check if a docker image exists."""
@@ -73,6 +326,16 @@ def image_exists(name):
     return True
 
 
+def image_id(name):
+    # type: (str) -> Optional[str]
+    """Get the id of an image, or None if it doesn't exist."""
+    client = _get_client()
+    try:
+        return client.images.get(name).id
+    except ImageNotFound:
+        return None
+
+
 def images():
     # type: () -> List[str]
     """Get the docker image list."""
@@ -95,16 +358,22 @@ def containers(include_stopped=False):
     return results
 
 
+def _image_name(image, *args, **kwargs):
+    return image
+
+
+@timing.timed(timing.DOCKER, _image_name)
 def run(image,                     # type: str
         command,                   # type: List[str]
         source_dir,                # type: str
         env=None,                  # type: Dict[str, str]
-        timeout=300,               # type: Optional[int]
+        timeout=None,              # type: Optional[int]
         name=None,                 # type: Optional[str]
         docker_base=None,          # type: Optional[str]
         workdir=None,              # type: Optional[str]
         include_error=True,        # type: bool
-        run_as_current_user=False  # type: bool
+        run_as_current_user=False,  # type: bool
+        check_status=False         # type: bool
         ):
     # type: (...) -> str
     """Execute tool commands in docker containers.
@@ -114,28 +383,49 @@ def run(image,                     # type: str
 
     The source_dir will be mounted at `/src` in the container
     for tool execution.
+
+    When a container pool has been configured, unnamed runs are
+    executed in a warm container from the pool instead of creating
+    a new container.
+
+    Resource limits set with limits() are applied to the container, and
+    `timeout` defaults to the limit's timeout. A ResourceLimitError is
+    raised when the container is killed for exceeding its memory limit.
+
+    When `check_status` is true, a CommandError is raised if the command
+    exits with a non-zero status or the container can't be started.
     """
     if not docker_base:
         docker_base = DOCKER_BASE
+    _record_image(image)
+    resource_limits = current_limits()
+    if timeout is None:
+        timeout = resource_limits.get('timeout', TOOL_TIMEOUT)
 
-    run_args = {
-        'image': image,
-        'command': [six.text_type(c) for c in command],
-        'environment': env,
-        'volumes': {source_dir: {'bind': docker_base, 'mode': 'rw'}},
-        'stdout': True,
-        'stderr': include_error,
-        'detach': True,
-    }
+    if _pool is not None and name is None:
+        return _pool.run(
+            image,
+            command,
+            source_dir,
+            env=env,
+            timeout=timeout,
+            docker_base=docker_base,
+            workdir=workdir,
+            include_error=include_error,
+            run_as_current_user=run_as_current_user,
+            limits=resource_limits)
 
-    if name is not None:
-        run_args['name'] = name
-
-    if workdir:
-        run_args['working_dir'] = workdir
-
-    if run_as_current_user:
-        run_args['user'] = os.getuid()
+    run_args = _run_args(
+        image,
+        command,
+        source_dir,
+        env=env,
+        name=name,
+        docker_base=docker_base,
+        workdir=workdir,
+        include_error=include_error,
+        run_as_current_user=run_as_current_user,
+        limits=resource_limits)
 
     # Only log the first 15 parameters.
     log.info('Running container: %s', u' '.join(run_args['command'][0:15]))
@@ -145,30 +435,273 @@ def run(image,                     # type: str
     except ImageNotFound:
         err_txt = "Image not found."
         log.exception(err_txt)
+        if check_status:
+            raise CommandError(err_txt)
         return err_txt
     except APIError:
         log.exception("API Error running container.")
-        return "API Error Running Container."
+        metrics.DOCKER_ERRORS.inc(operation='run')
+        err_txt = "API Error Running Container."
+        if check_status:
+            raise CommandError(err_txt)
+        return err_txt
 
     try:
-        container.wait(timeout=timeout)
+        result = container.wait(timeout=timeout)
+        status = result.get('StatusCode')
+        _check_oom(container, resource_limits, status)
         output = b''
         if include_error:
             output += container.logs(stdout=False, stderr=True)
         output += container.logs(stdout=True, stderr=False)
     except (APIError, ReadTimeout, ConnectionError) as e:
         log.error("%s container timed out error=%s.", image, e)
+        metrics.DOCKER_ERRORS.inc(operation='wait')
         raise TimeoutError(six.text_type(e))
     finally:
         if name is None:
-            container.remove(v=True, force=True)
+            try:
+                container.remove(v=True, force=True)
+            except (NotFound, APIError):
+                log.warning('Container for %s was already removed', image)
 
     # Workaround for bytestr in py2 and str in py3
     if isinstance(output, six.binary_type):
-        return output.decode('utf8')
+        output = output.decode('utf8')
+    if check_status and status:
+        raise CommandError(output, status)
     return output
 
 
+def run_stream(image,                     # type: str
+               command,                   # type: List[str]
+               source_dir,                # type: str
+               env=None,                  # type: Dict[str, str]
+               timeout=None,              # type: Optional[int]
+               docker_base=None,          # type: Optional[str]
+               workdir=None,              # type: Optional[str]
+               include_error=True,        # type: bool
+               run_as_current_user=False,  # type: bool
+               max_bytes=None,            # type: Optional[int]
+               max_lines=None             # type: Optional[int]
+               ):
+    # type: (...) -> OutputStream
+    """Execute tool commands in docker containers and stream the output.
+
+    Returns an OutputStream that yields decoded lines while the tool
+    runs. Unlike run(), stderr and stdout are interleaved in the order
+    the tool writes them.
+
+    Output is capped at `max_bytes` and `max_lines`, which default to
+    the limits set with configure_output_limits(). When a cap is reached
+    the container is stopped and the stream is marked as truncated.
+    A TimeoutError is raised while iterating if the tool doesn't finish
+    within `timeout` seconds. Resource limits are applied as they are
+    in run().
+    """
+    if not docker_base:
+        docker_base = DOCKER_BASE
+    _record_image(image)
+    resource_limits = current_limits()
+    if timeout is None:
+        timeout = resource_limits.get('timeout', TOOL_TIMEOUT)
+    if max_bytes is None:
+        max_bytes = _output_limits['max_bytes']
+    if max_lines is None:
+        max_lines = _output_limits['max_lines']
+
+    if _pool is not None:
+        return _pool.run_stream(
+            image,
+            command,
+            source_dir,
+            env=env,
+            timeout=timeout,
+            docker_base=docker_base,
+            workdir=workdir,
+            include_error=include_error,
+            run_as_current_user=run_as_current_user,
+            max_bytes=max_bytes,
+            max_lines=max_lines,
+            limits=resource_limits)
+
+    run_args = _run_args(
+        image,
+        command,
+        source_dir,
+        env=env,
+        docker_base=docker_base,
+        workdir=workdir,
+        include_error=include_error,
+        run_as_current_user=run_as_current_user,
+        limits=resource_limits)
+
+    log.info('Streaming container: %s', u' '.join(run_args['command'][0:15]))
+    client = _get_client(timeout=None)
+    try:
+        container = client.containers.run(**run_args)
+    except ImageNotFound:
+        err_txt = "Image not found."
+        log.exception(err_txt)
+        return OutputStream([err_txt.encode('utf8')])
+    except APIError:
+        log.exception("API Error running container.")
+        metrics.DOCKER_ERRORS.inc(operation='run')
+        return OutputStream([b"API Error Running Container."])
+
+    def remove():
+        try:
+            container.remove(v=True, force=True)
+        except (NotFound, APIError):
+            pass
+
+    try:
+        chunks = container.logs(
+            stdout=True,
+            stderr=include_error,
+            stream=True,
+            follow=True)
+    except (APIError, ReadTimeout, ConnectionError) as e:
+        log.error("%s container failed to stream error=%s.", image, e)
+        metrics.DOCKER_ERRORS.inc(operation='stream')
+        remove()
+        raise TimeoutError(six.text_type(e))
+
+    def check_oom():
+        result = container.wait()
+        _check_oom(container, resource_limits, result.get('StatusCode'))
+
+    stream = OutputStream(
+        chunks,
+        max_bytes=max_bytes,
+        max_lines=max_lines,
+        on_close=remove,
+        on_finish=check_oom)
+    stream.set_timeout(timeout, remove)
+    return stream
+
+
+class OutputStream(object):
+    """Iterate over the decoded lines of a tool's output as it
+    is produced.
+
+    Iteration stops once `max_bytes` or `max_lines` have been read, and
+    `truncated` is set to True. `on_finish` is called when all output has
+    been read and can raise errors. `on_close` is called once iteration
+    ends.
+    """
+
+    def __init__(self, chunks, max_bytes=None, max_lines=None, on_close=None,
+                 on_finish=None):
+        self._chunks = chunks
+        self._on_close = on_close
+        self._on_finish = on_finish
+        self._timer = None
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.truncated = False
+        self.timed_out = False
+        self.closed = False
+
+    def set_timeout(self, timeout, on_timeout):
+        """Call `on_timeout` and fail the stream if it is still
+        open after `timeout` seconds.
+        """
+        if not timeout:
+            return
+
+        def expire():
+            self.timed_out = True
+            on_timeout()
+
+        self._timer = threading.Timer(timeout, expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def __iter__(self):
+        decoder = codecs.getincrementaldecoder('utf8')('replace')
+        buf = u''
+        try:
+            for chunk in self._chunks:
+                if self.max_bytes and self.bytes_read + len(chunk) > self.max_bytes:
+                    chunk = chunk[0:self.max_bytes - self.bytes_read]
+                    self.truncated = True
+                self.bytes_read += len(chunk)
+
+                lines = (buf + decoder.decode(chunk)).split('\n')
+                buf = lines.pop()
+                for line in lines:
+                    if self.max_lines and self.lines_read >= self.max_lines:
+                        self.truncated = True
+                        break
+                    self.lines_read += 1
+                    yield line
+                if self.truncated:
+                    break
+            if self._on_finish is not None and not self.truncated:
+                self._on_finish()
+        except (APIError, ReadTimeout, ConnectionError) as e:
+            if not self.timed_out:
+                log.error("Container output stream failed error=%s.", e)
+                raise TimeoutError(six.text_type(e))
+        finally:
+            self.close()
+
+        if self.timed_out:
+            raise TimeoutError('Container did not complete in time.')
+        if self.truncated:
+            log.warning('Container output was truncated after %s bytes, '
+                        '%s lines', self.bytes_read, self.lines_read)
+            return
+        buf += decoder.decode(b'', True)
+        if buf:
+            self.lines_read += 1
+            yield buf
+
+    def close(self):
+        """Stop the timeout timer and release the container."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._on_close is not None:
+            self._on_close()
+
+
+def _run_args(image, command, source_dir, env=None, name=None,
+              docker_base=DOCKER_BASE, workdir=None, include_error=True,
+              run_as_current_user=False, limits=None):
+    """Build the container run arguments shared by run() and run_stream()"""
+    run_args = {
+        'image': image,
+        'command': [six.text_type(c) for c in command],
+        'environment': env,
+        'volumes': {source_dir: {'bind': docker_base, 'mode': 'rw'}},
+        'stdout': True,
+        'stderr': include_error,
+        'detach': True,
+    }
+
+    if name is not None:
+        run_args['name'] = name
+
+    if workdir:
+        run_args['working_dir'] = workdir
+
+    if run_as_current_user:
+        run_args['user'] = os.getuid()
+
+    run_args.update(_limit_args(limits or {}))
+
+    container_labels = getattr(_labels, 'values', None)
+    if container_labels:
+        run_args['labels'] = container_labels
+    return run_args
+
+
 def rm_container(name):
     # type: (str) -> None
     """Remove a container with the provided name."""
@@ -193,13 +726,20 @@ def rm_image(name):
         raise ValueError("Could not remove: {0}".format(name))
 
 
-def commit(name):
-    # type: (str) -> None
-    """Commit a container state into a new images."""
+def commit(name, repository=None, labels=None):
+    # type: (str, Optional[str], Optional[Dict[str, str]]) -> None
+    """Commit a container state into a new images.
+
+    The image will be named after the container unless
+    `repository` is provided.
+    """
     client = _get_client()
+    conf = None
+    if labels:
+        conf = {'Labels': labels}
     try:
         container = client.containers.get(name)
-        container.commit(repository=name)
+        container.commit(repository=repository or name, conf=conf)
     except (NotFound, APIError):
         log.exception("Exception committing container.")
         raise ValueError("Could not commit container: {0}".format(name))
@@ -209,3 +749,457 @@ def generate_container_name(prefix, files):
     m = hashlib.md5()
     m.update('-'.join(files).encode('utf8'))
     return prefix + m.hexdigest()
+
+
+def configure(config):
+    """Apply application config to docker operations."""
+    configure_pool(config)
+    configure_image_cache(config)
+    configure_output_limits(config)
+
+
+def configure_output_limits(config):
+    """Set the default limits used by run_stream()
+
+    TOOL_OUTPUT_MAX_BYTES and TOOL_OUTPUT_MAX_LINES cap the
+    output read from a tool. 0 disables a limit.
+    """
+    _output_limits['max_bytes'] = int(config.get('TOOL_OUTPUT_MAX_BYTES', 0) or 0)
+    _output_limits['max_lines'] = int(config.get('TOOL_OUTPUT_MAX_LINES', 0) or 0)
+
+
+def configure_image_cache(config):
+    """Configure the disk budget and usage index for cached tool images.
+
+    IMAGE_CACHE_BUDGET is the total size in bytes cached images can
+    use. When it is 0, cached images are never evicted.
+    """
+    index = config.get('IMAGE_CACHE_INDEX')
+    if not index:
+        workspace = config.get('WORKSPACE', tempfile.gettempdir())
+        index = os.path.join(workspace, '.image-cache.json')
+    _image_cache['budget'] = int(config.get('IMAGE_CACHE_BUDGET', 0) or 0)
+    _image_cache['index'] = index
+
+
+def cached_image_name(prefix, image, key):
+    # type: (str, str, object) -> str
+    """Generate the name for an image built on top of `image`
+
+    Names are based on the content of `key` and the id of the base image
+    so that the same plugins share an image across reviews, and
+    rebuilt tool images don't reuse stale plugin images.
+    """
+    try:
+        base_id = _get_client().images.get(image).id
+    except ImageNotFound:
+        base_id = image
+    m = hashlib.sha1()
+    m.update(json.dumps([base_id, key], sort_keys=True).encode('utf8'))
+    return u'{}-{}'.format(prefix, m.hexdigest()[0:20])
+
+
+def build_cached_image(name, image, command, source_dir):
+    # type: (str, str, List[str], str) -> Optional[str]
+    """Build the cached image `name` by running `command` in `image`
+
+    Existing images are reused and None is returned. Otherwise
+    the output of `command` is returned. When `command` fails a
+    CommandError is raised and no image is stored.
+    """
+    if image_exists(name):
+        log.info('Using cached image %s', name)
+        touch_cached_image(name)
+        return None
+
+    log.info('Building cached image %s', name)
+    # Use a unique container so concurrent builds don't collide.
+    container_name = u'{}-{}'.format(name, uuid.uuid4().hex[0:8])
+    try:
+        output = run(
+            image,
+            command,
+            source_dir=source_dir,
+            name=container_name,
+            check_status=True)
+    except CommandError as e:
+        log.warning('Could not build cached image %s, exited with %s',
+                    name, e.status)
+        if e.status is not None:
+            rm_container(container_name)
+        raise
+    try:
+        commit(container_name,
+               repository=name,
+               labels={IMAGE_CACHE_LABEL: '1'})
+    finally:
+        rm_container(container_name)
+    touch_cached_image(name)
+    evict_cached_images()
+    return output
+
+
+def touch_cached_image(name):
+    # type: (str) -> None
+    """Record that a cached image was used."""
+    path = _image_cache['index']
+    if not path:
+        return
+    try:
+        with cache.locked(path):
+            index = cache.read_json(path, {})
+            index[name] = time.time()
+            cache.write_json(path, index)
+    except (IOError, OSError) as e:
+        log.warning('Could not update image cache index %s', e)
+
+
+def evict_cached_images(budget=None):
+    # type: (Optional[int]) -> List[str]
+    """Remove the least recently used cached images until
+    the cached images fit within the budget.
+
+    Sizes are the image sizes reported by docker. Returns the
+    names of the removed images.
+    """
+    budget = budget or _image_cache['budget']
+    path = _image_cache['index']
+    if not budget:
+        return []
+
+    client = _get_client()
+    cached = []
+    for image in client.images.list(filters={'label': IMAGE_CACHE_LABEL}):
+        for tag in image.tags:
+            cached.append((tag.split(':')[0], image.attrs.get('Size', 0)))
+    total = sum(size for name, size in cached)
+    if total <= budget:
+        return []
+
+    removed = []
+    with cache.locked(path):
+        index = cache.read_json(path, {})
+        cached.sort(key=lambda item: index.get(item[0], 0))
+        for name, size in cached:
+            if total <= budget:
+                break
+            log.info('Evicting cached image %s', name)
+            try:
+                client.images.remove(image=name, force=True)
+            except (ImageNotFound, APIError):
+                log.warning('Could not remove cached image %s', name)
+                continue
+            total -= size
+            index.pop(name, None)
+            removed.append(name)
+        cache.write_json(path, index)
+    return removed
+
+
+def evict_pool(source_dir):
+    """Remove pooled containers that mount `source_dir`, and any
+    containers that have been idle too long.
+
+    Call this when a checkout is removed, as its containers
+    can't be used again.
+    """
+    if _pool is None:
+        return
+    _pool.evict(source_dir)
+    _pool.evict_idle()
+
+
+def configure_pool(config):
+    """Enable or disable container pooling based on application config.
+
+    Pooling is enabled when DOCKER_POOL_SIZE is greater than 0.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.clear()
+        _pool = None
+
+    size = int(config.get('DOCKER_POOL_SIZE', 0) or 0)
+    if size < 1:
+        return None
+    _pool = ContainerPool(
+        size=size,
+        max_uses=int(config.get('DOCKER_POOL_MAX_USES', 50)),
+        idle_timeout=int(config.get('DOCKER_POOL_IDLE_TIMEOUT', 300)),
+        image_sizes=config.get('DOCKER_POOL_IMAGE_SIZES', None))
+    return _pool
+
+
+class PooledContainer(object):
+    """A long lived container and its usage data."""
+
+    def __init__(self, key, container):
+        self.key = key
+        self.container = container
+        self.uses = 0
+        self.last_used = time.time()
+        self.removed = False
+
+
+class ContainerPool(object):
+    """Keep long lived containers around and exec tool commands in them.
+
+    Containers are pooled per image, mounted source directory and
+    resource limits, as these cannot be changed after a container
+    is created.
+    Each key retains at most `size` idle containers, or the size defined
+    for the image in `image_sizes`. Containers are
+    removed after `max_uses` commands, when a command fails, or after
+    they have been idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, size=2, max_uses=50, idle_timeout=300,
+                 image_sizes=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.image_sizes = image_sizes or {}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._client = None
+        atexit.register(self.clear)
+
+    def client(self):
+        # type: () -> docker.DockerClient
+        """Get the docker client used for pooled containers.
+
+        Exec reads are not bounded by the client as command
+        timeouts are handled by the pool.
+        """
+        if self._client is not None:
+            return self._client
+        return _get_client(timeout=None)
+
+    def run(self, image, command, source_dir, env=None, timeout=300,
+            docker_base=DOCKER_BASE, workdir=None, include_error=True,
+            run_as_current_user=False, limits=None):
+        # type: (...) -> str
+        """Execute a command in a pooled container.
+
+        Has the same output and error semantics as lintreview.docker.run
+        """
+        exec_args = {
+            'cmd': [six.text_type(c) for c in command],
+            'stdout': True,
+            'stderr': include_error,
+            'environment': env,
+            'demux': True,
+        }
+        if workdir:
+            exec_args['workdir'] = workdir
+        if run_as_current_user:
+            exec_args['user'] = str(os.getuid())
+
+        limits = limits or {}
+        key = (image, source_dir, docker_base, _limit_key(limits))
+        log.info('Running in pooled container: %s',
+                 u' '.join(exec_args['cmd'][0:15]))
+        try:
+            pooled = self.acquire(key)
+        except ImageNotFound:
+            err_txt = "Image not found."
+            log.exception(err_txt)
+            return err_txt
+        except APIError:
+            log.exception("API Error running container.")
+            metrics.DOCKER_ERRORS.inc(operation='run')
+            return "API Error Running Container."
+
+        try:
+            result = self._exec(pooled, exec_args, timeout)
+        except (APIError, ReadTimeout, ConnectionError, TimeoutError) as e:
+            log.error("%s container timed out error=%s.", image, e)
+            metrics.DOCKER_ERRORS.inc(operation='wait')
+            self.release(pooled, failed=True)
+            raise TimeoutError(six.text_type(e))
+        if limits.get('memory') and result.exit_code == KILLED_STATUS:
+            self.release(pooled, failed=True)
+            raise _memory_error(limits)
+        self.release(pooled)
+
+        stdout, stderr = result.output or (None, None)
+        output = (stderr or b'') + (stdout or b'')
+        return output.decode('utf8')
+
+    def run_stream(self, image, command, source_dir, env=None, timeout=300,
+                   docker_base=DOCKER_BASE, workdir=None, include_error=True,
+                   run_as_current_user=False, max_bytes=None, max_lines=None,
+                   limits=None):
+        # type: (...) -> OutputStream
+        """Execute a command in a pooled container and stream the output.
+
+        Has the same output and error semantics as
+        lintreview.docker.run_stream. Containers whose output was
+        truncated or timed out are removed instead of being reused.
+        """
+        exec_args = {
+            'cmd': [six.text_type(c) for c in command],
+            'stdout': True,
+            'stderr': include_error,
+            'environment': env,
+            'stream': True,
+        }
+        if workdir:
+            exec_args['workdir'] = workdir
+        if run_as_current_user:
+            exec_args['user'] = str(os.getuid())
+
+        limits = limits or {}
+        key = (image, source_dir, docker_base, _limit_key(limits))
+        log.info('Streaming in pooled container: %s',
+                 u' '.join(exec_args['cmd'][0:15]))
+        try:
+            pooled = self.acquire(key)
+        except ImageNotFound:
+            err_txt = "Image not found."
+            log.exception(err_txt)
+            return OutputStream([err_txt.encode('utf8')])
+        except APIError:
+            log.exception("API Error running container.")
+            metrics.DOCKER_ERRORS.inc(operation='run')
+            return OutputStream([b"API Error Running Container."])
+
+        try:
+            result = pooled.container.exec_run(**exec_args)
+        except (APIError, ReadTimeout, ConnectionError) as e:
+            log.error("%s container failed to stream error=%s.", image, e)
+            metrics.DOCKER_ERRORS.inc(operation='stream')
+            self.release(pooled, failed=True)
+            raise TimeoutError(six.text_type(e))
+
+        def release():
+            failed = stream.truncated or stream.timed_out
+            self.release(pooled, failed=failed)
+
+        stream = OutputStream(
+            result.output,
+            max_bytes=max_bytes,
+            max_lines=max_lines,
+            on_close=release)
+        stream.set_timeout(timeout, lambda: self._remove(pooled))
+        return stream
+
+    def _exec(self, pooled, exec_args, timeout):
+        """Run exec_run on a separate thread so we can give up on
+        commands that exceed their timeout.
+        """
+        result = {}
+
+        def target():
+            try:
+                result['value'] = pooled.container.exec_run(**exec_args)
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=target)
+        worker.daemon = True
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            raise TimeoutError(
+                'Command did not complete in {} seconds'.format(timeout))
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def acquire(self, key):
+        # type: (tuple) -> PooledContainer
+        """Get an idle container for key or start a new one."""
+        self.evict_idle()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            if idle:
+                return idle.pop()
+
+        image, source_dir, docker_base, limit_key = key
+        log.debug('Starting pooled container for %s', image)
+        container_labels = dict(getattr(_labels, 'values', None) or {})
+        container_labels[POOL_LABEL] = '1'
+        container = self.client().containers.run(
+            image=image,
+            command=POOL_COMMAND,
+            volumes={source_dir: {'bind': docker_base, 'mode': 'rw'}},
+            labels=container_labels,
+            detach=True,
+            **_limit_args(dict(limit_key)))
+        return PooledContainer(key, container)
+
+    def release(self, pooled, failed=False):
+        # type: (PooledContainer, bool) -> None
+        """Return a container to the pool.
+
+        Failed or worn out containers, and containers in excess of
+        the pool size are removed.
+        """
+        if pooled.removed:
+            return
+        pooled.uses += 1
+        pooled.last_used = time.time()
+        retire = failed or pooled.uses >= self.max_uses
+        size = self.image_sizes.get(pooled.key[0], self.size)
+        if not retire:
+            with self._lock:
+                idle = self._idle.setdefault(pooled.key, [])
+                if len(idle) < size:
+                    idle.append(pooled)
+                    return
+        self._remove(pooled)
+
+    def evict_idle(self, now=None):
+        """Remove containers that have been idle longer than idle_timeout"""
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            for key, idle in list(self._idle.items()):
+                keep = []
+                for pooled in idle:
+                    if now - pooled.last_used > self.idle_timeout:
+                        expired.append(pooled)
+                    else:
+                        keep.append(pooled)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for pooled in expired:
+            self._remove(pooled)
+
+    def evict(self, source_dir):
+        """Remove the idle containers that mount `source_dir`"""
+        source_dir = os.path.normpath(source_dir)
+        evicted = []
+        with self._lock:
+            for key in list(self._idle.keys()):
+                if os.path.normpath(key[1]) == source_dir:
+                    evicted.extend(self._idle.pop(key))
+        for pooled in evicted:
+            self._remove(pooled)
+
+    def clear(self):
+        """Remove all idle containers."""
+        with self._lock:
+            idle = [p for pooled in self._idle.values() for p in pooled]
+            self._idle = {}
+        for pooled in idle:
+            self._remove(pooled)
+
+    def _remove(self, pooled):
+        with self._lock:
+            if pooled.removed:
+                return
+            pooled.removed = True
+        log.debug('Removing pooled container for %s', pooled.key[0])
+        try:
+            pooled.container.remove(v=True, force=True)
+        except (NotFound, APIError):
+            log.warning('Could not remove pooled container for %s',
+                        pooled.key[0])
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
@@ -1,14 +1,34 @@
 from __future__ import absolute_import
 import os
 import logging
+import re
 import shutil
 import subprocess
+import tempfile
 import six
+import lintreview.cache as cache
+import lintreview.timing as timing
 from functools import wraps
 from six.moves.urllib.parse import urlparse, urlunparse
 
 log = logging.getLogger(__name__)
 
+# Directory in WORKSPACE that holds repository mirrors.
+MIRROR_DIR = '.mirrors'
+
+SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+# Environment for checkouts that leave git-lfs pointer files in place.
+SKIP_LFS_ENV = {'GIT_LFS_SKIP_SMUDGE': '1'}
+
+# The first git version with `git sparse-checkout`.
+SPARSE_CHECKOUT_VERSION = (2, 25)
+
+# The installed git version. See version()
+_version = {
+    'version': None,
+}
+
 
 def log_io_error(func):
     @wraps(func)
@@ -21,8 +41,10 @@ def log_io_error(func):
     return wrapper
 
 
-def get_repo_path(user, repo, number, settings):
+def get_repo_path(user, repo, number, settings, job=None):
     """Get the target path a repo should be cloned into for the parameters.
+
+    When `job` is provided each review job gets its own path.
     """
     try:
         path = settings['WORKSPACE']
@@ -31,25 +53,34 @@ def get_repo_path(user, repo, number, settings):
                        " option. This is required for lintreview to work.")
     path = path.rstrip('/')
     path = os.path.join(path, user, repo, str(number))
+    if job is not None:
+        path = u'{}-{}'.format(path, job)
     return os.path.realpath(path)
 
 
-def authenticated_clone(config, url, path):
-    # Add auth to url
+def authenticated_url(config, url):
+    """Add the oauth token in config to url, if there is one."""
+    if 'GITHUB_OAUTH_TOKEN' not in config:
+        return url
     parsed_url = urlparse(url)
     user = config['GITHUB_OAUTH_TOKEN']
     password = 'x-oauth-basic'
-    url = urlunparse((
+    return urlunparse((
         parsed_url[0], (u'{}:{}@{}'.format(user, password, parsed_url[1]))
     ) + parsed_url[2:])
-    clone(url, path)
+
+
+def authenticated_clone(config, url, path):
+    clone(authenticated_url(config, url), path)
 
 
 @log_io_error
-def clone(url, path):
+def clone(url, path, no_checkout=False):
     """Clone a repository from `url` into `path`
     """
     command = ['git', 'clone', url, path]
+    if no_checkout:
+        command.insert(2, '--no-checkout')
     return_code, _ = _process(command)
     if return_code:
         raise IOError(u"Unable to clone repository into '{}'".format(path))
@@ -67,10 +98,28 @@ def fetch(path, remote):
     return True
 
 
-def clone_or_update(config, url, path, head):
+def clone_or_update(config, url, path, head, paths=None):
     """Clone a new repository and checkout commit,
     or update an existing clone to the new head
+
+    When GIT_MIRROR_CACHE is enabled the clone is made from
+    a local mirror of the repository. See clone_from_mirror()
+
+    When `paths` is a list, only those directories and the files
+    in the repository root are checked out. See clone_sparse()
+    The whole repository is checked out when git is too old to
+    make sparse checkouts.
     """
+    if paths is not None and version() < SPARSE_CHECKOUT_VERSION:
+        log.warning('Sparse checkouts need git %s or newer, '
+                    'checking out the whole repository.',
+                    '.'.join(str(v) for v in SPARSE_CHECKOUT_VERSION))
+        paths = None
+    if config.get('GIT_MIRROR_CACHE'):
+        return clone_from_mirror(config, url, path, head, paths)
+    if paths is not None:
+        return clone_sparse(config, url, path, head, paths)
+
     log.info("Cloning repository '%s' into '%s'", url, path)
     if 'GITHUB_OAUTH_TOKEN' in config:
         authenticated_clone(config, url, path)
@@ -81,12 +130,216 @@ def clone_or_update(config, url, path, head):
     checkout(path, head)
 
 
+def version():
+    """Get the version of the installed git as a tuple of numbers.
+
+    Returns (0,) when the version can't be read.
+    """
+    if _version['version'] is None:
+        return_code, output = _process(['git', '--version'])
+        match = re.search(r'(\d+)\.(\d+)(?:\.(\d+))?', output or '')
+        if return_code or not match:
+            _version['version'] = (0,)
+        else:
+            _version['version'] = tuple(int(v or 0) for v in match.groups())
+    return _version['version']
+
+
+def mirror_path(config, url):
+    """Get the path of the mirror for the repository at `url`"""
+    parsed = urlparse(url)
+    host = parsed.hostname or 'local'
+    name = parsed.path.strip('/')
+    if name.endswith('.git'):
+        name = name[:-len('.git')]
+    path = os.path.join(config['WORKSPACE'], MIRROR_DIR, host, name + '.git')
+    return os.path.realpath(path)
+
+
+def clone_from_mirror(config, url, path, head, paths=None):
+    """Update the mirror of `url` with `head` and clone it into `path`.
+
+    Mirrors are bare repositories that are kept between reviews, so only
+    new objects need to be fetched. Clones are local to the mirror and
+    hardlink its objects, which keeps them usable if the mirror is
+    later evicted. The clone's origin remote points at `url`.
+    """
+    mirror = mirror_path(config, url)
+    remote = authenticated_url(config, url)
+    with cache.locked(mirror):
+        update_mirror(mirror, remote, head)
+        log.info("Cloning mirror '%s' into '%s'", mirror, path)
+        clone(mirror, path, no_checkout=True)
+        os.utime(mirror, None)
+    set_remote_url(path, 'origin', remote)
+    if paths is not None:
+        sparse_checkout(path, paths)
+    log.info("Checking out '%s'", head)
+    checkout(path, head, skip_lfs=paths is not None)
+
+    budget = config.get('GIT_MIRROR_BUDGET')
+    if budget:
+        evict_mirrors(config, budget, keep=[mirror])
+
+
+@log_io_error
+def clone_sparse(config, url, path, head, paths):
+    """Make a shallow, partial clone of `url` with a sparse checkout.
+
+    Only `head` is fetched, without history or file contents. The
+    contents of files in `paths` and the repository root are fetched
+    when they are checked out. git-lfs files are left as pointers.
+    """
+    log.info("Sparse cloning repository '%s' into '%s'", url, path)
+    return_code, _ = _process(['git', 'init', path])
+    if return_code:
+        raise IOError(u"Unable to create repository '{}'".format(path))
+    add_remote(path, 'origin', authenticated_url(config, url))
+    for key, value in (('remote.origin.promisor', 'true'),
+                       ('remote.origin.partialclonefilter', 'blob:none')):
+        _process(['git', 'config', key, value], chdir=path)
+    sparse_checkout(path, paths)
+
+    command = ['git', 'fetch', '--depth=1', '--filter=blob:none',
+               '--no-tags', 'origin', head]
+    return_code, _ = _process(command, chdir=path)
+    if return_code:
+        raise IOError(u"Unable to fetch '{}' into '{}'".format(head, path))
+    log.info("Checking out '%s'", head)
+    checkout(path, 'FETCH_HEAD', skip_lfs=True)
+
+
+@log_io_error
+def sparse_checkout(path, paths):
+    """Limit the working tree of `path` to the directories in `paths`
+
+    Files in the repository root are always included.
+    """
+    paths = sorted(set(p.strip('/') for p in paths if p.strip('/')))
+    log.info("Using sparse checkout of %s directories", len(paths))
+    command = ['git', 'sparse-checkout', 'init', '--cone']
+    return_code, output = _process(command, chdir=path)
+    if return_code:
+        raise IOError(u"Unable to enable sparse checkout '{}'".format(output))
+    command = ['git', 'sparse-checkout', 'set'] + paths
+    return_code, output = _process(command, chdir=path)
+    if return_code:
+        raise IOError(u"Unable to set sparse checkout '{}'".format(output))
+    return True
+
+
+def _mirror_ref(head):
+    if SHA_PATTERN.match(head):
+        return 'refs/reviews/' + head
+    return 'refs/heads/' + head
+
+
 @log_io_error
-def checkout(path, ref):
+def update_mirror(mirror, url, head):
+    """Create or update the mirror at `mirror` so it contains `head`.
+
+    Commits are fetched into a ref so they are not pruned by gc.
+    Commits already in the mirror are not fetched again.
+
+    Callers should hold the lock for `mirror`.
+    """
+    if not os.path.exists(mirror):
+        log.info("Creating mirror '%s'", mirror)
+        cache.ensure_dir(os.path.dirname(mirror))
+        return_code, _ = _process(['git', 'init', '--bare', mirror])
+        if return_code:
+            raise IOError(u"Unable to create mirror '{}'".format(mirror))
+
+    ref = _mirror_ref(head)
+    if ref.startswith('refs/reviews/'):
+        command = ['git', 'rev-parse', '--verify', '-q', ref]
+        return_code, _ = _process(command, chdir=mirror)
+        if not return_code:
+            log.info("Mirror '%s' already has '%s'", mirror, head)
+            return True
+
+    log.info("Fetching '%s' into mirror '%s'", head, mirror)
+    command = ['git', 'fetch', '--no-tags', url, u'+{}:{}'.format(head, ref)]
+    return_code, _ = _process(command, chdir=mirror)
+    if return_code:
+        raise IOError(u"Unable to fetch '{}' into mirror '{}'".format(
+                      head, mirror))
+    return True
+
+
+def mirrors(config):
+    """Get the paths of all repository mirrors"""
+    root = os.path.join(config['WORKSPACE'], MIRROR_DIR)
+    found = []
+    for dirpath, dirnames, _ in os.walk(root):
+        for name in list(dirnames):
+            if name.endswith('.git'):
+                found.append(os.path.join(dirpath, name))
+                dirnames.remove(name)
+    return found
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def evict_mirrors(config, budget, keep=None):
+    """Remove the least recently used mirrors until all
+    mirrors use at most `budget` bytes.
+
+    Returns the list of removed mirrors.
+    """
+    keep = [os.path.realpath(path) for path in keep or []]
+    candidates = []
+    total = 0
+    for path in mirrors(config):
+        size = _dir_size(path)
+        total += size
+        if os.path.realpath(path) not in keep:
+            candidates.append((os.stat(path).st_mtime, path, size))
+
+    removed = []
+    for last_used, path, size in sorted(candidates):
+        if total <= budget:
+            break
+        with cache.locked(path):
+            # Skip mirrors that were used while waiting for the lock.
+            if not os.path.exists(path) or \
+                    os.stat(path).st_mtime != last_used:
+                continue
+            log.info("Removing mirror '%s' (%s bytes)", path, size)
+            shutil.rmtree(path, True)
+        total -= size
+        removed.append(path)
+    return removed
+
+
+@log_io_error
+def set_remote_url(path, name, url):
+    """Change the url of a remote in the repo at `path`"""
+    command = ['git', 'remote', 'set-url', name, url]
+    return_code, output = _process(command, chdir=path)
+    if return_code:
+        raise IOError(u"Unable to set url for remote {}. {}'".format(
+                      name,
+                      output))
+    return True
+
+
+@log_io_error
+def checkout(path, ref, skip_lfs=False):
     """Check out `ref` in the repo located on `path`
     """
     command = ['git', 'checkout', ref]
-    return_code, _ = _process(command, chdir=path)
+    env = SKIP_LFS_ENV if skip_lfs else None
+    return_code, _ = _process(command, chdir=path, env=env)
     if return_code:
         raise IOError(u"Unable to checkout '{}'".format(ref))
     return True
@@ -109,6 +362,67 @@ def diff(path, files=None):
     return output
 
 
+def mirror_diff(config, url, head, base_url, base):
+    """Get the lines of the diff between `head` and its merge base
+    with `base` from the mirror of `url`.
+
+    `head` is fetched from `url` and `base` from `base_url` if the
+    mirror doesn't have them yet. The diff is streamed, see diff_lines()
+    """
+    mirror = mirror_path(config, url)
+    with cache.locked(mirror):
+        update_mirror(mirror, authenticated_url(config, url), head)
+        update_mirror(mirror, authenticated_url(config, base_url), base)
+        os.utime(mirror, None)
+    return diff_lines(mirror, base, head)
+
+
+def diff_lines(path, base, head):
+    """Generate the lines of the diff between `head` and its merge
+    base with `base`, as `git diff base...head` does.
+
+    Lines are read from git as they are needed, and don't have line
+    endings. IOError is raised once the output has been read if git
+    failed, e.g. because the commits have no merge base.
+    """
+    command = ['git', 'diff', '--no-color', '--no-ext-diff',
+               u'{}...{}'.format(base, head)]
+    log.debug('Running %s', command)
+    with timing.span(_command_name(command), timing.GIT), \
+            tempfile.TemporaryFile() as error:
+        process = subprocess.Popen(
+            command,
+            cwd=path,
+            stdout=subprocess.PIPE,
+            stderr=error,
+            shell=False)
+        try:
+            for line in process.stdout:
+                line = line.decode('utf-8', 'replace')
+                if line.endswith('\n'):
+                    line = line[:-1]
+                yield line
+        finally:
+            process.stdout.close()
+            return_code = process.wait()
+        error.seek(0)
+        output = error.read().decode('utf-8', 'replace')
+    if return_code:
+        log.error('STDERR output: %s', output)
+        raise IOError(u"Unable to diff {}...{} '{}'".format(
+                      base, head, output))
+
+
+@log_io_error
+def changed_files(path, old, new):
+    """Get the names of the files that differ between two commits."""
+    command = ['git', 'diff', '--name-only', old, new]
+    return_code, output = _process(command, chdir=path)
+    if return_code:
+        raise IOError(u"Unable to compare {} and {}".format(old, new))
+    return [line for line in output.split('\n') if line]
+
+
 @log_io_error
 def apply_cached(path, patch):
     """Apply a patch to the index.
@@ -238,7 +552,12 @@ def exists(path):
         return False
 
 
-def _process(command, input_val=None, chdir=False):
+def _command_name(command, *args, **kwargs):
+    return u' '.join(command[0:2])
+
+
+@timing.timed(timing.GIT, _command_name)
+def _process(command, input_val=None, chdir=False, env=None):
     """Helper method for running processes related to git.
     """
     if chdir:
@@ -248,11 +567,15 @@ def _process(command, input_val=None, chdir=False):
 
     log.debug('Running %s', command)
 
+    if env:
+        env = dict(os.environ, **env)
+
     process = subprocess.Popen(
         command,
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        env=env,
         shell=False)
     if isinstance(input_val, six.string_types):
         input_val = input_val.encode('utf8')
@@ -1,14 +1,25 @@
 from __future__ import absolute_import
+import base64
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+
 import github3
 import github3.checks
 import requests
+import lintreview.cache as cache
+import lintreview.metrics as metrics
+import lintreview.ratelimit as ratelimit
+from lintreview.git import SHA_PATTERN
 from requests.packages.urllib3.util.retry import Retry
 
 log = logging.getLogger(__name__)
 
 GITHUB_BASE_URL = 'https://api.github.com/'
 
+LINTRC_FILE = '.lintrc'
+
 CHECKSUITE_HEADER = github3.checks.CheckSuite.CUSTOM_HEADERS
 
 
@@ -20,7 +31,9 @@ def get_client(config):
         raise KeyError('Missing GITHUB_OAUTH_TOKEN in application config. '
                        'Update your settings.py file.')
 
-    session = get_session(config.get('GITHUB_CLIENT_RETRY_OPTIONS', None))
+    session = get_session(config.get('GITHUB_CLIENT_RETRY_OPTIONS', None),
+                          cache.responses(),
+                          ratelimit.limiter())
 
     if config.get('GITHUB_URL', GITHUB_BASE_URL) != GITHUB_BASE_URL:
         client = github3.GitHubEnterprise(
@@ -34,17 +47,145 @@ def get_client(config):
     return client
 
 
-def get_session(retry_options=None):
+def get_session(retry_options=None, response_cache=None, rate_limiter=None):
+    """Create a session for the GitHub API.
+
+    See GithubAdapter for how `response_cache` and `rate_limiter`
+    are used.
+    """
     if retry_options is None or not isinstance(retry_options, dict):
         retry_options = {}
     session = github3.session.GitHubSession()
-    retry_adapter = requests.adapters.HTTPAdapter(
+    retry_adapter = GithubAdapter(
+        response_cache,
+        rate_limiter,
         max_retries=Retry(**retry_options))
     session.mount('http://', retry_adapter)
     session.mount('https://', retry_adapter)
+    session.hooks['response'].append(record_response)
     return session
 
 
+class GithubAdapter(requests.adapters.HTTPAdapter):
+    """Transport for GitHub API requests.
+
+    When a `rate_limiter` is provided, requests are paced by the
+    ratelimit.RateLimiter shared by the workers on this host. Requests
+    that GitHub rate limits are retried once the limiter allows it.
+
+    When a `response_cache` is provided, GET requests are made
+    conditional. Responses with an ETag are stored in a
+    cache.ResultCache that is shared by all workers. Later requests
+    for the same resource send If-None-Match, and a 304 response is
+    answered from the cache. GitHub does not count 304 responses
+    against the rate limit.
+    """
+
+    # Headers that describe the encoded body, which isn't stored.
+    encoding_headers = ('content-length', 'content-encoding',
+                        'transfer-encoding')
+
+    # How many times a rate limited request is retried.
+    rate_limit_retries = 2
+
+    def __init__(self, response_cache=None, rate_limiter=None, **kwargs):
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        super(GithubAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if (self.response_cache is None or
+                request.method != 'GET' or
+                kwargs.get('stream') or
+                'If-None-Match' in request.headers):
+            return self._send(request, **kwargs)
+
+        key = self._key(request)
+        entry = self.response_cache.get(key)
+        if entry:
+            request.headers['If-None-Match'] = entry['etag']
+        response = self._send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            log.debug('Using cached response for %s', request.url)
+            return self._cached_response(response, entry)
+        if response.status_code == 200 and response.headers.get('ETag'):
+            self._store(key, response)
+        return response
+
+    def _send(self, request, **kwargs):
+        send = super(GithubAdapter, self).send
+        limiter = self.rate_limiter
+        if limiter is None:
+            return send(request, **kwargs)
+        attempt = 0
+        while True:
+            limiter.acquire(request.method)
+            response = send(request, **kwargs)
+            retry_after = limiter.update(response)
+            if (retry_after is None or
+                    retry_after > limiter.max_wait or
+                    attempt >= self.rate_limit_retries):
+                return response
+            attempt += 1
+            log.info('Retrying rate limited %s %s',
+                     request.method, request.url)
+            # Read the error so the connection is released.
+            response.content
+
+    def _key(self, request):
+        """Responses vary by media type and by credentials."""
+        parts = [request.url,
+                 request.headers.get('Accept', ''),
+                 request.headers.get('Authorization', '')]
+        return hashlib.sha1(u'\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _store(self, key, response):
+        try:
+            body = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            return
+        headers = dict((name, value)
+                       for name, value in response.headers.items()
+                       if name.lower() not in self.encoding_headers)
+        try:
+            self.response_cache.set(key, {
+                'etag': response.headers['ETag'],
+                'headers': headers,
+                'body': body,
+            })
+        except (IOError, OSError) as e:
+            log.warning('Could not cache response for %s. %s',
+                        response.url, e)
+
+    def _cached_response(self, response, entry):
+        # Read the empty body so the connection is released.
+        response.content
+        headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        for name, value in response.headers.items():
+            if name.lower() not in self.encoding_headers + ('content-type',):
+                headers[name] = value
+        response.headers = headers
+        response.status_code = 200
+        response.revalidated = True
+        response._content = entry['body'].encode('utf-8')
+        return response
+
+
+def record_response(response, *args, **kwargs):
+    """Response hook that records GitHub API metrics.
+
+    Responses answered from the cache are recorded as 304s.
+    """
+    method = response.request.method if response.request else ''
+    status = response.status_code
+    if getattr(response, 'revalidated', False):
+        status = 304
+    metrics.GITHUB_REQUESTS.inc(method=method, status=status)
+    metrics.GITHUB_LATENCY.observe(
+        response.elapsed.total_seconds(), method=method)
+
+
 def get_repository(config, user, repo):
     gh = get_client(config)
     return gh.repository(owner=user, repository=repo)
@@ -64,6 +205,72 @@ def get_lintrc(repo, ref):
     return response.decoded.decode('utf-8')
 
 
+class LintrcCache(object):
+    """Cache .lintrc contents by blob SHA.
+
+    Reviews fetch the .lintrc at the head commit SHA, and commits
+    can't change, so the cache only saves requests when the same SHA
+    is reviewed again (re-opened or re-requested reviews, retries).
+    Commits sharing a .lintrc share one cached blob. Branch names are
+    always requested; GithubAdapter makes those requests conditional.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self._refs = OrderedDict()
+        self._blobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch(self, repo, ref):
+        """Get the .lintrc contents in `repo` at `ref`"""
+        key = (repo.full_name, ref)
+        is_commit = SHA_PATTERN.match(ref)
+        if is_commit:
+            with self._lock:
+                blob_sha = self._refs.get(key)
+            content = self._blob(blob_sha)
+            if content is not None:
+                log.debug('Using cached lintrc for %s at %s', *key)
+                return content
+
+        url = repo._build_url('contents', LINTRC_FILE, base_url=repo._api)
+        response = repo._get(url, params={'ref': ref})
+        data = repo._json(response, 200)
+        if not data or 'content' not in data:
+            raise IOError(u'Could not read {} for {} at {}'.format(
+                          LINTRC_FILE, repo.full_name, ref))
+        content = base64.b64decode(data['content']).decode('utf-8')
+        if is_commit:
+            self._store(key, data['sha'], content)
+        return content
+
+    def _blob(self, sha):
+        with self._lock:
+            return self._blobs.get(sha)
+
+    def _store(self, key, sha, content):
+        with self._lock:
+            self._refs.pop(key, None)
+            self._refs[key] = sha
+            self._blobs.pop(sha, None)
+            self._blobs[sha] = content
+            while len(self._refs) > self.size:
+                self._refs.popitem(last=False)
+            while len(self._blobs) > self.size:
+                self._blobs.popitem(last=False)
+
+
+_lintrc_cache = LintrcCache()
+
+
+def fetch_lintrc(repo, ref):
+    """
+    Download the .lintrc from a repo using the shared LintrcCache.
+    """
+    log.info('Fetching lintrc file for %s at %s', repo.full_name, ref)
+    return _lintrc_cache.fetch(repo, ref)
+
+
 def get_hook_by_url(hook_owner, hook_url):
     hooks = hook_owner.hooks()
 
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+import logging
+import os
+
+import lintreview.cache as cache
+import lintreview.docker as docker
+import lintreview.git as git
+import lintreview.tools as tools
+
+log = logging.getLogger(__name__)
+
+# Directory in WORKSPACE that holds the history of reviewed pull requests.
+HISTORY_DIR = '.reviews'
+
+
+def history_path(config, user, repo, number):
+    """Get the path of the review history for a pull request."""
+    path = os.path.join(
+        config['WORKSPACE'], HISTORY_DIR, user, repo, str(number) + '.json')
+    return os.path.realpath(path)
+
+
+class ReviewHistory(object):
+    """The results of the last review of a pull request.
+
+    Used to only lint the files that changed since the last reviewed
+    head, and carry the problems for other files forward.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = cache.read_json(path, {})
+
+    @property
+    def head(self):
+        return self.data.get('head')
+
+    def changed_files(self, target_path, head, fingerprint, files,
+                      config_files=()):
+        """Get the files that need to be linted for `head`
+
+        Returns None when the whole pull request needs to be
+        reviewed again. This happens when there is no previous review,
+        the review config, tool images or tool config files have changed,
+        files outside `files` changed, or the previous head can't be
+        compared with `head`. `config_files` are extra paths that
+        configure the tools.
+        """
+        if not self.head:
+            return None
+        if self.data.get('fingerprint') != fingerprint:
+            log.info('Review config changed since %s', self.head)
+            return None
+        for name, image_id in self.data.get('images', {}).items():
+            if docker.image_id(name) != image_id:
+                log.info('Image %s changed since %s', name, self.head)
+                return None
+        try:
+            changed = set(git.changed_files(target_path, self.head, head))
+        except IOError:
+            log.info('Could not compare %s with %s', self.head, head)
+            return None
+        reviewed = set(files)
+        for filename in changed:
+            if (filename not in reviewed or filename in config_files or
+                    tools.is_config_file(filename)):
+                log.info('%s changed since %s, reviewing all files',
+                         filename, self.head)
+                return None
+        previous = self.data.get('files', {})
+        return [f for f in files if f in changed or f not in previous]
+
+    def carry_forward(self, problems, files):
+        """Add the previous problems for files to `problems`"""
+        previous = self.data.get('files', {})
+        for filename in files:
+            for line, body in previous.get(filename, []):
+                problems.add(filename, line, body)
+
+    def save(self, head, fingerprint, files, problems, images):
+        """Store the results of reviewing `head`
+
+        Reviews where a tool failed are not saved, so that the next
+        review lints every file again.
+        """
+        results = dict((f, []) for f in files)
+        for problem in problems:
+            filename = getattr(problem, 'filename', None)
+            if not filename:
+                log.info('Not saving history for %s as a tool failed', head)
+                return self.clear()
+            if filename in results:
+                results[filename].append([problem.line, problem.body])
+        image_ids = dict((name, docker.image_id(name)) for name in images)
+        self.data = {
+            'head': head,
+            'fingerprint': fingerprint,
+            'images': image_ids,
+            'files': results,
+        }
+        cache.write_json(self.path, self.data)
+
+    def clear(self):
+        """Forget the previous review."""
+        self.data = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,109 @@
+from __future__ import absolute_import
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import lintreview.cache as cache
+
+log = logging.getLogger(__name__)
+
+# Docker label applied to the containers run for a review job.
+JOB_LABEL = 'lintreview.job'
+
+RUNNING = 'running'
+SUPERSEDED = 'superseded'
+DONE = 'done'
+
+# Finished jobs are removed after this many seconds.
+RETENTION = 7 * 24 * 60 * 60
+
+
+def registry_path(config):
+    """Get the path of the job registry database."""
+    path = config.get('JOB_REGISTRY')
+    if not path:
+        path = os.path.join(config['WORKSPACE'], '.jobs.sqlite')
+    return path
+
+
+class JobRegistry(object):
+    """Track the review jobs for each pull request on this host.
+
+    When a new job starts for a pull request, older jobs that are still
+    running are marked as superseded. Jobs check is_superseded() to stop
+    early and skip publishing their stale results.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        cache.ensure_dir(os.path.dirname(path))
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS jobs ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    'pull TEXT NOT NULL, '
+                    'head TEXT, '
+                    'state TEXT NOT NULL, '
+                    'updated REAL NOT NULL)')
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS jobs_pull '
+                    'ON jobs (pull, state)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def start(self, user, repo, number, head):
+        """Register a new job for a pull request.
+
+        Returns the new job id and the ids of the jobs it superseded.
+        """
+        pull = u'{}/{}/{}'.format(user, repo, number)
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id FROM jobs WHERE pull = ? AND state = ?',
+                    (pull, RUNNING)).fetchall()
+                superseded = [row[0] for row in rows]
+                conn.execute(
+                    'UPDATE jobs SET state = ?, updated = ? '
+                    'WHERE pull = ? AND state = ?',
+                    (SUPERSEDED, now, pull, RUNNING))
+                cursor = conn.execute(
+                    'INSERT INTO jobs (pull, head, state, updated) '
+                    'VALUES (?, ?, ?, ?)',
+                    (pull, head, RUNNING, now))
+                job_id = cursor.lastrowid
+                conn.execute(
+                    'DELETE FROM jobs WHERE state != ? AND updated < ?',
+                    (RUNNING, now - RETENTION))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if superseded:
+            log.info('Job %s for %s superseded jobs %s',
+                     job_id, pull, superseded)
+        return job_id, superseded
+
+    def state(self, job_id):
+        """Get the state of a job, or None if it doesn't exist."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_superseded(self, job_id):
+        return self.state(job_id) == SUPERSEDED
+
+    def finish(self, job_id):
+        """Mark a job as done, unless it was superseded."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE jobs SET state = ?, updated = ? '
+                'WHERE id = ? AND state = ?',
+                (DONE, time.time(), job_id, RUNNING))
@@ -0,0 +1,364 @@
+from __future__ import absolute_import
+import errno
+import glob
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import lintreview.cache as cache
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bucket upper bounds in seconds.
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROBLEM_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Seconds between writes of the metrics of busy processes.
+# Values recorded in between are written by a timer. See flush()
+FLUSH_INTERVAL = 10
+
+# Pull request webhook actions that are recorded. Other actions are
+# recorded as 'other' so payloads can't create new label values.
+WEBHOOK_ACTIONS = (
+    'assigned', 'closed', 'converted_to_draft', 'edited', 'labeled',
+    'opened', 'ready_for_review', 'reopened', 'review_request_removed',
+    'review_requested', 'synchronize', 'unassigned', 'unlabeled',
+    'invalid',
+)
+
+# Where each process stores its metrics. See configure()
+_state = {
+    'path': None,
+    'textfile': None,
+    'pid': None,
+    'flushed': 0,
+    'timer': None,
+}
+_lock = threading.RLock()
+_registry = OrderedDict()
+
+
+class Metric(object):
+    """Base class for metrics with optional labels.
+
+    Values are kept per process and keyed by their label values.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _check_pid()
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, current, other):
+        return (current or 0) + other
+
+    def samples(self, key, value):
+        yield self.name, self.labels, key, value
+
+
+class Histogram(Metric):
+    """Counts observations in cumulative buckets.
+
+    Values are [bucket counts, sum, count].
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            _check_pid()
+            entry = self.values.get(key)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self.values[key] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def merge(self, current, other):
+        if current is None:
+            return [list(other[0]), other[1], other[2]]
+        return [[a + b for a, b in zip(current[0], other[0])],
+                current[1] + other[1],
+                current[2] + other[2]]
+
+    def samples(self, key, value):
+        names = self.labels + ('le',)
+        for bound, count in zip(self.buckets, value[0]):
+            yield (self.name + '_bucket', names,
+                   key + (_format_value(bound),), count)
+        yield self.name + '_bucket', names, key + ('+Inf',), value[2]
+        yield self.name + '_sum', self.labels, key, value[1]
+        yield self.name + '_count', self.labels, key, value[2]
+
+
+WEBHOOKS = Counter(
+    'lintreview_webhooks_total',
+    'Pull request webhooks received, by action.',
+    ['action'])
+QUEUE_LATENCY = Histogram(
+    'lintreview_job_queue_seconds',
+    'Time between a review being queued and a worker starting it.',
+    buckets=DURATION_BUCKETS)
+JOB_DURATION = Histogram(
+    'lintreview_job_duration_seconds',
+    'Time spent processing a review job.',
+    buckets=DURATION_BUCKETS)
+TOOL_DURATION = Histogram(
+    'lintreview_tool_duration_seconds',
+    'Time spent running each tool in a review.',
+    ['tool'],
+    buckets=DURATION_BUCKETS)
+TOOL_TIMEOUTS = Counter(
+    'lintreview_tool_timeouts_total',
+    'Tool runs that exceeded their time limit.',
+    ['tool'])
+DOCKER_ERRORS = Counter(
+    'lintreview_docker_errors_total',
+    'Docker API errors, by operation.',
+    ['operation'])
+GITHUB_REQUESTS = Counter(
+    'lintreview_github_requests_total',
+    'GitHub API responses, by method and status code.',
+    ['method', 'status'])
+GITHUB_LATENCY = Histogram(
+    'lintreview_github_request_seconds',
+    'GitHub API response time, by method.',
+    ['method'],
+    buckets=REQUEST_BUCKETS)
+PROBLEMS = Histogram(
+    'lintreview_review_problems',
+    'Problems found in each review.',
+    buckets=PROBLEM_BUCKETS)
+
+
+def configure(config):
+    """Set where metrics are stored from application config.
+
+    Each process writes its metrics to METRICS_DIR so that the
+    /metrics endpoint can report on every web and worker process on
+    the host. When METRICS_TEXTFILE is set, the combined metrics are
+    also written there in the text format read by node_exporter's
+    textfile collector.
+    """
+    path = None
+    if config.get('METRICS'):
+        path = config.get('METRICS_DIR')
+        if not path:
+            path = os.path.join(config.get('WORKSPACE', '/tmp'), '.metrics')
+    with _lock:
+        _state['path'] = path
+        _state['textfile'] = config.get('METRICS_TEXTFILE')
+        _state['flushed'] = 0
+        if _state['timer'] is not None:
+            _state['timer'].cancel()
+        _state['timer'] = None
+
+
+def _check_pid():
+    """Start over in forked processes.
+
+    Values inherited from the parent are reported by the parent.
+    Values stored by an earlier process with the same pid are not
+    continued, that process's file is replaced on the next flush.
+    """
+    pid = os.getpid()
+    if _state['pid'] == pid:
+        return
+    _state['pid'] = pid
+    for metric in _registry.values():
+        metric.values = {}
+
+
+def _process_file(pid):
+    """Files are named by host and pid, as containers sharing
+    METRICS_DIR have their own pid namespaces.
+    """
+    name = '{}-{}.json'.format(socket.gethostname(), pid)
+    return os.path.join(_state['path'], name)
+
+
+def _prune(path):
+    """Remove the file of a process on this host that has exited.
+
+    Returns True when the file was removed.
+    """
+    name = os.path.basename(path)[:-len('.json')]
+    host, _, pid = name.rpartition('-')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if _pid_exists(int(pid)):
+        return False
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return True
+
+
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+def snapshot():
+    """Get the metrics of this process as JSON serializable data."""
+    with _lock:
+        _check_pid()
+        return dict(
+            (metric.name, [[list(key), value]
+                           for key, value in metric.values.items()])
+            for metric in _registry.values())
+
+
+def collect():
+    """Combine the metrics of this process with those stored by
+    the other processes on this host.
+
+    The files of processes that have exited are removed, so their
+    values stop being reported.
+    """
+    combined = dict((name, {}) for name in _registry)
+    sources = [snapshot()]
+    if _state['path']:
+        own = _process_file(os.getpid())
+        for path in glob.glob(os.path.join(_state['path'], '*.json')):
+            if path != own and not _prune(path):
+                sources.append(cache.read_json(path, {}) or {})
+    for data in sources:
+        for name, values in data.items():
+            metric = _registry.get(name)
+            if metric is None:
+                continue
+            for labels, value in values:
+                key = tuple(labels)
+                combined[name][key] = metric.merge(
+                    combined[name].get(key), value)
+    return combined
+
+
+def flush(max_age=None):
+    """Store the metrics of this process for the other processes.
+
+    When `max_age` is set, metrics are only stored when they were last
+    stored more than `max_age` seconds ago. Otherwise a timer stores
+    them once `max_age` has passed, so the last values recorded by an
+    idle process are not lost.
+    """
+    if not _state['path']:
+        return
+    now = time.time()
+    if max_age is not None:
+        delay = _state['flushed'] + max_age - now
+        if delay > 0:
+            _schedule_flush(delay)
+            return
+    _state['flushed'] = now
+    try:
+        cache.write_json(_process_file(os.getpid()), snapshot())
+        if _state['textfile']:
+            write_textfile(_state['textfile'])
+    except (IOError, OSError) as e:
+        log.warning('Could not store metrics. %s', e)
+
+
+def _schedule_flush(delay):
+    with _lock:
+        timer = _state['timer']
+        # Timers don't survive a fork, so is_alive() is False in children.
+        if timer is not None and timer.is_alive():
+            return
+        timer = threading.Timer(delay, flush)
+        timer.daemon = True
+        _state['timer'] = timer
+        timer.start()
+
+
+def write_textfile(path):
+    """Atomically write the combined metrics in the text format."""
+    dirname = os.path.dirname(path)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    cache.ensure_dir(dirname)
+    with open(tmp_path, 'w') as f:
+        f.write(render(collect()))
+    os.rename(tmp_path, path)
+
+
+def render(values):
+    """Render metric values in the Prometheus text format."""
+    lines = []
+    for metric in _registry.values():
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+        for key in sorted(values.get(metric.name, {})):
+            value = values[metric.name][key]
+            for name, labels, label_values, sample in metric.samples(
+                    key, value):
+                lines.append('{}{} {}'.format(
+                    name,
+                    _format_labels(labels, label_values),
+                    _format_value(sample)))
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = [u'{}="{}"'.format(name, _escape(value))
+             for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}'
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\')
+            .replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def observe_review(timings):
+    """Record the durations and counts of a finished review job
+    from its timing.Timings.
+    """
+    summary = timings.summary()
+    JOB_DURATION.observe(summary['seconds'])
+    for tool, span in summary.get('tools', {}).items():
+        TOOL_DURATION.observe(span['seconds'], tool=tool)
+    if 'problems' in summary:
+        PROBLEMS.observe(summary['problems'])
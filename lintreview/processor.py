@@ -1,8 +1,12 @@
 from __future__ import absolute_import
 import logging
+import os
+import lintreview.cache as cache
+import lintreview.git as git
+import lintreview.timing as timing
 import lintreview.tools as tools
 import lintreview.fixers as fixers
-from lintreview.diff import DiffCollection
+from lintreview.diff import DiffCollection, ParseError, parse_diff_lines
 from lintreview.fixers.error import ConfigurationError, WorkflowError
 from lintreview.review import Problems, Review, InfoComment
 
@@ -19,21 +23,82 @@ class Processor(object):
     _config = None
     problems = None
 
-    def __init__(self, repository, pull_request, target_path, config):
+    def __init__(self, repository, pull_request, target_path, config,
+                 labels=None):
         self._config = config
         self._repository = repository
         self._pull_request = pull_request
         self._target_path = target_path
+        self._labels = labels or {}
         self.problems = Problems()
         self._review = Review(repository, pull_request, config)
 
     def load_changes(self):
-        log.debug('Loading pull request patches from github.')
-        files = self._pull_request.files()
-        self._changes = DiffCollection(files)
+        with timing.span('load_changes'):
+            self._changes = self._load_local_changes()
+            if self._changes is None:
+                log.debug('Loading pull request patches from github.')
+                files = self._pull_request.files()
+                self._changes = DiffCollection(files)
         self.problems.set_changes(self._changes)
+        timing.count('files', len(self._changes))
 
-    def run_tools(self):
+    def _load_local_changes(self):
+        """Diff the pull request in the repository mirror.
+
+        Local diffs aren't limited by the size limits of the github
+        API. Returns None when the changes should be loaded from
+        github instead, e.g. when the base and head have no merge base.
+        """
+        config = self._config
+        if not config.get('GIT_LOCAL_DIFF') or \
+                not config.get('GIT_MIRROR_CACHE'):
+            return None
+        pull = self._pull_request
+        log.debug('Loading pull request patches from the repository mirror.')
+        try:
+            lines = git.mirror_diff(config, pull.clone_url, pull.head,
+                                    pull.base_clone_url, pull.base)
+            return parse_diff_lines(lines)
+        except (IOError, ParseError) as e:
+            log.info('Could not diff %s locally, loading patches from '
+                     'github. %s', pull.display_name, e)
+            return None
+
+    def checkout_paths(self):
+        """Get the directories a sparse checkout of the pull request needs.
+
+        Returns None when the repository should be fully checked out.
+        """
+        if self._changes is None:
+            raise RuntimeError('No loaded changes, cannot find paths. '
+                               'Try calling load_changes first.')
+        config = self._config
+        if not config.sparse_checkout():
+            return None
+
+        tool_list = tools.factory(config, self.problems, self._target_path)
+        paths = set()
+        for tool in tool_list:
+            if tool.needs_full_checkout():
+                log.info('%s needs a full checkout', tool.name)
+                return None
+            paths.update(tool.checkout_paths())
+
+        files = self._changes.get_files(
+            ignore_patterns=config.ignore_patterns()
+        )
+        paths.update(os.path.dirname(f) for f in files)
+        paths.discard('')
+        return sorted(paths)
+
+    def run_tools(self, history=None):
+        """Run the configured tools on the pull request.
+
+        When a ReviewHistory is provided, only the files that changed
+        since the last reviewed head are linted, and the problems for
+        the other files are carried forward from the previous review.
+        """
         if self._changes is None:
             raise RuntimeError('No loaded changes, cannot run tools. '
                                'Try calling load_changes first.')
@@ -48,12 +113,64 @@ class Processor(object):
             config,
             self.problems,
             self._target_path)
+        if self._labels:
+            for tool in tool_list:
+                tool.labels = self._labels
 
         if config.fixers_enabled():
             self.apply_fixers(tool_list, files_to_check)
 
-        tools.run(tool_list, files_to_check, commits_to_check)
+        all_files = files_to_check
+        if history is not None and self._can_review_incrementally(tool_list):
+            config_files = set()
+            for tool in tool_list:
+                config_files.update(tool.config_files())
+            changed = history.changed_files(
+                self._target_path,
+                self._pull_request.head,
+                config.fingerprint(),
+                files_to_check,
+                config_files)
+            if changed is not None:
+                log.info('Reviewing %d of %d files changed since %s',
+                         len(changed), len(files_to_check), history.head)
+                unchanged = [f for f in files_to_check if f not in changed]
+                history.carry_forward(self.problems, unchanged)
+                files_to_check = changed
+
+        timing.count('files_linted', len(files_to_check))
+        with timing.span('run_tools'):
+            tools.run(
+                tool_list,
+                files_to_check,
+                commits_to_check,
+                config.max_parallel_containers())
+        timing.count('problems', len(self.problems))
+
+        results = cache.results()
+        if results is not None:
+            results.evict()
+
+        if history is not None:
+            images = set()
+            for tool in tool_list:
+                images.update(tool.images_used)
+            history.save(
+                self._pull_request.head,
+                config.fingerprint(),
+                all_files,
+                self.problems,
+                images)
+
+    def _can_review_incrementally(self, tool_list):
+        """Fixers change files, and tools that aren't cacheable
+        can report on files other than the changed ones.
+        """
+        if self._config.fixers_enabled():
+            return False
+        return all(tool.can_cache() for tool in tool_list)
 
+    @timing.timed(timing.STAGES, 'fixers')
     def apply_fixers(self, tool_list, files_to_check):
         try:
             fixer_context = fixers.create_context(
@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+import logging
+import os
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+import lintreview.cache as cache
+
+log = logging.getLogger(__name__)
+
+# Methods that only read. Other methods publish reviews, comments
+# and statuses, and are given priority.
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The active rate limiter. See configure()
+_limiter = {
+    'limiter': None,
+}
+
+
+def configure(config):
+    """Create the GitHub rate limiter from application config.
+
+    Returns None when GITHUB_RATE_LIMIT is disabled.
+    """
+    if not config.get('GITHUB_RATE_LIMIT'):
+        _limiter['limiter'] = None
+        return None
+    path = config.get('GITHUB_RATE_LIMIT_FILE')
+    if not path:
+        path = os.path.join(config.get('WORKSPACE', '/tmp'),
+                            '.github-ratelimit.json')
+    _limiter['limiter'] = RateLimiter(
+        path,
+        rate=float(config.get('GITHUB_REQUESTS_PER_SECOND', 5)),
+        burst=int(config.get('GITHUB_REQUEST_BURST', 10)),
+        reserve=int(config.get('GITHUB_RATE_LIMIT_RESERVE', 100)),
+        max_wait=float(config.get('GITHUB_RATE_LIMIT_MAX_WAIT', 300)))
+    return _limiter['limiter']
+
+
+def limiter():
+    """Get the active rate limiter, or None if it is disabled."""
+    return _limiter['limiter']
+
+
+def is_read(method):
+    return (method or 'GET').upper() in READ_METHODS
+
+
+class RateLimiter(object):
+    """Pace GitHub API requests with a token bucket shared by every
+    process on a host.
+
+    The bucket is stored in a JSON file that is updated while holding
+    a file lock. Tokens are added at `rate` per second up to `burst`.
+    Reads wait for a token, while writes may take up to `burst` tokens
+    in advance, so publishing isn't held up by reads. The limits
+    reported by GitHub in each response pause requests too. Reads are
+    paused when fewer than `reserve` requests remain, which leaves the
+    remaining requests for publishing.
+
+    Requests that would wait longer than `max_wait` seconds are sent
+    without waiting.
+    """
+
+    def __init__(self, path, rate=5.0, burst=10, reserve=100, max_wait=300):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self.max_wait = max_wait
+
+    def acquire(self, method='GET'):
+        """Wait until a request can be made.
+
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with cache.locked(self.path):
+                state = self._read()
+                delay = self._delay(state, is_read(method))
+                if delay <= 0 or waited + delay > self.max_wait:
+                    if delay > 0:
+                        log.warning('Not waiting %.1fs for GitHub rate '
+                                    'limits, sending %s anyway.',
+                                    delay, method)
+                    state['tokens'] -= 1
+                    cache.write_json(self.path, state)
+                    return waited
+            log.debug('Waiting %.2fs for GitHub rate limits', delay)
+            time.sleep(delay)
+            waited += delay
+
+    def _read(self):
+        now = time.time()
+        state = cache.read_json(self.path, {}) or {}
+        tokens = state.get('tokens', self.burst)
+        elapsed = max(0.0, now - state.get('updated', now))
+        state['tokens'] = round(
+            min(self.burst, tokens + elapsed * self.rate), 6)
+        state['updated'] = now
+        return state
+
+    def _delay(self, state, read):
+        """Get the seconds until a request can be made."""
+        now = state['updated']
+        delay = max(0.0, state.get('retry_at', 0) - now)
+        remaining = state.get('remaining')
+        if remaining is not None and state.get('reset', 0) > now:
+            limit = self.reserve if read else 0
+            if remaining <= limit:
+                delay = max(delay, state['reset'] - now)
+
+        floor = 1 if read else 1 - self.burst
+        if state['tokens'] < floor:
+            delay = max(delay, (floor - state['tokens']) / self.rate)
+        return delay
+
+    def update(self, response):
+        """Read the rate limits GitHub reported in a response.
+
+        Returns the seconds to wait before retrying when the response
+        was rate limited, or None.
+        """
+        headers = response.headers
+        now = time.time()
+        retry_after = None
+        if response.status_code in (403, 429):
+            retry_after = _retry_after(headers.get('Retry-After'), now)
+            if retry_after is None and headers.get(
+                    'X-RateLimit-Remaining') == '0':
+                retry_after = _reset_in(headers, now)
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None and retry_after is None:
+            return None
+
+        with cache.locked(self.path):
+            state = cache.read_json(self.path, {}) or {}
+            if remaining is not None:
+                try:
+                    state['remaining'] = int(remaining)
+                    state['reset'] = int(headers.get('X-RateLimit-Reset', 0))
+                except ValueError:
+                    pass
+            if retry_after is not None:
+                log.warning('GitHub rate limited %s, pausing for %ss',
+                            response.url, retry_after)
+                state['retry_at'] = max(state.get('retry_at', 0),
+                                        now + retry_after)
+            cache.write_json(self.path, state)
+        return retry_after
+
+
+def _retry_after(value, now):
+    """Parse a Retry-After header in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0, mktime_tz(parsed) - now)
+
+
+def _reset_in(headers, now):
+    try:
+        return max(0, int(headers.get('X-RateLimit-Reset', 0)) - now)
+    except ValueError:
+        return None
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 import lintreview.github as github
 import logging
 import json
+import threading
 
 log = logging.getLogger(__name__)
 
@@ -36,6 +37,11 @@ class GithubRepository(object):
         pull = self.repository().pull_request(number)
         return GithubPullRequest(pull)
 
+    def lintrc(self, ref):
+        """Get the contents of the .lintrc file at ref
+        """
+        return github.fetch_lintrc(self.repository(), ref)
+
     def ensure_label(self, label):
         """Create label if it doesn't exist yet
         """
@@ -73,14 +79,28 @@ class GithubPullRequest(object):
     """Abstract the underlying github models.
     This makes other code simpler, and enables
     the ability to add other hosting services later.
+
+    Pull request data, files, commits and review comments are read
+    once and memoized, as a review job works with a snapshot of the
+    pull request.
     """
 
     def __init__(self, pull_request):
         self.pull = pull_request
+        self._data = None
+        self._files = None
+        self._commits = None
+        self._review_comments = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.pull.as_dict()
+        return self._data
 
     @property
     def display_name(self):
-        data = self.pull.as_dict()
+        data = self.data
         return u'%s/pull/%s' % (data['head']['repo']['full_name'],
                                 data['number'])
 
@@ -90,9 +110,20 @@ class GithubPullRequest(object):
 
     @property
     def head(self):
-        data = self.pull.as_dict()
+        data = self.data
         return data['head']['sha']
 
+    @property
+    def base(self):
+        return self.data['base']['sha']
+
+    @property
+    def base_clone_url(self):
+        """Get the clone url of the repository the pull request
+        is made to.
+        """
+        return self.data['base']['repo']['clone_url']
+
     @property
     def clone_url(self):
         """Get the clone url
@@ -102,14 +133,14 @@ class GithubPullRequest(object):
         issues where github applications don't have access
         to forked repositories.
         """
-        data = self.pull.as_dict()
+        data = self.data
         if self.from_private_fork:
             return data['base']['repo']['clone_url']
         return data['head']['repo']['clone_url']
 
     @property
     def target_branch(self):
-        data = self.pull.as_dict()
+        data = self.data
         return data['base']['ref']
 
     @property
@@ -120,14 +151,14 @@ class GithubPullRequest(object):
         head branch will be pull ref so we can read it
         from the base repo.
         """
-        data = self.pull.as_dict()
+        data = self.data
         if self.from_private_fork:
             return u'refs/pull/{}/head'.format(self.number)
         return data['head']['ref']
 
     @property
     def from_private_fork(self):
-        data = self.pull.as_dict()
+        data = self.data
         head = data['head']['repo']
         base = data['base']['repo']
 
@@ -144,20 +175,27 @@ class GithubPullRequest(object):
 
         Maintainers can always edit pulls from the head repo.
         """
-        data = self.pull.as_dict()
+        data = self.data
         if data['base']['repo']['full_name'] == \
                 data['head']['repo']['full_name']:
             return True
         return data['maintainer_can_modify']
 
     def commits(self):
-        return self.pull.commits()
+        if self._commits is None:
+            self._commits = ReplayIterator(self.pull.commits())
+        return self._commits
 
     def review_comments(self):
-        return self.pull.review_comments()
+        if self._review_comments is None:
+            self._review_comments = ReplayIterator(
+                self.pull.review_comments())
+        return self._review_comments
 
     def files(self):
-        return list(self.pull.files())
+        if self._files is None:
+            self._files = list(self.pull.files())
+        return self._files
 
     def remove_label(self, label_name):
         issue = self.pull.issue()
@@ -180,3 +218,34 @@ class GithubPullRequest(object):
 
     def create_review_comment(self, body, commit_id, path, position):
         self.pull.create_review_comment(body, commit_id, path, position)
+
+
+class ReplayIterator(object):
+    """Iterable that reads a github3 iterator at most once.
+
+    Pages are only requested when they are first iterated, and
+    the items are replayed for later iterations. Tools running in
+    parallel threads can iterate at the same time.
+    """
+
+    def __init__(self, iterator):
+        self._iterator = iter(iterator)
+        self._items = []
+        self._done = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._lock:
+                if index >= len(self._items):
+                    if self._done:
+                        return
+                    try:
+                        self._items.append(next(self._iterator))
+                    except StopIteration:
+                        self._done = True
+                        return
+                item = self._items[index]
+            yield item
+            index += 1
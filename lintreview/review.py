@@ -2,6 +2,9 @@ from __future__ import absolute_import
 from collections import OrderedDict
 from datetime import datetime
 import logging
+import threading
+
+import lintreview.timing as timing
 
 LEVEL_INFO = 'info'
 LEVEL_ERROR = 'error'
@@ -159,6 +162,7 @@ class Review(object):
     def comments(self, filename):
         return self._comments.all(filename)
 
+    @timing.timed(timing.STAGES, 'publish')
     def publish_checkrun(self, problems, check_run_id):
         """Publish the review as a checkrun
 
@@ -172,6 +176,7 @@ class Review(object):
                  self._pr.display_name)
 
         has_problems = problems.error_count() > 0
+        timing.count('comments', len(problems))
         self.remove_ok_label()
 
         def build_annotations(chunk):
@@ -239,6 +244,7 @@ class Review(object):
             }
         }
 
+    @timing.timed(timing.STAGES, 'publish')
     def publish_review(self, problems, head_sha):
         """Publish the review as a pull request review.
 
@@ -263,6 +269,7 @@ class Review(object):
         # post previously un-reported issues
         self.remove_existing(problems)
         new_problem_count = len(problems)
+        timing.count('comments', new_problem_count)
 
         threshold = self.config.summary_threshold()
         under_threshold = (threshold is None or
@@ -410,11 +417,19 @@ class Problems(object):
 
     Used by tool objects to collect problems, and by
     the Review objects to publish results.
+
+    Problems can be added from multiple threads when tools
+    are run concurrently.
+
+    Problems are indexed by their key() so that adding, removing
+    and counting errors don't need to scan the collection.
     """
 
     def __init__(self, changes=None):
         self._items = OrderedDict()
+        self._error_count = 0
         self._changes = changes
+        self._lock = threading.RLock()
 
     def set_changes(self, changes):
         self._changes = changes
@@ -447,7 +462,8 @@ class Problems(object):
         and the line numbers diff offset will be fetched from there.
         """
         if isinstance(filename, BaseComment):
-            self._items[filename.key()] = filename
+            with self._lock:
+                self._set(filename.key(), filename)
             return
 
         if line == 0:
@@ -461,12 +477,13 @@ class Problems(object):
             position=position,
             body=body)
         key = error.key()
-        if key not in self._items:
-            log.debug("Adding new line comment '%s'", error)
-            self._items[key] = error
-        else:
-            log.debug("Updating existing line comment with '%s'", error)
-            self._items[key].append_body(error.body)
+        with self._lock:
+            if key not in self._items:
+                log.debug("Adding new line comment '%s'", error)
+                self._set(key, error)
+            else:
+                log.debug("Updating existing line comment with '%s'", error)
+                self._items[key].append_body(error.body)
 
     def add_many(self, problems):
         """Add multiple problems to the review.
@@ -491,26 +508,45 @@ class Problems(object):
                 return True
             return False
 
-        items = OrderedDict()
-        for error in self:
-            if sieve(error):
-                items[error.key()] = error
-        self._items = items
+        with self._lock:
+            items = self._items
+            self._items = OrderedDict()
+            self._error_count = 0
+            for error in items.values():
+                if sieve(error):
+                    self._set(error.key(), error)
 
     def remove(self, comment):
         """Remove a problem from the list based on the filename
         position and comment.
+
+        Problems with the same key as comment are the only
+        ones that can be equal to it.
+        """
+        key = comment.key()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item == comment:
+                self._delete(key)
+
+    def _set(self, key, item):
+        """Store item under key, keeping the error count in sync.
+        Callers must hold the lock.
         """
-        found = False
-        for i, item in self._items.items():
-            if item == comment:
-                found = i
-                break
-        if found is not False:
-            del self._items[found]
+        previous = self._items.get(key)
+        if previous is not None and previous.level == LEVEL_ERROR:
+            self._error_count -= 1
+        self._items[key] = item
+        if item.level == LEVEL_ERROR:
+            self._error_count += 1
+
+    def _delete(self, key):
+        item = self._items.pop(key)
+        if item.level == LEVEL_ERROR:
+            self._error_count -= 1
 
     def error_count(self):
-        return len([e for e in self._items.values() if e.level == LEVEL_ERROR])
+        return self._error_count
 
     def iter_chunks(self, size=50):
         """Split the problems into chunks
@@ -521,7 +557,7 @@ class Problems(object):
             yield values[i:i+size]
 
     def __len__(self):
-        return len(self._items.values())
+        return len(self._items)
 
     def __iter__(self):
         for item in self._items.values():
@@ -1,10 +1,20 @@
 from __future__ import absolute_import
+import lintreview.cache as cache
+import lintreview.docker as docker
 import lintreview.git as git
+import lintreview.metrics as metrics
+import lintreview.ratelimit as ratelimit
+import lintreview.timing as timing
+import json
 import logging
+import time
 
 from celery import Celery
+from celery.signals import worker_process_init
 from copy import deepcopy
 from lintreview.config import load_config, build_review_config
+from lintreview.history import ReviewHistory, history_path
+from lintreview.jobs import JOB_LABEL, JobRegistry, registry_path
 from lintreview.repo import GithubRepository
 from lintreview.processor import Processor
 from lintreview.docker import TimeoutError
@@ -12,17 +22,66 @@ from lintreview.docker import TimeoutError
 config = load_config()
 celery = Celery('lintreview.tasks')
 celery.config_from_object(config)
+docker.configure(config)
+cache.configure_results(config)
+cache.configure_responses(config)
+ratelimit.configure(config)
+metrics.configure(config)
 
 log = logging.getLogger(__name__)
 
 
+@worker_process_init.connect
+def reset_docker_client(**kwargs):
+    """Don't share docker connections with the parent process."""
+    docker.reset_client()
+
+
 @celery.task(bind=True, ignore_result=True)
-def process_pull_request(self, user, repo_name, number, lintrc):
+def process_pull_request(self, user, repo_name, number, lintrc=None,
+                         queued_at=None):
     """
     Starts processing a pull request and running the various
     lint tools against it.
+
+    When `lintrc` is not provided, the .lintrc file is downloaded
+    from the pull request head. `queued_at` is the time the job was
+    queued at, and is used to measure queue latency.
+
+    A summary of the time spent in each stage and tool is logged
+    when the job is complete.
     """
+    if queued_at:
+        metrics.QUEUE_LATENCY.observe(max(0, time.time() - queued_at))
+    with timing.record() as timings:
+        try:
+            review_pull_request(self, user, repo_name, number, lintrc)
+        finally:
+            summary = timings.summary(
+                pull=u'{}/{}/{}'.format(user, repo_name, number))
+            log.info('Review summary %s', json.dumps(summary))
+            metrics.observe_review(timings)
+            metrics.flush()
+            responses = cache.responses()
+            if responses is not None:
+                responses.evict()
+
+
+def review_pull_request(task, user, repo_name, number, lintrc):
     log.info('Starting to process lint for %s/%s/%s', user, repo_name, number)
+    log.info('Loading pull request data from github. user=%s '
+             'repo=%s number=%s', user, repo_name, number)
+    with timing.span('load_pull_request'):
+        repo = GithubRepository(config, user, repo_name)
+        pull_request = repo.pull_request(number)
+        if lintrc is None:
+            try:
+                lintrc = repo.lintrc(pull_request.head)
+            except Exception as e:
+                log.warn("Cannot download .lintrc file for '%s/%s', "
+                         "skipping lint checks.", user, repo_name)
+                log.warn(e)
+                return
     log.debug("lintrc contents '%s'", lintrc)
     review_config = build_review_config(lintrc, deepcopy(config))
 
@@ -30,12 +89,10 @@ def process_pull_request(self, user, repo_name, number, lintrc):
         log.info('No configured linters, skipping processing.')
         return
 
+    registry = None
+    job_id = None
+    target_path = None
     try:
-        log.info('Loading pull request data from github. user=%s '
-                 'repo=%s number=%s', user, repo_name, number)
-        repo = GithubRepository(config, user, repo_name)
-        pull_request = repo.pull_request(number)
-
         clone_url = pull_request.clone_url
 
         pr_head = pull_request.head
@@ -46,15 +103,44 @@ def process_pull_request(self, user, repo_name, number, lintrc):
                      target_branch)
             return
 
+        labels = {}
+        if config.get('CANCEL_SUPERSEDED'):
+            registry = JobRegistry(registry_path(config))
+            job_id, superseded = registry.start(
+                user, repo_name, number, pr_head)
+            for old_job in superseded:
+                docker.remove_labeled(JOB_LABEL, str(old_job))
+            labels = {JOB_LABEL: str(job_id)}
+
+        def is_superseded():
+            if registry is None or not registry.is_superseded(job_id):
+                return False
+            log.info('Review of %s/%s/%s at %s was superseded, stopping.',
+                     user, repo_name, number, pr_head)
+            return True
+
         repo.create_status(pr_head, 'pending', 'Lintreview processing')
 
+        target_path = git.get_repo_path(
+            user, repo_name, number, config, job_id)
+        processor = Processor(
+            repo, pull_request, target_path, review_config, labels)
+        processor.load_changes()
+
         # Clone/Update repository
-        target_path = git.get_repo_path(user, repo_name, number, config)
-        git.clone_or_update(config, clone_url, target_path, pr_head)
+        with timing.span('clone'):
+            git.clone_or_update(config, clone_url, target_path, pr_head,
+                                processor.checkout_paths())
+        if is_superseded():
+            return
 
-        processor = Processor(repo, pull_request, target_path, review_config)
-        processor.load_changes()
-        processor.run_tools()
+        history = None
+        if config.get('INCREMENTAL_REVIEWS'):
+            history = ReviewHistory(
+                history_path(config, user, repo_name, number))
+        processor.run_tools(history)
+        if is_superseded():
+            return
         processor.publish()
 
         log.info('Completed lint processing for %s/%s/%s' % (
@@ -64,13 +150,20 @@ def process_pull_request(self, user, repo_name, number, lintrc):
         log.exception(e)
     except TimeoutError as e:
         log.exception(e)
-        raise self.retry(
+        raise task.retry(
             countdown=5,  # Pause for 5 seconds to clear things out
             max_retries=2,  # only give it one more shot
         )
     finally:
         try:
-            git.destroy(target_path)
+            if registry is not None:
+                registry.finish(job_id)
+        except Exception as e:
+            log.exception(e)
+        try:
+            if target_path is not None:
+                docker.evict_pool(target_path)
+                git.destroy(target_path)
             log.info('Cleaned up pull request %s/%s/%s',
                      user, repo_name, number)
         except Exception as e:
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+log = logging.getLogger(__name__)
+
+# Groups that spans are recorded in.
+STAGES = 'stages'
+TOOLS = 'tools'
+DOCKER = 'docker'
+GIT = 'git'
+
+# The Timings of the review job running in this process. See record()
+_current = {
+    'timings': None,
+}
+
+
+class Timings(object):
+    """Durations and counts collected while reviewing a pull request.
+
+    Spans are grouped, e.g. by stage or by tool, and each span name
+    tracks the number of calls and the total time spent. Spans can
+    be added from the threads that tools run in.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = OrderedDict()
+        self.counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, group, name, seconds):
+        with self._lock:
+            spans = self.spans.setdefault(group, OrderedDict())
+            span = spans.setdefault(name, {'count': 0, 'seconds': 0.0})
+            span['count'] += 1
+            span['seconds'] += seconds
+
+    def count(self, name, value):
+        with self._lock:
+            self.counts[name] = value
+
+    def summary(self, **fields):
+        """Get a summary of the job that can be serialized as JSON.
+
+        `fields` are added to the summary, e.g. to identify the job.
+        """
+        with self._lock:
+            summary = OrderedDict(fields)
+            summary['seconds'] = round(time.time() - self.started, 3)
+            for group, spans in self.spans.items():
+                summary[group] = OrderedDict(
+                    (name, {'count': span['count'],
+                            'seconds': round(span['seconds'], 3)})
+                    for name, span in spans.items())
+            summary.update(self.counts)
+        return summary
+
+
+def current():
+    """Get the Timings being recorded, or None."""
+    return _current['timings']
+
+
+@contextmanager
+def record():
+    """Record spans and counts into a new Timings.
+
+    Review jobs run one at a time in each worker process, so spans
+    from any thread are recorded into the current job's Timings.
+    """
+    previous = _current['timings']
+    timings = Timings()
+    _current['timings'] = timings
+    try:
+        yield timings
+    finally:
+        _current['timings'] = previous
+
+
+@contextmanager
+def span(name, group=STAGES):
+    """Time the enclosed block as `name` in `group`."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings = _current['timings']
+        if timings is not None:
+            timings.add(group, name, time.time() - start)
+
+
+def timed(group, name):
+    """Decorator that times each call of a function in a span.
+
+    `name` is the span name, or a function that gets the span
+    name from the arguments of the call.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            span_name = name(*args, **kwargs) if callable(name) else name
+            with span(span_name, group):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value):
+    """Record a count, like the number of files, for the current job."""
+    timings = _current['timings']
+    if timings is not None:
+        timings.count(name, value)
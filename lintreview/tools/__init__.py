@@ -1,16 +1,50 @@
 from __future__ import absolute_import
+import hashlib
+import heapq
+import json
 import logging
 import os
 import collections
 import six
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
+import lintreview.cache as cache
 import lintreview.docker as docker
+import lintreview.metrics as metrics
+import lintreview.timing as timing
 
-from lintreview.review import IssueComment
+from lintreview.config import boolean_value
+from lintreview.review import BaseComment, Comment, IssueComment
 from xml.etree import ElementTree
 
 log = logging.getLogger(__name__)
 
+# Files that configure linters. Dotfiles are treated as config too.
+# Changes to these can change the results for every file below them.
+CONFIG_FILES = frozenset([
+    'checkstyle.xml',
+    'composer.json',
+    'mypy.ini',
+    'package.json',
+    'phpcs.xml',
+    'phpcs.xml.dist',
+    'pylintrc',
+    'pyproject.toml',
+    'ruleset.xml',
+    'setup.cfg',
+    'tox.ini',
+    'tslint.json',
+    'tsconfig.json',
+])
+
+
+def is_config_file(filename):
+    """Check whether or not a repository file can configure linters."""
+    name = os.path.basename(filename)
+    return name.startswith('.') or name in CONFIG_FILES
+
 
 class Tool(object):
     """
@@ -18,12 +52,34 @@ class Tool(object):
     """
     name = ''
 
+    # Whether or not the files for a tool can be split into
+    # shards that are linted in parallel containers. Tools that need
+    # a whole program view of the source should disable this.
+    shardable = True
+
+    # Whether or not the tool needs the whole repository checked out
+    # instead of only the changed directories. See needs_full_checkout()
+    full_checkout = False
+
+    # Whether or not the results for each file only depend on that file
+    # and can be reused while the file is unchanged. See can_cache()
+    cacheable = True
+
     def __init__(self, problems, options=None, base_path=None):
         self.problems = problems
         self.base_path = base_path
         self.options = {}
         if isinstance(options, dict):
             self.options = options
+        # Container resource limits. See ReviewConfig.tool_limits()
+        self.limits = {}
+        # Names of the docker images run by process_files()
+        self.images_used = set()
+        # Labels applied to the tool's containers.
+        self.labels = {}
+        # The containers the review can run at once, shared by all
+        # of its tools and their shards. Set by run()
+        self.budget = None
 
     def check_dependencies(self):
         """
@@ -45,12 +101,191 @@ class Tool(object):
             log.debug('No matching files for %s', self.name)
             return
 
+        results = None
+        if self.can_cache() and cache.results() is not None:
+            results = CachedResults(self, cache.results())
+            matching_files = results.replay(matching_files)
+            if not matching_files:
+                log.info('Using cached %s results for %d files',
+                         self.name, num_files)
+                return
+            num_files = len(matching_files)
+
         log.info('Running %s on %d files', self.name, num_files)
+        if results is None:
+            return self._process_shards(matching_files)
+
+        problems = self.problems
+        recorder = ProblemRecorder(problems)
+        self.problems = recorder
+        try:
+            self._process_shards(matching_files)
+        finally:
+            self.problems = problems
+        results.save(matching_files, recorder)
+
+    def _process_shards(self, files):
+        """Lint files in as many shards as the review's container
+        budget has room for, up to the `shards` option.
+
+        The tool's own container slot is used by the first shard.
+        """
+        extra = 0
+        wanted = self.shard_count(files)
+        if wanted > 1 and self.budget is not None:
+            extra = self.budget.reserve(wanted - 1)
+        try:
+            shards = self.shard_files(files, extra + 1)
+            if len(shards) == 1:
+                return self._process_shard(files)
+
+            log.info('Splitting %s into %d shards', self.name, len(shards))
+            pool = ThreadPool(len(shards))
+            try:
+                pool.map(self._process_shard, shards)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            if extra:
+                self.budget.release(extra)
+
+    def _process_shard(self, files):
         try:
-            self.process_files(matching_files)
+            with docker.limits(self.limits), \
+                    docker.labels(self.labels), \
+                    docker.record_images(self.images_used):
+                self.process_files(files)
         except docker.TimeoutError:
+            metrics.TOOL_TIMEOUTS.inc(tool=self.name)
             msg = 'Failed to run %s linter. It timed out during execution.'
+            if 'timeout' in self.limits:
+                msg += ' The time limit is %s seconds.' % self.limits['timeout']
             self.problems.add(IssueComment(msg % (self.name)))
+        except docker.ResourceLimitError as e:
+            msg = u'Failed to run %s linter. %s'
+            self.problems.add(IssueComment(msg % (self.name, e)))
+
+    def needs_full_checkout(self):
+        """
+        Check whether or not this tool needs the whole repository.
+
+        Tools can be given a full checkout with the `full_checkout`
+        option.
+        """
+        if self.full_checkout:
+            return True
+        try:
+            return boolean_value(self.options.get('full_checkout', False))
+        except ValueError:
+            return False
+
+    def can_cache(self):
+        """
+        Check whether or not results can be cached for each file.
+
+        Caching can be disabled with the `cache` option.
+        """
+        if not self.cacheable or not self.base_path:
+            return False
+        try:
+            return boolean_value(self.options.get('cache', True))
+        except ValueError:
+            return True
+
+    def checkout_paths(self):
+        """
+        Get the repository directories this tool reads configuration
+        from, in addition to the files being checked.
+        """
+        return [os.path.dirname(path) for path in self.config_files()]
+
+    def config_files(self):
+        """
+        Get the repository file set with the `config` option.
+        """
+        config = self.options.get('config')
+        if not config or not isinstance(config, six.string_types):
+            return []
+        path = os.path.normpath(config.lstrip('/'))
+        if path.startswith('..'):
+            return []
+        return [path]
+
+    def install_failed(self, packages, error):
+        """
+        Add an issue comment when the packages a tool's options ask
+        for could not be installed. The tool runs without them.
+        """
+        output = u'\n'.join(error.output.strip().split('\n')[-10:])
+        msg = (u'Failed to install {} for the `{}` linter, so it ran '
+               'without them. The install output ended with:\n'
+               '```\n{}\n```\n')
+        self.problems.add(IssueComment(msg.format(packages, self.name, output)))
+
+    def check_truncated(self, output):
+        """
+        Add an issue comment when a tool's streamed output
+        was cut short by the output limits.
+        """
+        if not output.truncated:
+            return
+        msg = (u'The output of the `%s` linter was too large and was '
+               'truncated after %s lines. Some problems may not be reported.')
+        self.problems.add(IssueComment(msg % (self.name, output.lines_read)))
+
+    def can_shard(self):
+        """
+        Check whether or not files can be split into shards
+        for this tool.
+        """
+        return self.shardable
+
+    def shard_count(self, files):
+        """
+        Get the number of shards the `shards` option asks for.
+        """
+        if not self.can_shard():
+            return 1
+        try:
+            count = int(self.options.get('shards', 1))
+        except (TypeError, ValueError):
+            count = 1
+        return max(1, min(count, len(files)))
+
+    def shard_files(self, files, count=None):
+        """
+        Split files into `count` shards, or the number of shards
+        defined by the `shards` option.
+
+        Files are distributed by size so that each shard has
+        roughly the same amount of content to lint. When sharding
+        is not enabled, or not supported a single shard is returned.
+        """
+        limit = self.shard_count(files)
+        count = limit if count is None else min(count, limit)
+        if count <= 1:
+            return [files]
+
+        sized = [(self._file_size(f), f) for f in files]
+        sized.sort(key=lambda item: item[0], reverse=True)
+
+        # Track (total size, file count, shard) so that empty
+        # files are still spread across shards.
+        shards = [[] for i in range(count)]
+        totals = [(0, 0, i) for i in range(count)]
+        for size, filename in sized:
+            total, num, i = heapq.heappop(totals)
+            shards[i].append(filename)
+            heapq.heappush(totals, (total + size, num + 1, i))
+        return shards
+
+    def _file_size(self, filename):
+        path = os.path.join(self.base_path or '', docker.strip_base(filename))
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
 
     def execute_commits(self, commits):
         """
@@ -76,7 +311,8 @@ class Tool(object):
         if not num_files:
             return
         log.info('Running fixer %s on %d files', self.name, num_files)
-        self.process_fixer(matching_files)
+        with docker.limits(self.limits), docker.labels(self.labels):
+            self.process_fixer(matching_files)
 
     def has_fixer(self):
         """
@@ -151,6 +387,189 @@ class Tool(object):
         return '<%sTool config: %s>' % (self.name, self.options)
 
 
+class ProblemRecorder(object):
+    """
+    Wraps a Problems collection and records the problems
+    added for each file.
+
+    `complete` is False when problems that don't belong to a file,
+    like errors from running the tool, have been added.
+    """
+
+    def __init__(self, problems):
+        self._problems = problems
+        self.files = collections.defaultdict(list)
+        self.complete = True
+
+    def add(self, filename, line=None, body=None, position=None):
+        if isinstance(filename, Comment):
+            self.files[filename.filename].append([filename.line, filename.body])
+        elif isinstance(filename, BaseComment):
+            self.complete = False
+        else:
+            self.files[filename].append([line, body])
+        self._problems.add(filename, line, body, position)
+
+    def add_many(self, problems):
+        for p in problems:
+            self.add(p)
+
+    def __getattr__(self, name):
+        return getattr(self._problems, name)
+
+    def __len__(self):
+        return len(self._problems)
+
+    def __iter__(self):
+        return iter(self._problems)
+
+
+class CachedResults(object):
+    """
+    Replays and saves the results of a tool with a ResultCache.
+
+    Results are keyed by the tool, its options, the file path and the
+    contents of the file and of the configuration files around it.
+    The ids of the images that produced a result are checked before
+    it is replayed.
+    """
+
+    def __init__(self, tool, store):
+        self.tool = tool
+        self.store = store
+        self._keys = {}
+        self._digests = {}
+        self._image_ids = {}
+
+    def replay(self, files):
+        """
+        Add the cached problems for files to the tool's problems
+        and return the files that have no cached results.
+        """
+        misses = []
+        for filename in files:
+            key = self.key(filename)
+            entry = self.store.get(key) if key else None
+            if not entry or not self._images_match(entry['images']):
+                misses.append(filename)
+                continue
+            name = docker.strip_base(filename)
+            for line, body in entry['problems']:
+                self.tool.problems.add(name, line, body)
+        log.debug('Found cached %s results for %d of %d files',
+                  self.tool.name, len(files) - len(misses), len(files))
+        return misses
+
+    def save(self, files, recorder):
+        """Store the problems a ProblemRecorder saw for each file
+
+        Nothing is stored when problems were reported for paths that
+        aren't one of `files`, as files without problems would
+        otherwise be stored as clean.
+        """
+        if not recorder.complete:
+            log.info('Not caching %s results as it had errors',
+                     self.tool.name)
+            return
+        images = dict((name, self._image_id(name))
+                      for name in self.tool.images_used)
+        if None in images.values():
+            return
+        recorded = collections.defaultdict(list)
+        for name, problems in recorder.files.items():
+            recorded[self.relative_path(name)].extend(problems)
+        names = dict((filename, self.relative_path(filename))
+                     for filename in files)
+        unknown = set(recorded) - set(names.values())
+        if unknown:
+            log.info('Not caching %s results as it reported unknown '
+                     'files %s', self.tool.name, sorted(unknown))
+            return
+        for filename in files:
+            key = self.key(filename)
+            if not key:
+                continue
+            problems = recorded.get(names[filename], [])
+            self.store.set(key, {'images': images, 'problems': problems})
+
+    def relative_path(self, filename):
+        """Get the path of `filename` relative to the repository
+        whether it is a container path, a host path, or has `./`
+        segments.
+        """
+        name = docker.strip_base(filename)
+        base_path = self.tool.base_path.rstrip(os.sep) + os.sep
+        if name.startswith(base_path):
+            name = name[len(base_path):]
+        return os.path.normpath(name)
+
+    def key(self, filename):
+        if filename in self._keys:
+            return self._keys[filename]
+        name = docker.strip_base(filename)
+        try:
+            blob = _blob_sha(os.path.join(self.tool.base_path, name))
+            digest = self._config_digest(os.path.dirname(name))
+        except (IOError, OSError):
+            key = None
+        else:
+            data = [self.tool.name, self.tool.options, digest, name, blob]
+            data = json.dumps(data, sort_keys=True, default=str)
+            key = hashlib.sha1(data.encode('utf8')).hexdigest()
+        self._keys[filename] = key
+        return key
+
+    def _config_digest(self, dirname):
+        """
+        Hash the files in the repository root, the config files in each
+        directory above `dirname`, and the tool's config option as
+        these can change the results for a file. See is_config_file()
+        """
+        if dirname in self._digests:
+            return self._digests[dirname]
+        base_path = self.tool.base_path
+        sha = hashlib.sha1()
+        if dirname:
+            sha.update(self._config_digest(os.path.dirname(dirname)).encode('utf8'))
+        else:
+            config = self.tool.options.get('config')
+            if isinstance(config, six.string_types):
+                path = os.path.join(base_path, config.lstrip('/'))
+                if os.path.isfile(path):
+                    sha.update(_blob_sha(path).encode('utf8'))
+
+        path = os.path.join(base_path, dirname)
+        for entry in sorted(os.listdir(path)):
+            if dirname and not is_config_file(entry):
+                continue
+            entry_path = os.path.join(path, entry)
+            if os.path.isfile(entry_path):
+                sha.update(entry.encode('utf8'))
+                sha.update(_blob_sha(entry_path).encode('utf8'))
+        self._digests[dirname] = sha.hexdigest()
+        return self._digests[dirname]
+
+    def _image_id(self, name):
+        if name not in self._image_ids:
+            self._image_ids[name] = docker.image_id(name)
+        return self._image_ids[name]
+
+    def _images_match(self, images):
+        for name, image_id in images.items():
+            if self._image_id(name) != image_id:
+                return False
+        return True
+
+
+def _blob_sha(path):
+    """Get the git blob SHA of a file"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    sha = hashlib.sha1(b'blob ' + str(len(content)).encode('ascii') + b'\0')
+    sha.update(content)
+    return sha.hexdigest()
+
+
 def factory(config, problems, base_path):
     """
     Consumes a lintreview.config.ReviewConfig object
@@ -166,6 +585,7 @@ def factory(config, problems, base_path):
             mod = __import__('lintreview.tools.' + linter, fromlist='*')
             clazz = getattr(mod, classname)
             tool = clazz(problems, linter_config, base_path)
+            tool.limits = config.tool_limits(linter)
             tools.append(tool)
         except:
             log.error("Unable to import tool '%s'", linter)
@@ -173,25 +593,90 @@ def factory(config, problems, base_path):
     return tools
 
 
-def run(lint_tools, files, commits):
+def run(lint_tools, files, commits, max_workers=1):
     """
     Create and run tools.
 
     Uses the ReviewConfig, problemset, and list of files to iteratively
     run each tool across the various files in a pull request.
 
+    When `max_workers` is greater than 1, tools are run on a thread pool
+    so that up to `max_workers` tool containers execute at the same time.
+    Tools and their shards share a ContainerBudget, so the review never
+    runs more than `max_workers` containers at once.
+
     file paths are converted into docker paths as all
     tools run in docker containers.
     """
     files = [docker.apply_base(f) for f in files]
+    budget = ContainerBudget(max(1, max_workers))
+    for tool in lint_tools:
+        tool.budget = budget
 
     log.info('Running for %d files', len(files))
-    for tool in lint_tools:
-        log.debug('Running %s tool', tool)
-        previous_total = len(tool.problems)
+    if max_workers <= 1 or len(lint_tools) <= 1:
+        for tool in lint_tools:
+            log.debug('Running %s tool', tool)
+            previous_total = len(tool.problems)
+            _run_tool(tool, files, commits)
+            log.info('Added %s review notes', len(tool.problems) - previous_total)
+        return
+
+    workers = min(max_workers, len(lint_tools))
+    log.info('Running %d tools with %d workers', len(lint_tools), workers)
+    pool = ThreadPool(workers)
+    try:
+        pool.map(lambda tool: _run_tool(tool, files, commits), lint_tools)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _run_tool(tool, files, commits):
+    """
+    Run a single tool against the files and commits.
+    """
+    log.debug('Running %s tool', tool)
+    with tool.budget.slot(), timing.span(tool.name, timing.TOOLS):
         tool.execute(files)
         tool.execute_commits(commits)
-        log.info('Added %s review notes', len(tool.problems) - previous_total)
+    log.debug('Finished %s tool', tool)
+
+
+class ContainerBudget(object):
+    """The number of containers a review can run at the same time.
+
+    Each running tool holds a slot, and tools reserve extra slots
+    for their shards without waiting.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._slots = threading.Semaphore(size)
+
+    @contextmanager
+    def slot(self):
+        """Wait for a slot and hold it."""
+        self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def reserve(self, count):
+        """Take up to `count` free slots without waiting.
+
+        Returns the number of slots taken.
+        """
+        taken = 0
+        while taken < count and self._slots.acquire(False):
+            taken += 1
+        return taken
+
+    def release(self, count):
+        """Return slots taken with reserve()"""
+        for _ in range(count):
+            self._slots.release()
 
 
 def process_quickfix(problems, output, filename_converter, columns=3):
@@ -224,22 +709,81 @@ def process_quickfix(problems, output, filename_converter, columns=3):
         problems.add(filename, lineno, message)
 
 
-def _parse_xml(xml):
+class _FileElements(object):
+    """
+    XMLParser target that passes each `tag` element inside a
+    <file> element to `callback` as it is parsed.
+
+    Only the current element is kept, so large reports are processed
+    without building a tree of the whole document.
+    """
+
+    def __init__(self, tag, callback):
+        self.tag = tag
+        self.callback = callback
+        self.depth = 0
+        self.closed = False
+        self.filename = None
+        self.element = None
+        self.text = []
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.depth == 2 and tag == 'file':
+            self.filename = attrib.get('name')
+        elif self.depth == 3 and tag == self.tag:
+            self.element = ElementTree.Element(tag, attrib)
+            self.text = []
+
+    def data(self, data):
+        if self.element is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        if self.depth == 3 and self.element is not None:
+            self.element.text = ''.join(self.text)
+            self.callback(self.filename, self.element)
+            self.element = None
+            self.text = []
+        self.depth -= 1
+        if self.depth == 0:
+            self.closed = True
+
+    def close(self):
+        return None
+
+
+def _parse_xml(xml, target):
+    """
+    Incrementally parse `xml` into an XMLParser `target`.
+
+    `xml` can be a string or an iterable of strings, such as the
+    lines of a tool's output. Text after the root element is ignored.
+    If the output is not XML or is malformed XML an error will be raised.
+    """
     if not xml:
         # Some tools return "" if no errors are found
         return
+    if isinstance(xml, (six.text_type, six.binary_type)):
+        xml = [xml]
+    parser = ElementTree.XMLParser(target=target)
+    head = None
     try:
-        # Needed for Python 2.7; http://bugs.python.org/issue11033
-        if isinstance(xml, six.text_type):
-            xml = xml.encode('utf-8')
-        return ElementTree.fromstring(xml)
-    except Exception:
-        if len(xml) > 8192:
-            head = xml[0:250]
-            tail = xml[-250:]
-            log.error("Unable to parse XML head=%s, tail=%s", head, tail)
-        else:
-            log.error('Unable to parse XML %s', xml)
+        for chunk in xml:
+            if target.closed:
+                break
+            # Needed for Python 2.7; http://bugs.python.org/issue11033
+            if isinstance(chunk, six.text_type):
+                chunk = chunk.encode('utf-8')
+            if head is None:
+                head = chunk[0:250]
+            parser.feed(chunk)
+        parser.close()
+    except ElementTree.ParseError as e:
+        if target.closed:
+            log.debug('Ignoring text after the XML document. %s', e)
+            return
+        log.error('Unable to parse XML head=%s, error=%s', head, e)
         raise
 
 
@@ -247,60 +791,59 @@ def process_checkstyle(problems, xml, filename_converter):
     """
     Process a checkstyle XML file.
 
+    `xml` can be a string or an iterable of output chunks. Problems
+    are added as each <error> element is parsed.
     If the output is not XML or is malformed XML an error will be raised.
     """
-    tree = _parse_xml(xml)
-    if tree is None or len(tree) == 0:
-        return
-    for f in tree.findall('file'):
-        filename = f.get('name')
+    def add_error(filename, err):
         if filename_converter:
             filename = filename_converter(filename)
-        for err in f.findall('error'):
-            line = err.get('line')
-            message = err.get('message')
-            try:
-                lines = []
-                if line in ('undefined', 'null'):
-                    lines = [0]
-                if ',' in line:
-                    lines = [int(x) for x in line.split(',')]
-                else:
-                    lines = [int(line)]
-            except Exception as e:
-                log.info(
-                    "Error parsing checkstyle output. "
-                    "Dropping message=%s line=%s"
-                    "Error was %s", message, line, e)
-            for line in lines:
-                problems.add(filename, line, message)
+        line = err.get('line')
+        message = err.get('message')
+        try:
+            lines = []
+            if line in ('undefined', 'null'):
+                lines = [0]
+            if ',' in line:
+                lines = [int(x) for x in line.split(',')]
+            else:
+                lines = [int(line)]
+        except Exception as e:
+            log.info(
+                "Error parsing checkstyle output. "
+                "Dropping message=%s line=%s"
+                "Error was %s", message, line, e)
+        for line in lines:
+            problems.add(filename, line, message)
+
+    _parse_xml(xml, _FileElements('error', add_error))
 
 
 def process_pmd(problems, xml, filename_converter):
     """Process a PMD XML file.
+
+    `xml` can be a string or an iterable of output chunks. Problems
+    are added as each <violation> element is parsed.
     """
-    tree = _parse_xml(xml)
-    if len(tree) == 0:
-        return
-    for f in tree.findall('file'):
-        filename = f.get('name')
+    def add_violation(filename, err):
         if filename_converter:
             filename = filename_converter(filename)
-        for err in f.findall('violation'):
-            try:
-                line = int(err.get('beginline') or err.get('endline'))
-                message_parts = [
-                    '%s:' % err.get('rule') if err.get('rule') else None,
-                    err.text.strip(),
-                    'See: %s' % err.get('externalInfoUrl') if err.get('externalInfoUrl') else None,
-                ]
-                message = ' '.join(filter(None, message_parts))
-                problems.add(filename, line, message)
-            except Exception:
-                log.info(
-                    'Could not parse pmd output. '
-                    'Dropping violation=%s',
-                    ElementTree.tostring(err))
+        try:
+            line = int(err.get('beginline') or err.get('endline'))
+            message_parts = [
+                '%s:' % err.get('rule') if err.get('rule') else None,
+                err.text.strip(),
+                'See: %s' % err.get('externalInfoUrl') if err.get('externalInfoUrl') else None,
+            ]
+            message = ' '.join(filter(None, message_parts))
+            problems.add(filename, line, message)
+        except Exception:
+            log.info(
+                'Could not parse pmd output. '
+                'Dropping violation=%s',
+                ElementTree.tostring(err))
+
+    _parse_xml(xml, _FileElements('violation', add_violation))
 
 
 def stringify(value):
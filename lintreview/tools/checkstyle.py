@@ -25,6 +25,7 @@ class Checkstyle(Tool):
     """
 
     name = 'checkstyle'
+    shardable = False
 
     def check_dependencies(self):
         """
@@ -84,8 +85,7 @@ class Checkstyle(Tool):
         if not lines[-1].strip().startswith('<'):
             lines = lines[0:-1]
 
-        output = ''.join(lines)
-        process_checkstyle(self.problems, output, docker.strip_base)
+        process_checkstyle(self.problems, lines, docker.strip_base)
 
     def setup_properties(self, properties_file):
         config_loc = os.path.dirname(docker.apply_base(self.options['config']))
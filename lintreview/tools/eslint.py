@@ -13,7 +13,6 @@ log = logging.getLogger(__name__)
 class Eslint(Tool):
 
     name = 'eslint'
-    custom_image = None
 
     def check_dependencies(self):
         """See if the nodejs image exists
@@ -47,7 +46,6 @@ class Eslint(Tool):
             image_name,
             command,
             source_dir=self.base_path)
-        self._cleanup()
         self._process_output(output, files)
 
     def process_fixer(self, files):
@@ -69,30 +67,48 @@ class Eslint(Tool):
 
     def get_image_name(self, files):
         """Run container command to install eslint plugins
+
+        Plugin images are cached and shared by all reviews
+        that use the same eslint packages.
         """
         if not self.options.get('install_plugins', False):
             return 'eslint'
 
-        container_name = docker.generate_container_name('eslint', files)
-        if self.custom_image is None:
-            log.info('Installing eslint plugins into %s', container_name)
-            output = docker.run(
+        packages = self._plugin_packages()
+        if not packages:
+            return 'eslint'
+
+        image_name = docker.cached_image_name('eslint', 'eslint', packages)
+        try:
+            output = docker.build_cached_image(
+                image_name,
                 'eslint',
                 ['eslint-install'],
-                source_dir=self.base_path,
-                name=container_name)
-
-            docker.commit(container_name)
-            docker.rm_container(container_name)
-            self.custom_image = container_name
-
+                self.base_path)
+        except docker.CommandError as e:
+            self.install_failed(u'the eslint plugins in package.json', e)
+            return 'eslint'
+        if output is not None:
             installed = [
                 line.strip('add:')
                 for line in output.splitlines()
                 if line.startswith('add:')
             ]
             log.info('Installed eslint plugins %s', installed)
-        return container_name
+        return image_name
+
+    def _plugin_packages(self):
+        """Get the package.json lines that eslint-install will
+        install packages from.
+        """
+        path = os.path.join(self.base_path or '', 'package.json')
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return []
+        pattern = re.compile(r'eslint-[plugin|config]-*', re.I)
+        return sorted(line.strip() for line in lines if pattern.search(line))
 
     def _create_command(self):
         command = ['eslint', '--format', 'checkstyle']
@@ -103,25 +119,6 @@ class Eslint(Tool):
                         docker.apply_base(self.options['config'])]
         return command
 
-    def _container_name(self, files):
-        """Get the persistent container name for custom plugins.
-
-        This is only used when we have to install custom plugins
-        as that requires creating new temporary images.
-        """
-        if not self.options.get('install_plugins', False):
-            return None
-        return docker.generate_container_name('eslint', files)
-
-    def _cleanup(self):
-        """Remove the named container and temporary image
-        """
-        if self.custom_image is None:
-            return
-        log.info('Removing temporary image %s', self.custom_image)
-        docker.rm_image(self.custom_image)
-        self.custom_image = None
-
     def _process_output(self, output, files):
         # Strip deprecations off as they break XML parsing
         if re.match(r'.*?DeprecationWarning', output):
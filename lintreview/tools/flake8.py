@@ -18,7 +18,6 @@ log = logging.getLogger(__name__)
 class Flake8(Tool):
 
     name = 'flake8'
-    custom_image = None
 
     # see: http://flake8.readthedocs.org/en/latest/config.html
     PYFLAKE_OPTIONS = (
@@ -68,11 +67,9 @@ class Flake8(Tool):
         command = self.make_command(files)
         image = self.get_image_name(files)
 
-        output = docker.run(image, command, source_dir=self.base_path)
-
-        self._cleanup()
-        output = output.split("\n")
+        output = docker.run_stream(image, command, source_dir=self.base_path)
         process_quickfix(self.problems, output, docker.strip_base)
+        self.check_truncated(output)
 
     def make_command(self, files):
         command = ['flake8']
@@ -135,7 +132,8 @@ class Flake8(Tool):
         """Get the image name based on options
 
         If the `plugin` option is used a custom image will
-        be created.
+        be created. Custom images are cached and shared by
+        all reviews using the same plugins.
         """
         image = python_image(self.options)
         plugins = self.options.get('plugins', None)
@@ -163,28 +161,17 @@ class Flake8(Tool):
             self.problems.add(error)
             return image
 
-        container_name = docker.generate_container_name('flake8', files)
-        if self.custom_image is None:
-            log.info('Installing flake8 plugins into %s', container_name)
-
-            docker.run(
+        plugins = sorted(set(plugins))
+        image_name = docker.cached_image_name('flake8', image, plugins)
+        try:
+            output = docker.build_cached_image(
+                image_name,
                 image,
                 ['flake8-install', u','.join(plugins)],
-                source_dir=self.base_path,
-                name=container_name
-            )
-            docker.commit(container_name)
-            docker.rm_container(container_name)
-            self.custom_image = container_name
+                self.base_path)
+        except docker.CommandError as e:
+            self.install_failed(u', '.join(plugins), e)
+            return image
+        if output is not None:
             log.info('Installed flake8 plugins %s', plugins)
-
-        return container_name
-
-    def _cleanup(self):
-        """Remove the custom image
-        """
-        if self.custom_image is None:
-            return
-        log.info('Removing temporary image %s', self.custom_image)
-        docker.rm_image(self.custom_image)
-        self.custom_image = None
+        return image_name
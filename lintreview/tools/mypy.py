@@ -11,6 +11,8 @@ log = logging.getLogger(__name__)
 class Mypy(Tool):
 
     name = 'mypy'
+    full_checkout = True
+    cacheable = False
 
     def check_dependencies(self):
         """See if the python3 image exists
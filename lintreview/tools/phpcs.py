@@ -26,7 +26,6 @@ OPTIONAL_PACKAGES = {
 class Phpcs(Tool):
 
     name = 'phpcs'
-    custom_image = None
 
     def check_dependencies(self):
         """
@@ -48,7 +47,6 @@ class Phpcs(Tool):
         image = self.get_image_name(files)
         command = self.create_command(files)
         output = docker.run(image, command, source_dir=self.base_path)
-        self._cleanup()
 
         # Check for errors from PHPCS
         if output.startswith('ERROR'):
@@ -141,28 +139,17 @@ class Phpcs(Tool):
             self.problems.add(error)
             return image
 
-        container_name = docker.generate_container_name('phpcs-', files)
-        if self.custom_image is None:
-            log.info('Installing phpcs package into %s', container_name)
-
-            docker.run(
+        package = OPTIONAL_PACKAGES[standard].package
+        image_name = docker.cached_image_name('phpcs', image, package)
+        try:
+            output = docker.build_cached_image(
+                image_name,
                 image,
-                ['phpcs-install', OPTIONAL_PACKAGES[standard].package],
-                source_dir=self.base_path,
-                name=container_name
-            )
-            docker.commit(container_name)
-            docker.rm_container(container_name)
-            self.custom_image = container_name
+                ['phpcs-install', package],
+                self.base_path)
+        except docker.CommandError as e:
+            self.install_failed(package, e)
+            return image
+        if output is not None:
             log.info('Installed phpcs package %s', standard)
-
-        return container_name
-
-    def _cleanup(self):
-        """Remove the custom image
-        """
-        if self.custom_image is None:
-            return
-        log.info('Removing temporary image %s', self.custom_image)
-        docker.rm_image(self.custom_image)
-        self.custom_image = None
+        return image_name
@@ -13,6 +13,9 @@ log = logging.getLogger(__name__)
 class Pytype(Tool):
 
     name = 'pytype'
+    shardable = False
+    full_checkout = True
+    cacheable = False
 
     def check_dependencies(self):
         """See if the pytype image exists
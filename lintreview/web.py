@@ -1,15 +1,17 @@
 from __future__ import absolute_import
 import logging
 import pkg_resources
+import time
 
+import lintreview.metrics as metrics
 from flask import Flask, request, Response
 from lintreview.config import load_config
-from lintreview.github import get_repository, get_lintrc
 from lintreview.tasks import process_pull_request
 
 config = load_config()
 app = Flask("lintreview")
 app.config.update(config)
+metrics.configure(config)
 
 log = logging.getLogger(__name__)
 version = pkg_resources.get_distribution('lintreview').version
@@ -20,6 +22,13 @@ def ping():
     return "lint-review: %s pong\n" % (version,)
 
 
+@app.route("/metrics")
+def show_metrics():
+    """Metrics for all web and worker processes on this host."""
+    return Response(metrics.render(metrics.collect()),
+                    content_type=metrics.CONTENT_TYPE)
+
+
 @app.route("/review/start", methods=["POST"])
 def start_review():
     event = request.headers.get('X-Github-Event')
@@ -33,15 +42,14 @@ def start_review():
         number = pull_request["number"]
         base_repo_url = pull_request["base"]["repo"]["git_url"]
         head_repo_url = pull_request["head"]["repo"]["git_url"]
-        head_repo_ref = pull_request["head"]["ref"]
         user = pull_request["base"]["repo"]["owner"]["login"]
-        head_user = pull_request["head"]["repo"]["owner"]["login"]
         repo = pull_request["base"]["repo"]["name"]
-        head_repo = pull_request["head"]["repo"]["name"]
     except Exception as e:
         log.error("Got an invalid JSON body. '%s'", e)
+        record_webhook('invalid')
         return Response(status=403,
                         response="You must provide a valid JSON body\n")
+    record_webhook(action)
 
     log.info("Received GitHub pull request notification for "
              "%s %s, (%s) from: %s",
@@ -51,19 +59,19 @@ def start_review():
         log.info("Ignored '%s' action." % action)
         return Response(status=204)
 
-    gh = get_repository(app.config, head_user, head_repo)
-    try:
-        lintrc = get_lintrc(gh, head_repo_ref)
-        log.debug("lintrc file contents '%s'", lintrc)
-    except Exception as e:
-        log.warn("Cannot download .lintrc file for '%s', "
-                 "skipping lint checks.", base_repo_url)
-        log.warn(e)
-        return Response(status=204)
+    # The .lintrc file is fetched by the worker so that webhook
+    # deliveries don't wait on the GitHub API.
     try:
         log.info("Scheduling pull request for %s/%s %s", user, repo, number)
-        process_pull_request.delay(user, repo, number, lintrc)
+        process_pull_request.delay(user, repo, number, queued_at=time.time())
     except:
         log.error('Could not publish job to celery. Make sure its running.')
         return Response(status=500)
     return Response(status=204)
+
+
+def record_webhook(action):
+    if action not in metrics.WEBHOOK_ACTIONS:
+        action = 'other'
+    metrics.WEBHOOKS.inc(action=action)
+    metrics.flush(max_age=metrics.FLUSH_INTERVAL)
@@ -1,8 +1,14 @@
 import os
 import json
 
+from lintreview.config import boolean_value
+
 
 def env(key, default=None, cast=str):
+    """Read a setting from the environment.
+
+    Use boolean_value to cast flags, as bool('false') is True.
+    """
     value = os.environ.get(key, default)
     if value is None:
         return None
@@ -18,12 +24,12 @@ errorlog = env('LINTREVIEW_GUNICORN_LOG_ERROR',
                'lintreview.error.log')
 accesslog = env('LINTREVIEW_GUNICORN_LOG_ACCESS',
                 'lintreview.access.log')
-debug = env('LINTREVIEW_GUNICORN_DEBUG', True, bool)
+debug = env('LINTREVIEW_GUNICORN_DEBUG', True, boolean_value)
 loglevel = env('LINTREVIEW_GUNICORN_LOGLEVEL', 'debug')
 
 # Basic flask config
-DEBUG = env('LINTREVIEW_FLASK_DEBUG', True, bool)
-TESTING = env('LINTREVIEW_TESTING', True, bool)
+DEBUG = env('LINTREVIEW_FLASK_DEBUG', True, boolean_value)
+TESTING = env('LINTREVIEW_TESTING', True, boolean_value)
 if os.environ.get('LINTREVIEW_SERVER_NAME') is not None:
     SERVER_NAME = env('LINTREVIEW_SERVER_NAME')
 
@@ -62,6 +68,95 @@ CELERY_ENABLE_UTC = True
 # directories to prevent collisions.
 WORKSPACE = env('LINTREVIEW_WORKSPACE', '/tmp/workspace')
 
+# Keep a bare mirror of each repository in WORKSPACE and clone pull
+# requests from it, so only new commits are fetched for each review.
+# When the mirrors use more than GIT_MIRROR_BUDGET bytes the least
+# recently used mirrors are removed. Set to 0 to never remove mirrors.
+GIT_MIRROR_CACHE = env('LINTREVIEW_GIT_MIRROR_CACHE', False, boolean_value)
+GIT_MIRROR_BUDGET = env('LINTREVIEW_GIT_MIRROR_BUDGET', 20 * 1024 ** 3, int)
+
+# Only check out the directories containing changed files, the files in
+# the repository root and the directories of tool config files. Without a
+# mirror, clones are shallow and only fetch the file contents that are
+# checked out. Tools like pytype and mypy always get a full checkout.
+# Requires git 2.25 or newer, and the whole repository is checked out with
+# older versions. Servers that don't support partial clones send every file.
+GIT_SPARSE_CHECKOUT = env('LINTREVIEW_GIT_SPARSE_CHECKOUT', False, boolean_value)
+
+# Diff pull requests in their repository mirror with `git diff base...head`
+# instead of reading the patches from the GitHub API, which omits the
+# patches of large files and truncates large pull requests. Requires
+# GIT_MIRROR_CACHE. The API is used when the commits have no merge base.
+GIT_LOCAL_DIFF = env('LINTREVIEW_GIT_LOCAL_DIFF', False, boolean_value)
+
+# The maximum number of tool containers a single review
+# will run at the same time. Set to 1 to run tools one at a time.
+# Tools and the shards their files are split into share this limit.
+MAX_PARALLEL_CONTAINERS = env('LINTREVIEW_MAX_PARALLEL_CONTAINERS', 1, int)
+
+# Keep warm containers for each tool image and run tool commands
+# in them with `docker exec`. Each image and checkout will keep at most
+# DOCKER_POOL_SIZE idle containers. Set to 0 to disable pooling.
+# The containers for a checkout are removed when its review finishes.
+DOCKER_POOL_SIZE = env('LINTREVIEW_DOCKER_POOL_SIZE', 0, int)
+
+# Override the pool size for specific images.
+# eg DOCKER_POOL_IMAGE_SIZES='{"python2": 4}'
+DOCKER_POOL_IMAGE_SIZES = env('LINTREVIEW_DOCKER_POOL_IMAGE_SIZES', None, json.loads)
+
+# Pooled containers are replaced after this many commands.
+DOCKER_POOL_MAX_USES = env('LINTREVIEW_DOCKER_POOL_MAX_USES', 50, int)
+
+# Pooled containers idle for longer than this many seconds are removed.
+DOCKER_POOL_IDLE_TIMEOUT = env('LINTREVIEW_DOCKER_POOL_IDLE_TIMEOUT', 300, int)
+
+# Tool images with plugins installed are kept between reviews.
+# When the cached images use more than this many bytes, the least
+# recently used images are removed. Set to 0 to never remove images.
+IMAGE_CACHE_BUDGET = env('LINTREVIEW_IMAGE_CACHE_BUDGET', 5 * 1024 ** 3, int)
+
+# Resource limits for each tool container. Repositories can lower
+# these in the `tool_*` sections of their .lintrc, but can't raise them.
+# Set a limit to 0 to disable it. TOOL_MEMORY_LIMIT accepts sizes like '1g'.
+TOOL_TIMEOUT = env('LINTREVIEW_TOOL_TIMEOUT', 300, int)
+TOOL_CPUS = env('LINTREVIEW_TOOL_CPUS', 0, float)
+TOOL_CPU_SHARES = env('LINTREVIEW_TOOL_CPU_SHARES', 0, int)
+TOOL_MEMORY_LIMIT = env('LINTREVIEW_TOOL_MEMORY_LIMIT', '0')
+TOOL_PIDS_LIMIT = env('LINTREVIEW_TOOL_PIDS_LIMIT', 0, int)
+
+# Reuse the lint results for files that haven't changed since they were
+# last reviewed. Results are stored in WORKSPACE/.results, and the least
+# recently used results are removed once they use more than
+# RESULT_CACHE_BUDGET bytes.
+RESULT_CACHE = env('LINTREVIEW_RESULT_CACHE', False, boolean_value)
+RESULT_CACHE_BUDGET = env('LINTREVIEW_RESULT_CACHE_BUDGET', 1024 ** 3, int)
+
+# Remember the results of each pull request review in WORKSPACE/.reviews.
+# When a pull request is updated, only the files that changed since the
+# last reviewed commit are linted, and the previous results are reused
+# for the other files. Every file is linted again when tool config files
+# like setup.cfg or dotfiles change.
+INCREMENTAL_REVIEWS = env('LINTREVIEW_INCREMENTAL_REVIEWS', False, boolean_value)
+
+# Stop reviewing a pull request when a newer review of it starts. The
+# containers of the older review are removed and its results are not
+# published. Reviews are tracked in WORKSPACE/.jobs.sqlite
+CANCEL_SUPERSEDED = env('LINTREVIEW_CANCEL_SUPERSEDED', False, boolean_value)
+
+# Tools that stream their output stop reading once these limits are
+# reached, and a comment is left saying the results were truncated.
+# Set to 0 to disable a limit.
+TOOL_OUTPUT_MAX_BYTES = env('LINTREVIEW_TOOL_OUTPUT_MAX_BYTES', 20 * 1024 ** 2, int)
+TOOL_OUTPUT_MAX_LINES = env('LINTREVIEW_TOOL_OUTPUT_MAX_LINES', 0, int)
+
+# Metrics for the web and worker processes on a host are served in the
+# Prometheus text format at /metrics. Each process stores its metrics in
+# WORKSPACE/.metrics, or METRICS_DIR when set. Set METRICS_TEXTFILE to
+# also write the metrics to a file for node_exporter's textfile collector.
+METRICS = env('LINTREVIEW_METRICS', False, boolean_value)
+METRICS_DIR = env('LINTREVIEW_METRICS_DIR', None)
+METRICS_TEXTFILE = env('LINTREVIEW_METRICS_TEXTFILE', None)
+
 # This config file contains default settings for .lintrc
 # LINTRC_DEFAULTS = './lintrc_defaults.ini'
 
@@ -90,6 +185,31 @@ GITHUB_OAUTH_TOKEN = env('GITHUB_OAUTH_TOKEN', None)
 # Default Retry settings are used if no config is provided.
 GITHUB_CLIENT_RETRY_OPTIONS = env('GITHUB_CLIENT_RETRY_OPTIONS', None, json.loads)
 
+# Store GitHub API responses that have an ETag in WORKSPACE/.github and
+# make later requests for them conditional. Unchanged resources return
+# 304 responses, which don't count against the rate limit. The least
+# recently used responses are removed once they use more than
+# GITHUB_CACHE_BUDGET bytes.
+GITHUB_CACHE = env('LINTREVIEW_GITHUB_CACHE', False, boolean_value)
+GITHUB_CACHE_BUDGET = env('LINTREVIEW_GITHUB_CACHE_BUDGET', 256 * 1024 ** 2,
+                          int)
+
+# Pace GitHub API requests from all the workers on a host. Requests are
+# limited to GITHUB_REQUESTS_PER_SECOND with bursts of up to
+# GITHUB_REQUEST_BURST requests. Publishing reviews takes priority over
+# reads, and reads pause when fewer than GITHUB_RATE_LIMIT_RESERVE
+# requests remain in the rate limit. Requests that GitHub rate limits
+# are retried when they would wait less than GITHUB_RATE_LIMIT_MAX_WAIT
+# seconds. The shared state is stored in WORKSPACE/.github-ratelimit.json
+GITHUB_RATE_LIMIT = env('LINTREVIEW_GITHUB_RATE_LIMIT', False, boolean_value)
+GITHUB_REQUESTS_PER_SECOND = env('LINTREVIEW_GITHUB_REQUESTS_PER_SECOND', 5,
+                                 float)
+GITHUB_REQUEST_BURST = env('LINTREVIEW_GITHUB_REQUEST_BURST', 10, int)
+GITHUB_RATE_LIMIT_RESERVE = env('LINTREVIEW_GITHUB_RATE_LIMIT_RESERVE', 100,
+                                int)
+GITHUB_RATE_LIMIT_MAX_WAIT = env('LINTREVIEW_GITHUB_RATE_LIMIT_MAX_WAIT', 300,
+                                 int)
+
 # Set to a path containing a custom CA bundle.
 # This is useful when you have github:enterprise on an internal
 # network with self-signed certificates.
@@ -112,7 +232,7 @@ GITHUB_AUTHOR_EMAIL = env('LINTREVIEW_GITHUB_AUTHOR_EMAIL',
 
 # Publish failing result as pull requests status
 # If false, reviews with comments will get a 'success' build status.
-PULLREQUEST_STATUS = env('LINTREVIEW_PULLREQUEST_STATUS', True, bool)
+PULLREQUEST_STATUS = env('LINTREVIEW_PULLREQUEST_STATUS', True, boolean_value)
 
 # Uncomment this option to enable adding an issue comment
 # whenever a pull request passes all checks.
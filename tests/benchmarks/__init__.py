@@ -0,0 +1,105 @@
+"""
+Benchmarks for the hot paths of a review.
+
+Benchmarks are not collected by the test runner. Run a
+benchmark module directly, e.g.
+
+    python -m tests.benchmarks.bench_diff
+
+The suite module times all of the hot paths on a synthetic pull
+request and can save and compare baselines:
+
+    python -m tests.benchmarks.suite --save baseline.json
+    python -m tests.benchmarks.suite --compare baseline.json
+
+The replay module posts webhooks to the web app and processes the
+jobs in worker processes with fake GitHub, git and docker backends
+to measure throughput, queue wait and per stage latency:
+
+    python -m tests.benchmarks.replay --workers 4 --rate 10
+"""
+from __future__ import absolute_import, print_function
+import json
+import timeit
+
+from lintreview.diff import DiffAdapter
+
+
+def make_patch(hunks, lines):
+    """Generate a unified diff patch with `hunks` hunks that
+    each add `lines` lines and remove one line.
+    """
+    blocks = []
+    start = 1
+    for _ in range(hunks):
+        header = '@@ -{0},{1} +{0},{2} @@\n'.format(start, lines, lines + 1)
+        body = [' context line']
+        body.append('-removed line')
+        body.extend('+added line {}'.format(i) for i in range(lines))
+        body.append(' context line')
+        blocks.append(header + '\n'.join(body) + '\n')
+        start += lines + 10
+    return ''.join(blocks)
+
+
+def make_filename(i):
+    return 'src/module_{}/file_{}.py'.format(i % 50, i)
+
+
+def make_diff_text(files, hunks, lines):
+    """Generate `git diff` output for a synthetic pull request."""
+    patch = make_patch(hunks, lines)
+    blocks = []
+    for i in range(files):
+        filename = make_filename(i)
+        blocks.append(
+            'diff --git a/{0} b/{0}\n'
+            'index 1234567..89abcde 100644\n'
+            '--- a/{0}\n'
+            '+++ b/{0}\n'.format(filename) + patch)
+    return ''.join(blocks)
+
+
+def make_pull_files_json(files, hunks, lines):
+    """Generate the JSON the GitHub API returns for the files
+    of a synthetic pull request.
+    """
+    patch = make_patch(hunks, lines)
+    url = 'https://github.com/markstory/lint-test/{}/abc123/{}'
+    data = [
+        {
+            'filename': make_filename(i),
+            'sha': '{:040x}'.format(i),
+            'blob_url': url.format('blob', make_filename(i)),
+            'raw_url': url.format('raw', make_filename(i)),
+            'contents_url': url.format('contents', make_filename(i)),
+            'status': 'modified',
+            'additions': hunks * lines,
+            'deletions': hunks,
+            'changes': hunks * (lines + 1),
+            'patch': patch,
+        }
+        for i in range(files)
+    ]
+    return json.dumps(data)
+
+
+def make_pull_files(files, hunks, lines):
+    """Generate GitHub shaped pull request files for a synthetic PR."""
+    patch = make_patch(hunks, lines)
+    return [
+        DiffAdapter(
+            patch=patch,
+            filename=make_filename(i),
+            sha='abc{}'.format(i),
+            status='modified',
+            additions=hunks * lines,
+            deletions=hunks,
+            changes=hunks * (lines + 1))
+        for i in range(files)
+    ]
+
+
+def best_of(func, repeat=5, number=1):
+    """Get the best wall time in seconds of `func` over `repeat` runs."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
@@ -0,0 +1,39 @@
+"""
+Per-file lookup cost of DiffCollection as the number of files grows.
+
+The cost of each lookup should stay flat when the number of files
+in a pull request increases.
+"""
+from __future__ import absolute_import, print_function
+
+from lintreview.diff import DiffCollection
+from tests.benchmarks import best_of, make_pull_files
+
+FILE_COUNTS = (10, 100, 1000, 5000)
+LOOKUPS = 20000
+
+
+def lookups(changes, filenames):
+    count = len(filenames)
+    for i in range(LOOKUPS):
+        filename = filenames[i % count]
+        line = i % 40 + 1
+        changes.has_line_changed(filename, line)
+        changes.line_position(filename, line)
+
+
+def main():
+    print('{:>8} {:>14} {:>16}'.format('files', 'build (ms)', 'lookup (us)'))
+    for files in FILE_COUNTS:
+        pull_files = make_pull_files(files, hunks=3, lines=10)
+        build = best_of(lambda: DiffCollection(pull_files), repeat=3)
+
+        changes = DiffCollection(pull_files)
+        filenames = changes.get_files()
+        elapsed = best_of(lambda: lookups(changes, filenames), repeat=3)
+        print('{:>8} {:>14.2f} {:>16.3f}'.format(
+            files, build * 1000, elapsed / LOOKUPS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Memory and time used to parse a synthetic diff with 50k hunks.
+
+Reports the peak memory used while parsing, the memory retained
+by the parsed Diff and the cost of line lookups. The number of hunks
+can be passed as an argument.
+"""
+from __future__ import absolute_import, print_function
+import gc
+import sys
+
+from lintreview.diff import Diff
+from tests.benchmarks import best_of, make_patch
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover - python 2
+    tracemalloc = None
+
+HUNKS = 50000
+LINES = 5
+LOOKUPS = 100000
+
+
+def measure_memory(patch):
+    """Get the peak and retained memory in bytes of parsing `patch`"""
+    gc.collect()
+    tracemalloc.start()
+    diff = Diff(patch, 'big_file.py', 'abc123')
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del diff
+    return peak, retained
+
+
+def lookups(diff, last_line):
+    for i in range(LOOKUPS):
+        line = (i * 7919) % last_line + 1
+        diff.has_line_changed(line)
+        diff.line_position(line)
+
+
+def main(hunks=HUNKS):
+    patch = make_patch(hunks, LINES)
+    print('hunks={} patch size={:.1f}MB'.format(hunks, len(patch) / 1e6))
+
+    parse = best_of(lambda: Diff(patch, 'big_file.py', 'abc123'), repeat=3)
+    print('parse: {:.1f} ms'.format(parse * 1000))
+
+    diff = Diff(patch, 'big_file.py', 'abc123')
+    last_line = hunks * (LINES + 10)
+    elapsed = best_of(lambda: lookups(diff, last_line), repeat=3)
+    print('lookup: {:.3f} us'.format(elapsed / LOOKUPS * 1e6))
+
+    union = best_of(lambda: (diff.added_lines(), diff.deleted_lines()))
+    print('added/deleted lines: {:.3f} ms'.format(union * 1000))
+
+    if tracemalloc is None:
+        print('memory: tracemalloc is not available')
+        return
+    peak, retained = measure_memory(patch)
+    print('memory: peak {:.1f}MB retained {:.1f}MB'.format(
+        peak / 1e6, retained / 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,515 @@
+"""
+Replay pull request webhooks against lintreview.web and measure
+end to end throughput.
+
+Webhooks are posted to the web app at a fixed rate. Jobs are handed
+to worker processes that run tasks.process_pull_request with fake
+GitHub, git and docker backends, so the harness only measures
+lintreview itself and the latencies it is configured with.
+
+    python -m tests.benchmarks.replay --workers 4 --rate 10 --repeat 20
+    python -m tests.benchmarks.replay payloads.jsonl --docker-latency 2
+
+`payloads` is a file with one recorded webhook payload per line. When
+it is omitted the pull request fixture is replayed with different
+pull request numbers and heads.
+"""
+from __future__ import absolute_import, print_function
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager
+from mock import patch
+
+from tests import load_fixture
+from tests.benchmarks import make_pull_files
+
+DEFAULT_LINTRC = """
+[tools]
+linters = flake8
+"""
+
+# Settings that keep reviews independent of each other and of
+# the network.
+CONFIG_OVERRIDES = {
+    'RESULT_CACHE': False,
+    'INCREMENTAL_REVIEWS': False,
+    'CANCEL_SUPERSEDED': False,
+    'GIT_LOCAL_DIFF': False,
+    'GITHUB_CACHE': False,
+    'GITHUB_RATE_LIMIT': False,
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+class Latencies(object):
+    """Seconds that each fake backend operation takes."""
+
+    def __init__(self, github=0.0, clone=0.0, docker=0.0):
+        self.github = github
+        self.clone = clone
+        self.docker = docker
+
+
+class FakeRepository(object):
+    """Stands in for lintreview.repo.GithubRepository"""
+
+    # Set by install_fakes()
+    options = None
+
+    def __init__(self, config, user, repo_name):
+        self.user = user
+        self.repo_name = repo_name
+
+    def _call(self):
+        time.sleep(self.options['latencies'].github)
+
+    def pull_request(self, number):
+        self._call()
+        payload = self.options['pulls'][(self.user, self.repo_name, number)]
+        return FakePullRequest(payload, self.options)
+
+    def lintrc(self, ref):
+        self._call()
+        return self.options['lintrc']
+
+    def ensure_label(self, label):
+        self._call()
+
+    def create_status(self, sha, state, description):
+        self._call()
+
+    def update_checkrun(self, run_id, checkrun):
+        self._call()
+
+
+class FakePullRequest(object):
+    """Stands in for lintreview.repo.GithubPullRequest with
+    canned files.
+    """
+
+    def __init__(self, data, options):
+        self.data = data
+        self.options = options
+
+    def _call(self):
+        time.sleep(self.options['latencies'].github)
+
+    @property
+    def number(self):
+        return self.data['number']
+
+    @property
+    def display_name(self):
+        return u'%s/pull/%s' % (self.data['head']['repo']['full_name'],
+                                self.data['number'])
+
+    @property
+    def head(self):
+        return self.data['head']['sha']
+
+    @property
+    def base(self):
+        return self.data['base']['sha']
+
+    @property
+    def clone_url(self):
+        return self.data['head']['repo']['clone_url']
+
+    @property
+    def base_clone_url(self):
+        return self.data['base']['repo']['clone_url']
+
+    @property
+    def target_branch(self):
+        return self.data['base']['ref']
+
+    @property
+    def head_branch(self):
+        return self.data['head']['ref']
+
+    from_private_fork = False
+    maintainer_can_modify = True
+
+    def files(self):
+        self._call()
+        return make_pull_files(*self.options['diff'])
+
+    def commits(self):
+        self._call()
+        return []
+
+    def review_comments(self):
+        self._call()
+        return []
+
+    def remove_label(self, label_name):
+        self._call()
+
+    def add_label(self, label_name):
+        self._call()
+
+    def create_comment(self, body):
+        self._call()
+
+    def create_review(self, review):
+        self._call()
+
+    def create_review_comment(self, body, commit_id, path, position):
+        self._call()
+
+
+def fake_clone(options):
+    def clone_or_update(config, url, path, head, paths=None):
+        time.sleep(options['latencies'].clone)
+        if not os.path.exists(path):
+            os.makedirs(path)
+    return clone_or_update
+
+
+def fake_output(options, command):
+    """Quickfix style problems for the files in a tool command."""
+    import lintreview.docker as docker
+    lines = []
+    for arg in command:
+        if not arg.startswith(docker.DOCKER_BASE + '/'):
+            continue
+        for i in range(options['problems']):
+            lines.append(u'{}:{}:1: W000 Replayed problem {}'.format(
+                arg, 2 + i, i))
+    return u'\n'.join(lines) + u'\n'
+
+
+def fake_run(options):
+    def run(image, command, source_dir, **kwargs):
+        time.sleep(options['latencies'].docker)
+        return fake_output(options, command)
+    return run
+
+
+def fake_run_stream(options):
+    import lintreview.docker as docker
+
+    def run_stream(image, command, source_dir, **kwargs):
+        time.sleep(options['latencies'].docker)
+        output = fake_output(options, command).encode('utf8')
+        return docker.OutputStream(iter([output]))
+    return run_stream
+
+
+@contextmanager
+def install_fakes(options):
+    """Replace GitHub, git and docker with fakes in this process."""
+    FakeRepository.options = options
+    fakes = [
+        patch('lintreview.tasks.GithubRepository', FakeRepository),
+        patch('lintreview.git.clone_or_update', fake_clone(options)),
+        patch('lintreview.docker.image_exists', return_value=True),
+        patch('lintreview.docker.run', fake_run(options)),
+        patch('lintreview.docker.run_stream', fake_run_stream(options)),
+    ]
+    for fake in fakes:
+        fake.start()
+    try:
+        yield
+    finally:
+        for fake in reversed(fakes):
+            fake.stop()
+
+
+def configure(workspace):
+    """Apply the harness settings to the task config."""
+    import lintreview.cache as cache
+    import lintreview.metrics as metrics
+    import lintreview.tasks as tasks
+    tasks.config.update(CONFIG_OVERRIDES)
+    tasks.config['WORKSPACE'] = workspace
+    cache.configure_results(tasks.config)
+    metrics.configure(tasks.config)
+
+
+def worker_main(jobs, results, options):
+    """Run queued jobs until a None job is received."""
+    import lintreview.tasks as tasks
+    import lintreview.timing as timing
+
+    configure(options['workspace'])
+    summaries = []
+    record = timing.record
+
+    @contextmanager
+    def recording():
+        with record() as timings:
+            try:
+                yield timings
+            finally:
+                summaries.append(timings.summary())
+
+    with install_fakes(options), \
+            patch('lintreview.timing.record', recording):
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            args, kwargs = job
+            started = time.time()
+            error = None
+            try:
+                tasks.process_pull_request(*args, **kwargs)
+            except Exception:
+                error = traceback.format_exc()
+            results.put({
+                'pid': os.getpid(),
+                'queue_wait': started - kwargs['queued_at'],
+                'finished': time.time(),
+                'summary': summaries.pop() if summaries else {},
+                'error': error,
+            })
+    results.put({
+        'pid': os.getpid(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+
+
+def load_payloads(path=None, repeat=1):
+    """Read webhook payloads, one JSON document per line.
+
+    Without a path, the pull request fixture is used with a
+    different number and head for each replay.
+    """
+    if path:
+        with open(path) as f:
+            payloads = [json.loads(line) for line in f if line.strip()]
+        return payloads * repeat
+
+    fixture = json.loads(load_fixture('pull_request_update.json'))
+    payloads = []
+    for i in range(repeat):
+        payload = json.loads(json.dumps(fixture))
+        payload['number'] = payload['pull_request']['number'] = i + 1
+        payload['pull_request']['head']['sha'] = '{:040x}'.format(i + 1)
+        payloads.append(payload)
+    return payloads
+
+
+def percentiles(values):
+    """Get the p50, p90, p99 and max of `values`."""
+    values = sorted(values)
+    if not values:
+        return {}
+    data = {}
+    for p in PERCENTILES:
+        # Nearest rank
+        index = max(0, int(math.ceil(p / 100.0 * len(values))) - 1)
+        data['p{}'.format(p)] = round(values[index], 4)
+    data['max'] = round(values[-1], 4)
+    return data
+
+
+def replay(payloads, workers=4, rate=10.0, latencies=None,
+           diff=(10, 5, 5), problems=2, lintrc=DEFAULT_LINTRC):
+    """Post `payloads` to lintreview.web at `rate` per second and
+    process the queued jobs in `workers` processes.
+
+    `diff` is the number of files, hunks per file and lines per hunk
+    of each pull request. Tools report `problems` problems per file.
+    Returns a report of the run.
+    """
+    import lintreview.web as web
+
+    workspace = tempfile.mkdtemp()
+    configure(workspace)
+    options = {
+        'workspace': workspace,
+        'latencies': latencies or Latencies(),
+        'diff': diff,
+        'problems': problems,
+        'lintrc': lintrc,
+        'pulls': {},
+    }
+    for payload in payloads:
+        pull = payload['pull_request']
+        key = (pull['base']['repo']['owner']['login'],
+               pull['base']['repo']['name'],
+               pull['number'])
+        options['pulls'][key] = pull
+
+    jobs = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker_main,
+                                args=(jobs, results, options))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    class Queue(object):
+        queued = 0
+
+        def delay(self, *args, **kwargs):
+            self.queued += 1
+            jobs.put((args, kwargs))
+
+    queue = Queue()
+    client = web.app.test_client()
+    delivery = []
+    started = time.time()
+    try:
+        with patch('lintreview.web.process_pull_request', queue):
+            for i, payload in enumerate(payloads):
+                wait = started + i / float(rate) - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                sent = time.time()
+                client.post('/review/start',
+                            data=json.dumps(payload),
+                            content_type='application/json',
+                            headers={'X-Github-Event': 'pull_request'})
+                delivery.append(time.time() - sent)
+        for _ in processes:
+            jobs.put(None)
+
+        done = []
+        rss = {}
+        while len(rss) < len(processes):
+            result = results.get()
+            if 'max_rss_kb' in result:
+                rss[result['pid']] = result['max_rss_kb']
+            else:
+                done.append(result)
+    finally:
+        for process in processes:
+            process.join()
+        shutil.rmtree(workspace, True)
+
+    return build_report(started, len(payloads), queue.queued, delivery,
+                        done, rss)
+
+
+def build_report(started, sent, queued, delivery, done, rss):
+    finished = max([r['finished'] for r in done] or [started])
+    elapsed = max(finished - started, 1e-9)
+
+    stages = {}
+    tools = {}
+    for result in done:
+        summary = result['summary']
+        for name, span in summary.get('stages', {}).items():
+            stages.setdefault(name, []).append(span['seconds'])
+        for name, span in summary.get('tools', {}).items():
+            tools.setdefault(name, []).append(span['seconds'])
+
+    errors = [r['error'] for r in done if r['error']]
+    return {
+        'webhooks': sent,
+        'jobs': queued,
+        'completed': len(done) - len(errors),
+        'published': len([r for r in done
+                          if 'publish' in r['summary'].get('stages', {})]),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'jobs_per_second': round(len(done) / elapsed, 3),
+        'delivery': percentiles(delivery),
+        'queue_wait': percentiles([r['queue_wait'] for r in done]),
+        'job': percentiles([r['summary'].get('seconds', 0) for r in done]),
+        'stages': dict((k, percentiles(v)) for k, v in stages.items()),
+        'tools': dict((k, percentiles(v)) for k, v in tools.items()),
+        'max_rss_kb': dict((str(pid), kb) for pid, kb in rss.items()),
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def print_report(report):
+    print('{webhooks} webhooks, {jobs} jobs, {completed} completed, '
+          '{published} published, {errors} errors in {seconds}s'.format(
+              **report))
+    print('{:<28}{}'.format('jobs/sec', report['jobs_per_second']))
+    rows = [('webhook delivery', report['delivery']),
+            ('queue wait', report['queue_wait']),
+            ('job', report['job'])]
+    rows.extend(('stage ' + k, v) for k, v in sorted(report['stages'].items()))
+    rows.extend(('tool ' + k, v) for k, v in sorted(report['tools'].items()))
+    print('{:<28}{:>10}{:>10}{:>10}{:>10}'.format(
+        'seconds', 'p50', 'p90', 'p99', 'max'))
+    for name, values in rows:
+        if not values:
+            continue
+        print('{:<28}{:>10}{:>10}{:>10}{:>10}'.format(
+            name, values['p50'], values['p90'], values['p99'],
+            values['max']))
+    for pid, kb in sorted(report['max_rss_kb'].items()):
+        print('{:<28}{:>10.1f} MB'.format('peak rss ' + pid, kb / 1024.0))
+    if report['first_error']:
+        print('First error:\n' + report['first_error'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay webhooks against lintreview with fake backends.')
+    parser.add_argument('payloads', nargs='?',
+                        help='File with one webhook payload per line.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Worker processes.')
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help='Webhooks posted per second.')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='How many times the payloads are replayed.')
+    parser.add_argument('--files', type=int, default=10,
+                        help='Changed files in each pull request.')
+    parser.add_argument('--hunks', type=int, default=5,
+                        help='Hunks in each changed file.')
+    parser.add_argument('--lines', type=int, default=5,
+                        help='Added lines in each hunk.')
+    parser.add_argument('--problems', type=int, default=2,
+                        help='Problems tools report for each file.')
+    parser.add_argument('--github-latency', type=float, default=0.05,
+                        help='Seconds each GitHub API call takes.')
+    parser.add_argument('--clone-latency', type=float, default=0.2,
+                        help='Seconds each clone takes.')
+    parser.add_argument('--docker-latency', type=float, default=0.5,
+                        help='Seconds each tool container takes.')
+    parser.add_argument('--lintrc',
+                        help='The .lintrc used for every pull request.')
+    parser.add_argument('--json',
+                        help='Also write the report as JSON to this file.')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Show the log output of reviews.')
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.getLogger('lintreview').setLevel(logging.WARNING)
+
+    lintrc = DEFAULT_LINTRC
+    if args.lintrc:
+        with open(args.lintrc) as f:
+            lintrc = f.read()
+    latencies = Latencies(github=args.github_latency,
+                          clone=args.clone_latency,
+                          docker=args.docker_latency)
+    report = replay(
+        load_payloads(args.payloads, args.repeat),
+        workers=args.workers,
+        rate=args.rate,
+        latencies=latencies,
+        diff=(args.files, args.hunks, args.lines),
+        problems=args.problems,
+        lintrc=lintrc)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
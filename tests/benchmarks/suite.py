@@ -0,0 +1,239 @@
+"""
+Benchmark suite for diff parsing, position mapping and Problems.
+
+Each benchmark is timed on a synthetic pull request of
+files x hunks x lines. The best wall time and the peak memory
+traced while running are reported. Results can be saved as a
+JSON baseline and compared with a later run:
+
+    python -m tests.benchmarks.suite --save before.json
+    python -m tests.benchmarks.suite --compare before.json
+
+When comparing, the exit code is 1 if a benchmark is slower than
+the baseline by more than --threshold.
+"""
+from __future__ import absolute_import, print_function
+import argparse
+import gc
+import json
+import platform
+import sys
+from collections import OrderedDict
+
+from lintreview.diff import Diff, DiffCollection, parse_diff
+from lintreview.review import Comment, Problems, Review
+from tests import create_pull_files
+from tests.benchmarks import (
+    best_of,
+    make_diff_text,
+    make_patch,
+    make_pull_files_json
+)
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover - python 2
+    tracemalloc = None
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(func):
+    """Register a benchmark.
+
+    Benchmarks take the synthetic pull request and return a
+    function that runs the code being measured. Work done before
+    returning is setup and isn't measured.
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+class PullRequest(object):
+    """A synthetic pull request and the data benchmarks need."""
+
+    def __init__(self, files, hunks, lines):
+        self.files = files
+        self.hunks = hunks
+        self.lines = lines
+        # A single large file with the hunks of every file.
+        self.patch = make_patch(files * hunks, lines)
+        self.diff_text = make_diff_text(files, hunks, lines)
+        self.pull_files = create_pull_files(
+            make_pull_files_json(files, hunks, lines))
+        self.changes = DiffCollection(self.pull_files)
+
+    def problems(self):
+        """Problems on every third line of each file, about half
+        of which are on added lines.
+        """
+        last_line = self.hunks * (self.lines + 10)
+        for change in self.changes:
+            for line in range(1, last_line, 3):
+                yield change.filename, line, 'Line {} is bad'.format(line)
+
+    def filled_problems(self):
+        problems = Problems(changes=self.changes)
+        for filename, line, body in self.problems():
+            problems.add(filename, line, body)
+        return problems
+
+
+@benchmark
+def parse_diff_text(pull):
+    return lambda: parse_diff(pull.diff_text)
+
+
+@benchmark
+def parse_hunks(pull):
+    return lambda: Diff(pull.patch, 'file.py', 'abc123')
+
+
+@benchmark
+def diff_collection(pull):
+    return lambda: DiffCollection(pull.pull_files)
+
+
+@benchmark
+def problems_add(pull):
+    problems = list(pull.problems())
+
+    def run():
+        collection = Problems(changes=pull.changes)
+        for filename, line, body in problems:
+            collection.add(filename, line, body)
+    return run
+
+
+@benchmark
+def limit_to_changes(pull):
+    problems = pull.filled_problems()
+    return problems.limit_to_changes
+
+
+@benchmark
+def remove_existing(pull):
+    problems = pull.filled_problems()
+    review = Review(None, None, None)
+    # Half of the problems have already been posted.
+    for i, problem in enumerate(problems):
+        if i % 2 == 0:
+            review._comments.add(Comment(
+                problem.filename, None, problem.position, problem.body))
+    return lambda: review.remove_existing(problems)
+
+
+@benchmark
+def iter_chunks(pull):
+    problems = pull.filled_problems()
+    return lambda: list(problems.iter_chunks(50))
+
+
+def measure(name, pull, repeat):
+    """Get the best time and peak memory of a benchmark."""
+    setup = BENCHMARKS[name]
+    # Benchmarks that change their data are set up for each run.
+    seconds = min(best_of(setup(pull), repeat=1) for _ in range(repeat))
+
+    peak = None
+    if tracemalloc is not None:
+        run = setup(pull)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return OrderedDict([('seconds', seconds), ('peak_bytes', peak)])
+
+
+def run_suite(pull, names, repeat):
+    results = OrderedDict()
+    for name in names:
+        results[name] = measure(name, pull, repeat)
+    return results
+
+
+def format_bytes(value):
+    if value is None:
+        return '-'
+    return '{:.1f}MB'.format(value / 1e6)
+
+
+def report(results, baseline=None, threshold=0.25):
+    """Print the results, compared with baseline when given.
+
+    Returns the names of benchmarks slower than the baseline
+    by more than threshold.
+    """
+    previous = (baseline or {}).get('results', {})
+    regressions = []
+    print('{:<20} {:>12} {:>12} {:>10}'.format(
+        'benchmark', 'time (ms)', 'peak mem', 'change'))
+    for name, result in results.items():
+        change = ''
+        before = previous.get(name)
+        if before and before['seconds']:
+            ratio = result['seconds'] / before['seconds'] - 1
+            change = '{:+.1%}'.format(ratio)
+            if ratio > threshold:
+                regressions.append(name)
+                change += ' !'
+        print('{:<20} {:>12.2f} {:>12} {:>10}'.format(
+            name,
+            result['seconds'] * 1000,
+            format_bytes(result['peak_bytes']),
+            change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--hunks', type=int, default=10)
+    parser.add_argument('--lines', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        help='Only run these benchmarks')
+    parser.add_argument('--save', help='Save the results as a baseline')
+    parser.add_argument('--compare', help='Compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown when comparing')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        size = baseline.get('size', {})
+        if size != {'files': args.files, 'hunks': args.hunks,
+                    'lines': args.lines}:
+            print('Warning: the baseline used a different size', size)
+
+    pull = PullRequest(args.files, args.hunks, args.lines)
+    print('files={} hunks={} lines={}'.format(
+        args.files, args.hunks, args.lines))
+    results = run_suite(pull, args.only or list(BENCHMARKS), args.repeat)
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        data = OrderedDict([
+            ('python', platform.python_version()),
+            ('size', OrderedDict([
+                ('files', args.files),
+                ('hunks', args.hunks),
+                ('lines', args.lines),
+            ])),
+            ('results', results),
+        ])
+        with open(args.save, 'w') as f:
+            json.dump(data, f, indent=2)
+        print('Saved baseline to', args.save)
+
+    if regressions:
+        print('Slower than the baseline:', ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
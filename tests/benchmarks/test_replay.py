@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+from tests.benchmarks import replay
+
+SMALL = ['--workers', '2', '--repeat', '3', '--rate', '100',
+         '--files', '2', '--hunks', '1', '--lines', '2',
+         '--github-latency', '0', '--clone-latency', '0',
+         '--docker-latency', '0']
+
+
+class TestReplay(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.report = os.path.join(self.tmp_dir, 'report.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_payloads(self):
+        payloads = replay.load_payloads(repeat=3)
+        self.assertEqual([1, 2, 3], [p['number'] for p in payloads])
+        heads = set(p['pull_request']['head']['sha'] for p in payloads)
+        self.assertEqual(3, len(heads))
+
+    def test_load_payloads__file(self):
+        path = os.path.join(self.tmp_dir, 'payloads.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"number": 1}\n\n{"number": 2}\n')
+        payloads = replay.load_payloads(path, repeat=2)
+        self.assertEqual([1, 2, 1, 2], [p['number'] for p in payloads])
+
+    def test_percentiles(self):
+        data = replay.percentiles([float(i) for i in range(1, 101)])
+        self.assertEqual(50.0, data['p50'])
+        self.assertEqual(90.0, data['p90'])
+        self.assertEqual(99.0, data['p99'])
+        self.assertEqual(100.0, data['max'])
+        self.assertEqual({}, replay.percentiles([]))
+
+    @patch('tests.benchmarks.replay.print', create=True)
+    def test_main(self, _print):
+        self.assertEqual(0, replay.main(SMALL + ['--json', self.report]))
+        with open(self.report) as f:
+            report = json.load(f)
+        self.assertEqual(3, report['webhooks'])
+        self.assertEqual(3, report['jobs'])
+        self.assertEqual(3, report['published'])
+        self.assertEqual(0, report['errors'])
+        self.assertIn('run_tools', report['stages'])
+        self.assertIn('p99', report['queue_wait'])
+        self.assertEqual(2, len(report['max_rss_kb']))
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+from tests.benchmarks import suite
+
+SMALL = ['--files', '3', '--hunks', '2', '--lines', '2', '--repeat', '1']
+
+
+class TestSuite(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.tmp_dir, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @patch('tests.benchmarks.suite.print', create=True)
+    def test_save_and_compare(self, _print):
+        self.assertEqual(0, suite.main(SMALL + ['--save', self.baseline]))
+        with open(self.baseline) as f:
+            data = json.load(f)
+        self.assertEqual(list(suite.BENCHMARKS), list(data['results']))
+        self.assertEqual(3, data['size']['files'])
+
+        for result in data['results'].values():
+            result['seconds'] = 1000
+        with open(self.baseline, 'w') as f:
+            json.dump(data, f)
+        self.assertEqual(0, suite.main(SMALL + ['--compare', self.baseline]))
+
+    @patch('tests.benchmarks.suite.print', create=True)
+    def test_compare__regression(self, _print):
+        data = {
+            'size': {'files': 3, 'hunks': 2, 'lines': 2},
+            'results': {'iter_chunks': {'seconds': 1e-9, 'peak_bytes': 0}},
+        }
+        with open(self.baseline, 'w') as f:
+            json.dump(data, f)
+        args = SMALL + ['--compare', self.baseline, '--only', 'iter_chunks']
+        self.assertEqual(1, suite.main(args))
@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from mock import patch
+from six import StringIO
+from unittest import TestCase
+
+from lintreview.cli import check
+from lintreview.cli.parsers import create_parser
+from lintreview.review import InfoComment, Problems
+from tests import load_fixture
+
+lintrc = """
+[tools]
+linters = flake8
+"""
+
+
+def _git(path, *args):
+    command = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    command.extend(args)
+    return subprocess.check_output(command, cwd=path).decode('utf8').strip()
+
+
+def add_problems(lint_tools, files, commits, max_workers):
+    problems = lint_tools[0].problems
+    problems.add('lintreview/git.py', 152, 'Changed line')
+    problems.add('lintreview/git.py', 1, 'Unchanged line')
+
+
+class TestCheck(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp_dir, '.lintrc'), 'w') as f:
+            f.write(lintrc)
+        self.diff_file = os.path.join(self.tmp_dir, 'changes.diff')
+        with open(self.diff_file, 'w') as f:
+            f.write(load_fixture('diff/two_files.txt'))
+        patcher = patch('lintreview.cli.check.tools.run',
+                        side_effect=add_problems)
+        self.run_tools = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_check__diff_file(self):
+        problems, summary = check.run_check(
+            self.tmp_dir, diff_file=self.diff_file)
+
+        self.assertEqual(1, len(problems))
+        self.assertEqual('Changed line', list(problems)[0].body)
+        args = self.run_tools.call_args[0]
+        self.assertEqual('flake8', args[0][0].name)
+        self.assertEqual(['lintreview/git.py', 'tests/test_git.py'], args[1])
+        self.assertEqual([], args[2])
+        self.assertEqual(2, summary['files'])
+        self.assertEqual(1, summary['problems'])
+        self.assertIn('run_tools', summary['stages'])
+
+    def test_run_check__all_lines(self):
+        problems, _ = check.run_check(
+            self.tmp_dir, diff_file=self.diff_file, all_lines=True)
+        self.assertEqual(2, len(problems))
+
+    def test_run_check__lintrc_file(self):
+        other = os.path.join(self.tmp_dir, 'other.ini')
+        with open(other, 'w') as f:
+            f.write('[review]\nsummary_comment_threshold = 10\n')
+        with self.assertRaises(ValueError):
+            check.run_check(self.tmp_dir, diff_file=self.diff_file,
+                            lintrc_file=other)
+
+    def test_load_changes__base(self):
+        _git(self.tmp_dir, 'init', '-q')
+        _git(self.tmp_dir, 'add', '.lintrc')
+        _git(self.tmp_dir, 'commit', '-q', '-m', 'first')
+        base = _git(self.tmp_dir, 'rev-parse', 'HEAD')
+        with open(os.path.join(self.tmp_dir, 'app.py'), 'w') as f:
+            f.write('import os\n')
+        _git(self.tmp_dir, 'add', 'app.py')
+        _git(self.tmp_dir, 'commit', '-q', '-m', 'second')
+
+        changes = check.load_changes(self.tmp_dir, base=base)
+        self.assertEqual(['app.py'], changes.get_files())
+
+    def test_load_changes__requires_source(self):
+        with self.assertRaises(ValueError):
+            check.load_changes(self.tmp_dir)
+
+    def test_format_json(self):
+        problems = Problems()
+        problems.add('app.py', 3, 'Bad thing')
+        problems.add(InfoComment('Tool failed'))
+
+        data = json.loads(check.format_json(problems))
+        self.assertEqual([
+            {'filename': 'app.py', 'line': 3, 'level': 'error',
+             'body': 'Bad thing'},
+            {'filename': None, 'line': None, 'level': 'info',
+             'body': 'Tool failed'},
+        ], data)
+
+    def test_format_quickfix(self):
+        problems = Problems()
+        problems.add('app.py', 3, 'Bad thing\nOther thing')
+        problems.add(InfoComment('Tool failed'))
+
+        self.assertEqual(
+            'app.py:3: Bad thing Other thing\nTool failed\n',
+            check.format_quickfix(problems))
+        self.assertEqual('', check.format_quickfix(Problems()))
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_check__exit_code(self, stdout):
+        args = create_parser().parse_args([
+            'check', '--diff', self.diff_file, '--format', 'quickfix',
+            self.tmp_dir])
+        with self.assertRaises(SystemExit) as ctx:
+            args.func(args)
+        self.assertEqual(1, ctx.exception.code)
+        self.assertEqual('lintreview/git.py:152: Changed line\n',
+                         stdout.getvalue())
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_check__failure(self, stderr):
+        args = create_parser().parse_args([
+            'check', '--base', 'missing-ref', self.tmp_dir])
+        with self.assertRaises(SystemExit) as ctx:
+            args.func(args)
+        self.assertEqual(2, ctx.exception.code)
+        self.assertIn('Check failed', stderr.getvalue())
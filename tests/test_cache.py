@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import lintreview.cache as cache
+
+
+class TestCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read_json__missing(self):
+        path = os.path.join(self.tmp_dir, 'missing.json')
+        self.assertIsNone(cache.read_json(path))
+        self.assertEqual({}, cache.read_json(path, {}))
+
+    def test_read_json__invalid(self):
+        path = os.path.join(self.tmp_dir, 'invalid.json')
+        with open(path, 'w') as f:
+            f.write('{not json')
+        self.assertEqual({}, cache.read_json(path, {}))
+
+    def test_write_json(self):
+        path = os.path.join(self.tmp_dir, 'nested', 'data.json')
+        cache.write_json(path, {'a': 1})
+        self.assertEqual({'a': 1}, cache.read_json(path))
+        self.assertEqual(['data.json'], os.listdir(os.path.dirname(path)))
+
+    def test_locked(self):
+        path = os.path.join(self.tmp_dir, 'data.json')
+        with cache.locked(path):
+            cache.write_json(path, {'a': 1})
+        assert os.path.exists(path + '.lock')
+        self.assertEqual({'a': 1}, cache.read_json(path))
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.results = cache.ResultCache(self.tmp_dir, budget=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        cache.configure_results({})
+
+    def test_configure_results(self):
+        self.assertIsNone(cache.configure_results({}))
+        self.assertIsNone(cache.results())
+
+        results = cache.configure_results({
+            'RESULT_CACHE': True,
+            'RESULT_CACHE_BUDGET': 100,
+            'WORKSPACE': self.tmp_dir,
+        })
+        self.assertIs(results, cache.results())
+        self.assertEqual(os.path.join(self.tmp_dir, '.results'), results.path)
+        self.assertEqual(100, results.budget)
+
+    def test_configure_responses(self):
+        self.assertIsNone(cache.configure_responses({}))
+        self.assertIsNone(cache.responses())
+
+        responses = cache.configure_responses({
+            'GITHUB_CACHE': True,
+            'GITHUB_CACHE_BUDGET': 100,
+            'WORKSPACE': self.tmp_dir,
+        })
+        self.assertIs(responses, cache.responses())
+        self.assertEqual(os.path.join(self.tmp_dir, '.github'),
+                         responses.path)
+        self.assertEqual(100, responses.budget)
+        cache.configure_responses({})
+
+    def test_get_set(self):
+        self.assertIsNone(self.results.get('abcdef'))
+        self.results.set('abcdef', {'problems': []})
+        self.assertEqual({'problems': []}, self.results.get('abcdef'))
+        assert os.path.exists(os.path.join(self.tmp_dir, 'ab', 'abcdef.json'))
+
+    def test_evict(self):
+        self.results.set('aaaa', {'problems': [[1, 'old']]})
+        self.results.set('bbbb', {'problems': [[1, 'new']]})
+        old = time.time() - 3600
+        os.utime(os.path.join(self.tmp_dir, 'aa', 'aaaa.json'), (old, old))
+
+        self.assertEqual(0, self.results.evict(), 'No budget, no eviction')
+
+        self.results.budget = 30
+        self.assertEqual(1, self.results.evict())
+        self.assertIsNone(self.results.get('aaaa'))
+        self.assertIsNotNone(self.results.get('bbbb'))
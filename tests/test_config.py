@@ -213,3 +213,76 @@ class ReviewConfigTest(TestCase):
         ini = "[review]\nfail_on_comments = true"
         config = build_review_config(ini, app_config)
         self.assertEqual('failure', config.failed_review_status())
+
+    def test_fingerprint(self):
+        config = build_review_config(simple_ini, {'WORKSPACE': '/tmp'})
+        same = build_review_config(simple_ini, {'WORKSPACE': '/other'})
+        self.assertEqual(config.fingerprint(), same.fingerprint())
+
+        changed = build_review_config(simple_ini + '\n[tool_phpcs]\nstandard = PSR2\n')
+        self.assertNotEqual(config.fingerprint(), changed.fingerprint())
+
+    def test_sparse_checkout(self):
+        config = build_review_config(simple_ini)
+        self.assertFalse(config.sparse_checkout())
+
+        config = build_review_config(simple_ini, {'GIT_SPARSE_CHECKOUT': True})
+        self.assertTrue(config.sparse_checkout())
+
+    def test_tool_limits__undefined(self):
+        config = build_review_config(simple_ini)
+        self.assertEqual({}, config.tool_limits('phpcs'))
+
+    def test_tool_limits__app_config(self):
+        app_config = {
+            'TOOL_TIMEOUT': 300,
+            'TOOL_CPUS': 0,
+            'TOOL_MEMORY_LIMIT': '1g',
+            'TOOL_PIDS_LIMIT': 100,
+        }
+        config = build_review_config(simple_ini, app_config)
+        expected = {
+            'timeout': 300,
+            'memory': 1024 ** 3,
+            'pids_limit': 100,
+        }
+        self.assertEqual(expected, config.tool_limits('phpcs'))
+
+    def test_tool_limits__lintrc_lowers_app_config(self):
+        ini = """
+[tools]
+linters = pytype
+
+[tool_pytype]
+timeout = 600
+memory = 512m
+cpus = 1.5
+pids_limit = nope
+"""
+        app_config = {
+            'TOOL_TIMEOUT': 300,
+            'TOOL_MEMORY_LIMIT': '1g',
+            'TOOL_PIDS_LIMIT': 100,
+        }
+        config = build_review_config(ini, app_config)
+        expected = {
+            'timeout': 300,
+            'cpus': 1.5,
+            'memory': 512 * 1024 ** 2,
+            'pids_limit': 100,
+        }
+        self.assertEqual(expected, config.tool_limits('pytype'))
+
+    def test_max_parallel_containers__undefined(self):
+        config = build_review_config(simple_ini)
+        self.assertEqual(1, config.max_parallel_containers())
+
+    def test_max_parallel_containers__app_config(self):
+        config = build_review_config(simple_ini, {'MAX_PARALLEL_CONTAINERS': 4})
+        self.assertEqual(4, config.max_parallel_containers())
+
+        config = build_review_config(simple_ini, {'MAX_PARALLEL_CONTAINERS': '0'})
+        self.assertEqual(1, config.max_parallel_containers())
+
+        config = build_review_config(simple_ini, {'MAX_PARALLEL_CONTAINERS': 'nope'})
+        self.assertEqual(1, config.max_parallel_containers())
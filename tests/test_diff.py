@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 from . import load_fixture, create_pull_files
-from lintreview.diff import DiffCollection, Diff, parse_diff, ParseError
+from lintreview.diff import (
+    DiffAdapter, DiffCollection, Diff, parse_diff, parse_diff_lines,
+    ParseError)
 from unittest import TestCase
 from mock import patch
 import re
@@ -135,6 +137,39 @@ class TestDiffCollection(TestCase):
         filename = "Test/test_files/View/Parse/single.ctp"
         assert changes.first_changed_line(filename) == 3
 
+    def test_line_position(self):
+        changes = DiffCollection(self.two_files)
+        filename = 'Console/Command/Task/AssetBuildTask.php'
+
+        self.assertIsNone(changes.line_position('not there', 117))
+        self.assertIsNone(changes.line_position(filename, 1))
+        self.assertEqual(
+            changes[0].line_position(117),
+            changes.line_position(filename, 117))
+
+    def test_all_changes__same_file_twice(self):
+        first, second = self.two_files
+        second = DiffAdapter(
+            patch=second.patch,
+            filename=first.filename,
+            sha='def456',
+            status='modified',
+            additions=1,
+            deletions=1,
+            changes=1)
+        changes = DiffCollection([first, second])
+
+        found = changes.all_changes(first.filename)
+        self.assertEqual(2, len(found))
+        self.assertEqual([first.sha, 'def456'], [c.commit for c in found])
+
+        self.assertTrue(changes.has_line_changed(first.filename, 117))
+        self.assertTrue(changes.has_line_changed(first.filename, 3))
+        self.assertEqual(
+            found[0].line_position(117),
+            changes.line_position(first.filename, 117))
+        self.assertIsNone(changes.line_position(first.filename, 3))
+
     def assert_instances(self, collection, count, clazz):
         """
         Helper for checking a collection.
@@ -222,6 +257,90 @@ class TestDiff(TestCase):
             parse_diff(data)
         self.assertIn('Could not parse', str(ctx.exception))
 
+    def test_parse_diff__file_status(self):
+        data = """diff --git a/new.py b/new.py
+new file mode 100644
+index 0000000..257cc56
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1 @@
++import os
+diff --git a/old.py b/old.py
+deleted file mode 100644
+index 257cc56..0000000
+--- a/old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-import os
+diff --git a/moved.py b/renamed.py
+similarity index 100%
+rename from moved.py
+rename to renamed.py
+diff --git a/image.png b/image.png
+index 1111111..2222222 100644
+Binary files a/image.png and b/image.png differ
+diff --git a/script.sh b/script.sh
+old mode 100644
+new mode 100755
+"""
+        out = parse_diff(data)
+        self.assertEqual(['new.py'], out.get_files())
+        self.assertEqual({1}, out.all_changes('new.py')[0].added_lines())
+
+    def test_parse_diff__removed_lines_with_dashes(self):
+        data = """diff --git a/schema.sql b/schema.sql
+index 1111111..2222222 100644
+--- a/schema.sql
++++ b/schema.sql
+@@ -1,2 +1,2 @@
+--- a comment
++-- another comment
+ SELECT 1;
+"""
+        change = parse_diff(data)[0]
+        self.assertEqual({1}, change.deleted_lines())
+        self.assertEqual({1}, change.added_lines())
+
+    def test_parse_diff__quoted_filename(self):
+        data = u"""diff --git "a/caf\\303\\251.py" "b/caf\\303\\251.py"
+index 1111111..2222222 100644
+--- "a/caf\\303\\251.py"
++++ "b/caf\\303\\251.py"
+@@ -1 +1,2 @@
+ import os
++import re
+"""
+        out = parse_diff(data)
+        self.assertEqual([u'caf\xe9.py'], out.get_files())
+
+    def test_parse_diff__no_newline_at_end_of_file(self):
+        data = """diff --git a/a.py b/a.py
+index 1111111..2222222 100644
+--- a/a.py
++++ b/a.py
+@@ -1,2 +1,3 @@
+ import os
+-import re
+\\ No newline at end of file
++import re
++import sys
+\\ No newline at end of file
+"""
+        change = parse_diff(data)[0]
+        self.assertEqual({2, 3}, change.added_lines())
+        self.assertEqual(4, change.line_position(2))
+        self.assertEqual(5, change.line_position(3))
+
+    def test_parse_diff_lines(self):
+        lines = iter(load_fixture('diff/two_files.txt').split('\n'))
+        out = parse_diff_lines(lines)
+        self.assertEqual(['lintreview/git.py', 'tests/test_git.py'],
+                         out.get_files())
+
+    def test_parse_diff_lines__no_diffs(self):
+        with self.assertRaises(ParseError):
+            parse_diff_lines(iter([]))
+
     def test_properties(self):
         self.assertEqual("View/Helper/AssetCompressHelper.php",
                          self.diff.filename)
@@ -322,6 +441,36 @@ class TestDiff(TestCase):
         diff = Diff(None, res.filename, res.sha, hunks=proto.hunks)
         self.assertEqual(len(diff.hunks), len(proto.hunks))
         self.assertEqual(diff.hunks[0].patch, proto.hunks[0].patch)
+        self.assertEqual(diff.line_position(117), proto.line_position(117))
+        self.assertTrue(diff.has_line_changed(117))
+
+    def test_construct_with_unordered_hunks_kwarg(self):
+        patch = (
+            '@@ -1,2 +1,3 @@\n'
+            ' line\n'
+            '+added\n'
+            ' line\n'
+            '@@ -10,2 +11,3 @@\n'
+            ' line\n'
+            '+added again\n'
+            ' line\n'
+        )
+        proto = Diff(patch, 'test.py', 'abc123')
+        self.assertEqual(2, len(proto.hunks))
+        self.assertEqual(set([2, 12]), proto.added_lines())
+
+        diff = Diff(None, 'test.py', 'abc123',
+                    hunks=list(reversed(proto.hunks)))
+        self.assertEqual(proto.added_lines(), diff.added_lines())
+        self.assertEqual(2, diff.line_position(2))
+        self.assertEqual(6, diff.line_position(12))
+        self.assertTrue(diff.has_line_changed(12))
+        self.assertEqual(12, diff.first_changed_line())
+
+    def test_line_position__not_added(self):
+        self.assertIsNone(self.diff.line_position(None))
+        self.assertIsNone(self.diff.line_position(1))
+        self.assertIsNone(self.diff.hunks[0].line_position(1))
 
     def test_construct_with_empty_hunks_kwarg(self):
         diff = Diff(None, 'test.py', 'abc123', hunks=[])
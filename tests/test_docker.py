@@ -1,6 +1,13 @@
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import time
 from unittest import TestCase
+from mock import Mock, patch
 
+from docker.models.containers import ExecResult
+import lintreview.cache as cache
 import lintreview.docker as docker
 from tests import test_dir, requires_image
 
@@ -82,3 +89,574 @@ class TestDocker(TestCase):
             docker.run,
             'python2', cmd, test_dir, timeout=5
         )
+
+
+class TestLimits(TestCase):
+
+    def setUp(self):
+        self.container = Mock()
+        self.container.logs.return_value = b'output'
+        self.container.wait.return_value = {'StatusCode': 0}
+        self.client = Mock()
+        self.client.containers.run.return_value = self.container
+        self.client_patcher = patch('lintreview.docker._get_client')
+        self.client_patcher.start().return_value = self.client
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    def test_limits__thread_local(self):
+        self.assertEqual({}, docker.current_limits())
+        with docker.limits({'timeout': 10}):
+            self.assertEqual({'timeout': 10}, docker.current_limits())
+        self.assertEqual({}, docker.current_limits())
+
+    def test_run__applies_limits(self):
+        values = {
+            'timeout': 10,
+            'cpus': 1.5,
+            'cpu_shares': 512,
+            'memory': 1024,
+            'pids_limit': 50,
+        }
+        with docker.limits(values):
+            docker.run('python2', ['flake8'], test_dir)
+
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertEqual(1500000000, kwargs['nano_cpus'])
+        self.assertEqual(512, kwargs['cpu_shares'])
+        self.assertEqual(1024, kwargs['mem_limit'])
+        self.assertEqual(1024, kwargs['memswap_limit'])
+        self.assertEqual(50, kwargs['pids_limit'])
+        self.container.wait.assert_called_with(timeout=10)
+
+    def test_run__check_status(self):
+        self.container.wait.return_value = {'StatusCode': 1}
+        output = docker.run('python2', ['pip'], test_dir)
+        self.assertIn('output', output)
+
+        with self.assertRaises(docker.CommandError) as ctx:
+            docker.run('python2', ['pip'], test_dir, check_status=True)
+        self.assertEqual(1, ctx.exception.status)
+        self.assertEqual(output, ctx.exception.output)
+
+    def test_run__default_timeout(self):
+        docker.run('python2', ['flake8'], test_dir)
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertNotIn('mem_limit', kwargs)
+        self.container.wait.assert_called_with(timeout=docker.TOOL_TIMEOUT)
+
+    def test_run__labels(self):
+        with docker.labels({'lintreview.job': '12'}):
+            docker.run('python2', ['flake8'], test_dir)
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertEqual({'lintreview.job': '12'}, kwargs['labels'])
+
+        docker.run('python2', ['flake8'], test_dir)
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertNotIn('labels', kwargs)
+
+    def test_run__container_already_removed(self):
+        self.container.remove.side_effect = docker.NotFound('gone')
+        self.assertEqual('outputoutput', docker.run(
+            'python2', ['flake8'], test_dir))
+
+    def test_remove_labeled(self):
+        gone = Mock()
+        gone.remove.side_effect = docker.NotFound('gone')
+        self.client.containers.list.return_value = [self.container, gone]
+
+        self.assertEqual(1, docker.remove_labeled('lintreview.job', '12'))
+        self.client.containers.list.assert_called_with(
+            filters={'label': 'lintreview.job=12'})
+        self.container.remove.assert_called_with(v=True, force=True)
+
+    def test_run__out_of_memory(self):
+        self.container.wait.return_value = {'StatusCode': 137}
+        self.container.attrs = {'State': {'OOMKilled': True}}
+
+        with docker.limits({'memory': 1024}):
+            with self.assertRaises(docker.ResourceLimitError) as ctx:
+                docker.run('python2', ['flake8'], test_dir)
+        self.assertIn('memory limit of 1024 bytes', str(ctx.exception))
+        self.container.remove.assert_called_with(v=True, force=True)
+
+    def test_run__killed_without_oom(self):
+        self.container.wait.return_value = {'StatusCode': 137}
+        self.container.attrs = {'State': {'OOMKilled': False}}
+
+        with docker.limits({'memory': 1024}):
+            self.assertEqual('outputoutput', docker.run(
+                'python2', ['flake8'], test_dir))
+
+
+class TestClient(TestCase):
+
+    def setUp(self):
+        docker.reset_client()
+
+    def tearDown(self):
+        docker.reset_client()
+
+    @patch('lintreview.docker.docker.from_env')
+    def test_get_client__shared(self, mock_from_env):
+        client = docker._get_client()
+        self.assertIs(client, docker._get_client())
+        self.assertEqual(1, mock_from_env.call_count)
+
+    @patch('lintreview.docker.os.getpid')
+    @patch('lintreview.docker.docker.from_env')
+    def test_get_client__new_after_fork(self, mock_from_env, mock_getpid):
+        mock_from_env.side_effect = lambda **kwargs: Mock()
+        mock_getpid.return_value = 100
+        parent = docker._get_client()
+
+        mock_getpid.return_value = 101
+        child = docker._get_client()
+        self.assertIsNot(parent, child)
+        self.assertIs(child, docker._get_client())
+        self.assertEqual(2, mock_from_env.call_count)
+        parent.close.assert_not_called()
+
+    @patch('lintreview.docker.docker.from_env')
+    def test_get_client__per_timeout(self, mock_from_env):
+        mock_from_env.side_effect = lambda **kwargs: Mock()
+        default = docker._get_client()
+        streaming = docker._get_client(timeout=None)
+        self.assertIsNot(default, streaming)
+        self.assertIs(streaming, docker._get_client(timeout=None))
+        mock_from_env.assert_called_with(timeout=None)
+
+    @patch('lintreview.docker.docker.from_env')
+    def test_reset_client(self, mock_from_env):
+        client = docker._get_client()
+        docker.reset_client()
+        client.close.assert_called()
+
+        docker._get_client()
+        self.assertEqual(2, mock_from_env.call_count)
+
+    def test_client_stats__no_client(self):
+        stats = docker.client_stats()
+        self.assertEqual(0, stats['pools'])
+        self.assertEqual(0, stats['requests'])
+
+    @patch('lintreview.docker.docker.from_env')
+    def test_client_stats(self, mock_from_env):
+        pool = Mock(num_connections=2, num_requests=10)
+        adapter = Mock(pools={'http+docker://localhost': pool})
+        mock_from_env.return_value.api.adapters = {'http+docker://': adapter}
+
+        docker._get_client()
+        stats = docker.client_stats()
+        self.assertEqual(1, stats['pools'])
+        self.assertEqual(2, stats['connections'])
+        self.assertEqual(10, stats['requests'])
+
+
+class TestOutputStream(TestCase):
+
+    def test_iter__lines_across_chunks(self):
+        chunks = [b'one\ntw', b'o\n', b'thr', b'ee']
+        stream = docker.OutputStream(chunks)
+        self.assertEqual(['one', 'two', 'three'], list(stream))
+        self.assertFalse(stream.truncated)
+        self.assertEqual(3, stream.lines_read)
+        self.assertEqual(13, stream.bytes_read)
+
+    def test_iter__split_multibyte_character(self):
+        text = u'caf\xe9\n'.encode('utf8')
+        stream = docker.OutputStream([text[0:4], text[4:]])
+        self.assertEqual([u'caf\xe9'], list(stream))
+
+    def test_iter__max_bytes(self):
+        chunks = [b'one\n', b'two\n', b'three\n']
+        stream = docker.OutputStream(chunks, max_bytes=6)
+        self.assertEqual(['one'], list(stream))
+        self.assertTrue(stream.truncated)
+        self.assertEqual(6, stream.bytes_read)
+
+    def test_iter__max_lines(self):
+        chunks = [b'one\ntwo\nthree\n']
+        stream = docker.OutputStream(chunks, max_lines=2)
+        self.assertEqual(['one', 'two'], list(stream))
+        self.assertTrue(stream.truncated)
+
+    def test_iter__closes(self):
+        on_close = Mock()
+        stream = docker.OutputStream([b'one\n'], on_close=on_close)
+        list(stream)
+        stream.close()
+        self.assertTrue(stream.closed)
+        on_close.assert_called_once_with()
+
+    def test_iter__stream_error(self):
+        def chunks():
+            yield b'one\n'
+            raise docker.ReadTimeout('slow')
+
+        on_close = Mock()
+        stream = docker.OutputStream(chunks(), on_close=on_close)
+        with self.assertRaises(docker.TimeoutError):
+            list(stream)
+        on_close.assert_called_once_with()
+
+    def test_set_timeout(self):
+        def chunks():
+            yield b'one\n'
+            time.sleep(0.3)
+            yield b'two\n'
+
+        on_timeout = Mock()
+        stream = docker.OutputStream(chunks())
+        stream.set_timeout(0.1, on_timeout)
+        with self.assertRaises(docker.TimeoutError):
+            list(stream)
+        self.assertTrue(stream.timed_out)
+        on_timeout.assert_called_once_with()
+
+    def test_configure_output_limits(self):
+        docker.configure_output_limits({'TOOL_OUTPUT_MAX_BYTES': 10})
+        self.assertEqual(10, docker._output_limits['max_bytes'])
+        self.assertEqual(0, docker._output_limits['max_lines'])
+        docker.configure_output_limits({})
+        self.assertEqual(0, docker._output_limits['max_bytes'])
+
+
+class TestImageCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index = os.path.join(self.tmp_dir, 'images.json')
+        docker.configure_image_cache({
+            'IMAGE_CACHE_BUDGET': 100,
+            'IMAGE_CACHE_INDEX': self.index,
+        })
+        self.client = Mock()
+        self.client_patcher = patch('lintreview.docker._get_client')
+        self.client_patcher.start().return_value = self.client
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        docker.configure_image_cache({})
+        shutil.rmtree(self.tmp_dir)
+
+    def test_configure_image_cache__defaults(self):
+        docker.configure_image_cache({'WORKSPACE': '/tmp/workspace'})
+        self.assertEqual(0, docker._image_cache['budget'])
+        self.assertEqual('/tmp/workspace/.image-cache.json',
+                         docker._image_cache['index'])
+
+    def test_cached_image_name(self):
+        self.client.images.get.return_value = Mock(id='sha256:abc')
+        name = docker.cached_image_name('flake8', 'python2', ['flake8-isort'])
+        self.assertTrue(name.startswith('flake8-'))
+        self.assertEqual(
+            name,
+            docker.cached_image_name('flake8', 'python2', ['flake8-isort']))
+        self.assertNotEqual(
+            name,
+            docker.cached_image_name('flake8', 'python2', ['flake8-django']))
+
+        self.client.images.get.return_value = Mock(id='sha256:def')
+        self.assertNotEqual(
+            name,
+            docker.cached_image_name('flake8', 'python2', ['flake8-isort']),
+            'Rebuilt base images change the name')
+
+    @patch('lintreview.docker.image_exists')
+    @patch('lintreview.docker.run')
+    def test_build_cached_image__exists(self, mock_run, mock_exists):
+        mock_exists.return_value = True
+        output = docker.build_cached_image(
+            'flake8-abc', 'python2', ['flake8-install'], test_dir)
+        self.assertIsNone(output)
+        mock_run.assert_not_called()
+        self.assertIn('flake8-abc', cache.read_json(self.index))
+
+    @patch('lintreview.docker.evict_cached_images')
+    @patch('lintreview.docker.rm_container')
+    @patch('lintreview.docker.commit')
+    @patch('lintreview.docker.image_exists')
+    @patch('lintreview.docker.run')
+    def test_build_cached_image__build(self, mock_run, mock_exists,
+                                       mock_commit, mock_rm, mock_evict):
+        mock_exists.return_value = False
+        mock_run.return_value = 'installed'
+        output = docker.build_cached_image(
+            'flake8-abc', 'python2', ['flake8-install'], test_dir)
+
+        self.assertEqual('installed', output)
+        container_name = mock_run.call_args[1]['name']
+        self.assertTrue(container_name.startswith('flake8-abc-'))
+        mock_commit.assert_called_with(
+            container_name,
+            repository='flake8-abc',
+            labels={docker.IMAGE_CACHE_LABEL: '1'})
+        mock_rm.assert_called_with(container_name)
+        mock_evict.assert_called()
+        self.assertIn('flake8-abc', cache.read_json(self.index))
+
+    @patch('lintreview.docker.evict_cached_images')
+    @patch('lintreview.docker.rm_container')
+    @patch('lintreview.docker.commit')
+    @patch('lintreview.docker.image_exists')
+    @patch('lintreview.docker.run')
+    def test_build_cached_image__failed(self, mock_run, mock_exists,
+                                        mock_commit, mock_rm, mock_evict):
+        mock_exists.return_value = False
+        mock_run.side_effect = docker.CommandError('No such package', 1)
+        with self.assertRaises(docker.CommandError):
+            docker.build_cached_image(
+                'flake8-abc', 'python2', ['flake8-install'], test_dir)
+
+        self.assertTrue(mock_run.call_args[1]['check_status'])
+        mock_commit.assert_not_called()
+        mock_rm.assert_called_with(mock_run.call_args[1]['name'])
+        self.assertIsNone(cache.read_json(self.index))
+
+        mock_rm.reset_mock()
+        mock_run.side_effect = docker.CommandError('Image not found.')
+        with self.assertRaises(docker.CommandError):
+            docker.build_cached_image(
+                'flake8-abc', 'python2', ['flake8-install'], test_dir)
+        mock_rm.assert_not_called()
+
+    def test_evict_cached_images__under_budget(self):
+        self.client.images.list.return_value = [
+            Mock(tags=['flake8-abc:latest'], attrs={'Size': 60}),
+        ]
+        self.assertEqual([], docker.evict_cached_images())
+        self.client.images.remove.assert_not_called()
+
+    def test_evict_cached_images__least_recently_used(self):
+        cache.write_json(self.index, {
+            'flake8-old': 10,
+            'eslint-new': 30,
+            'phpcs-mid': 20,
+        })
+        self.client.images.list.return_value = [
+            Mock(tags=['eslint-new:latest'], attrs={'Size': 60}),
+            Mock(tags=['flake8-old:latest'], attrs={'Size': 40}),
+            Mock(tags=['phpcs-mid:latest'], attrs={'Size': 40}),
+        ]
+        removed = docker.evict_cached_images()
+
+        self.assertEqual(['flake8-old'], removed)
+        self.client.images.list.assert_called_with(
+            filters={'label': docker.IMAGE_CACHE_LABEL})
+        self.client.images.remove.assert_called_once_with(
+            image='flake8-old', force=True)
+        self.assertNotIn('flake8-old', cache.read_json(self.index))
+
+
+class TestContainerPool(TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.containers.run.side_effect = lambda **kwargs: Mock()
+        self.pool = docker.ContainerPool(size=1, max_uses=2, idle_timeout=60)
+        self.pool._client = self.client
+
+    def tearDown(self):
+        self.pool._idle = {}
+
+    def test_configure_pool(self):
+        self.assertIsNone(docker.configure_pool({}))
+        self.assertIsNone(docker._pool)
+
+        pool = docker.configure_pool({
+            'DOCKER_POOL_SIZE': 3,
+            'DOCKER_POOL_IMAGE_SIZES': {'python2': 5}
+        })
+        self.assertIsInstance(pool, docker.ContainerPool)
+        self.assertEqual(3, pool.size)
+        self.assertEqual({'python2': 5}, pool.image_sizes)
+        self.assertIs(pool, docker._pool)
+
+        docker.configure_pool({'DOCKER_POOL_SIZE': 0})
+        self.assertIsNone(docker._pool)
+
+    def test_run__uses_pool(self):
+        docker._pool = Mock()
+        docker._pool.run.return_value = 'pooled'
+        try:
+            output = docker.run('python2', ['flake8'], test_dir)
+        finally:
+            docker._pool = None
+        self.assertEqual('pooled', output)
+
+    def test_run__reuses_container(self):
+        container = Mock()
+        container.exec_run.return_value = ExecResult(1, (b'out\n', b'err\n'))
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        output = self.pool.run('python2', ['flake8', 'a.py'], test_dir)
+        self.assertEqual('err\nout\n', output)
+        self.pool.run('python2', ['flake8', 'b.py'], test_dir)
+
+        self.assertEqual(1, self.client.containers.run.call_count)
+        self.assertEqual(2, container.exec_run.call_count)
+        container.exec_run.assert_called_with(
+            cmd=['flake8', 'b.py'],
+            stdout=True,
+            stderr=True,
+            environment=None,
+            demux=True)
+
+    def test_release__retires_after_max_uses(self):
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        self.pool.release(pooled)
+        self.assertEqual(1, len(self.pool))
+
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        self.pool.release(pooled)
+        self.assertEqual(0, len(self.pool))
+        pooled.container.remove.assert_called_with(v=True, force=True)
+
+    def test_release__failed(self):
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        self.pool.release(pooled, failed=True)
+        self.assertEqual(0, len(self.pool))
+        pooled.container.remove.assert_called_with(v=True, force=True)
+
+    def test_release__pool_size(self):
+        key = ('python2', test_dir, '/src', ())
+        first = self.pool.acquire(key)
+        second = self.pool.acquire(key)
+        self.pool.release(first)
+        self.pool.release(second)
+
+        self.assertEqual(1, len(self.pool))
+        first.container.remove.assert_not_called()
+        second.container.remove.assert_called_with(v=True, force=True)
+
+    def test_release__image_size(self):
+        self.pool.image_sizes = {'python2': 2}
+        key = ('python2', test_dir, '/src', ())
+        first = self.pool.acquire(key)
+        second = self.pool.acquire(key)
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertEqual(2, len(self.pool))
+
+    def test_evict_idle(self):
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        self.pool.release(pooled)
+        self.pool.evict_idle(now=pooled.last_used + 30)
+        self.assertEqual(1, len(self.pool))
+
+        self.pool.evict_idle(now=pooled.last_used + 61)
+        self.assertEqual(0, len(self.pool))
+        pooled.container.remove.assert_called_with(v=True, force=True)
+
+    def test_evict(self):
+        other_dir = os.path.join(test_dir, 'other')
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        other = self.pool.acquire(('python2', other_dir, '/src', ()))
+        self.pool.release(pooled)
+        self.pool.release(other)
+
+        self.pool.evict(test_dir + '/')
+        self.assertEqual(1, len(self.pool))
+        pooled.container.remove.assert_called_with(v=True, force=True)
+        other.container.remove.assert_not_called()
+
+    def test_evict_pool(self):
+        docker._pool = Mock()
+        try:
+            docker.evict_pool(test_dir)
+            docker._pool.evict.assert_called_with(test_dir)
+            docker._pool.evict_idle.assert_called_with()
+        finally:
+            docker._pool = None
+        docker.evict_pool(test_dir)
+
+    def test_remove__once(self):
+        pooled = self.pool.acquire(('python2', test_dir, '/src', ()))
+        self.pool._remove(pooled)
+        self.pool.release(pooled, failed=True)
+        self.pool._remove(pooled)
+        self.assertEqual(1, pooled.container.remove.call_count)
+        self.assertEqual(0, len(self.pool))
+
+    def test_acquire__labels(self):
+        with docker.labels({'lintreview.job': '3'}):
+            self.pool.acquire(('python2', test_dir, '/src', ()))
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertEqual({'lintreview.job': '3', docker.POOL_LABEL: '1'},
+                         kwargs['labels'])
+
+    def test_run__timeout(self):
+        container = Mock()
+        container.exec_run.side_effect = lambda **kwargs: time.sleep(1)
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        self.assertRaises(
+            docker.TimeoutError,
+            self.pool.run,
+            'python2', ['sleep'], test_dir, timeout=0.1)
+        self.assertEqual(0, len(self.pool))
+        container.remove.assert_called_with(v=True, force=True)
+
+    def test_run_stream(self):
+        container = Mock()
+        container.exec_run.return_value = ExecResult(
+            None, iter([b'one\n', b'two\n']))
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        stream = self.pool.run_stream('python2', ['flake8'], test_dir)
+        self.assertEqual(['one', 'two'], list(stream))
+        self.assertEqual(1, len(self.pool))
+        container.remove.assert_not_called()
+
+    def test_run_stream__truncated_retires_container(self):
+        container = Mock()
+        container.exec_run.return_value = ExecResult(
+            None, iter([b'one\n', b'two\n']))
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        stream = self.pool.run_stream(
+            'python2', ['flake8'], test_dir, max_lines=1)
+        self.assertEqual(['one'], list(stream))
+        self.assertTrue(stream.truncated)
+        self.assertEqual(0, len(self.pool))
+        container.remove.assert_called_with(v=True, force=True)
+
+    def test_run__limits(self):
+        container = Mock()
+        container.exec_run.return_value = ExecResult(0, (b'out', None))
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        self.pool.run('python2', ['flake8'], test_dir,
+                      limits={'memory': 1024})
+        self.assertEqual(1, len(self.pool))
+        kwargs = self.client.containers.run.call_args[1]
+        self.assertEqual(1024, kwargs['mem_limit'])
+
+        self.pool.run('python2', ['flake8'], test_dir)
+        self.assertEqual(2, len(self.pool), 'Limits are part of the key')
+
+    def test_run__out_of_memory(self):
+        container = Mock()
+        container.exec_run.return_value = ExecResult(137, (None, None))
+        self.client.containers.run.side_effect = None
+        self.client.containers.run.return_value = container
+
+        self.assertRaises(
+            docker.ResourceLimitError,
+            self.pool.run,
+            'python2', ['flake8'], test_dir, limits={'memory': 1024})
+        self.assertEqual(0, len(self.pool))
+        container.remove.assert_called_with(v=True, force=True)
+
+    @patch('lintreview.docker.ContainerPool.acquire')
+    def test_run__image_not_found(self, mock_acquire):
+        mock_acquire.side_effect = docker.ImageNotFound('nope')
+        output = self.pool.run('nope', ['flake8'], test_dir)
+        self.assertEqual('Image not found.', output)
@@ -1,5 +1,9 @@
 from __future__ import absolute_import
 import os
+import shutil
+import subprocess
+import tempfile
+import time
 from unittest import TestCase
 from mock import patch
 
@@ -57,6 +61,12 @@ class TestGit(TestCase):
         expected = os.path.realpath(expected)
         self.assertEqual(res, expected)
 
+    def test_get_repo_path__job(self):
+        res = git.get_repo_path('markstory', 'asset_compress', 4, settings, 12)
+        expected = os.path.realpath(os.sep.join(
+            (settings['WORKSPACE'], 'markstory', 'asset_compress', '4-12')))
+        self.assertEqual(res, expected)
+
     def test_exists__no_path(self):
         assert not git.exists(settings['WORKSPACE'] + '/herp/derp')
 
@@ -211,3 +221,187 @@ class TestGit(TestCase):
             f.write('skull and crossbones')
 
         git.destroy(clone_path)
+
+
+def _git(path, *args):
+    command = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    command.extend(args)
+    return subprocess.check_output(command, cwd=path).decode('utf8').strip()
+
+
+class TestVersion(TestCase):
+
+    @patch('lintreview.git._version', {'version': None})
+    @patch('lintreview.git._process')
+    def test_version(self, process):
+        process.return_value = (0, 'git version 2.11.0\n')
+        self.assertEqual((2, 11, 0), git.version())
+        self.assertEqual((2, 11, 0), git.version())
+        self.assertEqual(1, process.call_count)
+
+    @patch('lintreview.git._version', {'version': None})
+    @patch('lintreview.git._process')
+    def test_version__unknown(self, process):
+        process.return_value = (1, 'git: not found')
+        self.assertEqual((0,), git.version())
+
+
+class TestMirror(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.origin = os.path.join(self.tmp_dir, 'origin')
+        os.mkdir(self.origin)
+        _git(self.origin, 'init', '-q')
+        with open(os.path.join(self.origin, 'README'), 'w') as f:
+            f.write('first')
+        _git(self.origin, 'add', 'README')
+        _git(self.origin, 'commit', '-q', '-m', 'first')
+        self.head = _git(self.origin, 'rev-parse', 'HEAD')
+        self.config = {
+            'WORKSPACE': os.path.join(self.tmp_dir, 'workspace'),
+            'GIT_MIRROR_CACHE': True,
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_mirror_path(self):
+        config = {'WORKSPACE': '/tmp/workspace'}
+        res = git.mirror_path(
+            config, 'https://github.com/markstory/lint-review.git')
+        expected = os.path.realpath(
+            '/tmp/workspace/.mirrors/github.com/markstory/lint-review.git')
+        self.assertEqual(expected, res)
+
+    def test_clone_or_update__mirror(self):
+        path = os.path.join(self.config['WORKSPACE'], 'user', 'repo', '1')
+        git.clone_or_update(self.config, self.origin, path, self.head)
+
+        mirror = git.mirror_path(self.config, self.origin)
+        self.assertTrue(os.path.isdir(mirror))
+        self.assertEqual(self.head, _git(path, 'rev-parse', 'HEAD'))
+        self.assertEqual(self.origin, _git(path, 'remote', 'get-url', 'origin'))
+        self.assertTrue(os.path.exists(os.path.join(path, 'README')))
+
+    def test_clone_or_update__mirror_reused(self):
+        first = os.path.join(self.config['WORKSPACE'], 'first')
+        git.clone_or_update(self.config, self.origin, first, self.head)
+
+        with open(os.path.join(self.origin, 'README'), 'w') as f:
+            f.write('second')
+        _git(self.origin, 'commit', '-q', '-a', '-m', 'second')
+        head = _git(self.origin, 'rev-parse', 'HEAD')
+
+        second = os.path.join(self.config['WORKSPACE'], 'second')
+        with patch('lintreview.git._process', wraps=git._process) as process:
+            git.clone_or_update(self.config, self.origin, second, head)
+        commands = [call[0][0][0:2] for call in process.call_args_list]
+        self.assertNotIn(['git', 'init'], commands)
+        self.assertEqual(head, _git(second, 'rev-parse', 'HEAD'))
+
+        # Existing commits are not fetched again.
+        third = os.path.join(self.config['WORKSPACE'], 'third')
+        with patch('lintreview.git._process', wraps=git._process) as process:
+            git.clone_or_update(self.config, self.origin, third, head)
+        commands = [call[0][0][0:2] for call in process.call_args_list]
+        self.assertNotIn(['git', 'fetch'], commands)
+
+    def test_clone_or_update__mirror_branch(self):
+        path = os.path.join(self.config['WORKSPACE'], 'branch')
+        branch = _git(self.origin, 'rev-parse', '--abbrev-ref', 'HEAD')
+        git.clone_or_update(self.config, self.origin, path, branch)
+        self.assertEqual(self.head, _git(path, 'rev-parse', 'HEAD'))
+
+    def _add_dirs(self):
+        for name in ('lib', 'docs'):
+            os.mkdir(os.path.join(self.origin, name))
+            with open(os.path.join(self.origin, name, 'file'), 'w') as f:
+                f.write(name)
+        _git(self.origin, 'add', '.')
+        _git(self.origin, 'commit', '-q', '-m', 'dirs')
+        _git(self.origin, 'config', 'uploadpack.allowfilter', 'true')
+        return _git(self.origin, 'rev-parse', 'HEAD')
+
+    def test_clone_or_update__sparse(self):
+        head = self._add_dirs()
+        path = os.path.join(self.config['WORKSPACE'], 'sparse')
+        config = {'WORKSPACE': self.config['WORKSPACE']}
+        git.clone_or_update(config, 'file://' + self.origin, path, head,
+                            ['lib'])
+
+        self.assertEqual(head, _git(path, 'rev-parse', 'HEAD'))
+        self.assertEqual('true', _git(path, 'rev-parse', '--is-shallow-repository'))
+        self.assertTrue(os.path.exists(os.path.join(path, 'README')))
+        self.assertTrue(os.path.exists(os.path.join(path, 'lib', 'file')))
+        self.assertFalse(os.path.exists(os.path.join(path, 'docs')))
+
+    @patch('lintreview.git.version')
+    def test_clone_or_update__sparse_old_git(self, version):
+        version.return_value = (2, 11, 0)
+        head = self._add_dirs()
+        path = os.path.join(self.config['WORKSPACE'], 'sparse')
+        config = {'WORKSPACE': self.config['WORKSPACE']}
+        with patch('lintreview.git.clone_sparse') as clone_sparse:
+            git.clone_or_update(config, 'file://' + self.origin, path, head,
+                                ['lib'])
+        self.assertFalse(clone_sparse.called)
+        self.assertEqual(head, _git(path, 'rev-parse', 'HEAD'))
+        self.assertTrue(os.path.exists(os.path.join(path, 'docs', 'file')))
+
+    def test_clone_or_update__mirror_sparse(self):
+        head = self._add_dirs()
+        path = os.path.join(self.config['WORKSPACE'], 'sparse')
+        git.clone_or_update(self.config, self.origin, path, head, ['docs'])
+
+        self.assertEqual(head, _git(path, 'rev-parse', 'HEAD'))
+        self.assertTrue(os.path.exists(os.path.join(path, 'docs', 'file')))
+        self.assertFalse(os.path.exists(os.path.join(path, 'lib')))
+
+    def test_evict_mirrors(self):
+        path = os.path.join(self.config['WORKSPACE'], 'first')
+        git.clone_or_update(self.config, self.origin, path, self.head)
+        mirror = git.mirror_path(self.config, self.origin)
+
+        other = git.mirror_path(self.config, 'https://github.com/other/repo')
+        git.update_mirror(other, self.origin, self.head)
+        old = time.time() - 3600
+        os.utime(other, (old, old))
+
+        self.assertEqual([], git.evict_mirrors(self.config, 10 ** 9))
+        removed = git.evict_mirrors(self.config, 1, keep=[mirror])
+        self.assertEqual([other], removed)
+        self.assertFalse(os.path.exists(other))
+        self.assertTrue(os.path.exists(mirror))
+
+    def test_mirror_diff(self):
+        branch = _git(self.origin, 'rev-parse', '--abbrev-ref', 'HEAD')
+        _git(self.origin, 'checkout', '-q', '-b', 'feature')
+        with open(os.path.join(self.origin, 'README'), 'a') as f:
+            f.write('\nfeature\n')
+        _git(self.origin, 'commit', '-q', '-a', '-m', 'feature')
+        head = _git(self.origin, 'rev-parse', 'HEAD')
+
+        # Changes to the base after the branch aren't in the diff.
+        _git(self.origin, 'checkout', '-q', branch)
+        with open(os.path.join(self.origin, 'other'), 'w') as f:
+            f.write('other\n')
+        _git(self.origin, 'add', 'other')
+        _git(self.origin, 'commit', '-q', '-m', 'base')
+        base = _git(self.origin, 'rev-parse', 'HEAD')
+
+        lines = list(git.mirror_diff(
+            self.config, self.origin, head, self.origin, base))
+        self.assertIn('diff --git a/README b/README', lines)
+        self.assertIn('+feature', lines)
+        self.assertNotIn('+other', lines)
+        self.assertTrue(os.path.isdir(git.mirror_path(self.config,
+                                                      self.origin)))
+
+    def test_diff_lines__no_merge_base(self):
+        _git(self.origin, 'checkout', '-q', '--orphan', 'unrelated')
+        _git(self.origin, 'commit', '-q', '-m', 'unrelated')
+        unrelated = _git(self.origin, 'rev-parse', 'HEAD')
+
+        with self.assertRaises(IOError):
+            list(git.diff_lines(self.origin, self.head, unrelated))
@@ -1,8 +1,13 @@
 from __future__ import absolute_import
+import base64
 import json
+import os
+import shutil
+import tempfile
 from mock import call, Mock, patch
 from unittest import TestCase
 
+import lintreview.cache as cache
 import lintreview.github as github
 
 from . import load_fixture
@@ -13,6 +18,7 @@ from github3.session import GitHubSession
 from github3.orgs import Organization, OrganizationHook
 from github3.repos import Repository
 from github3.repos.hook import Hook
+from requests import Request, Response
 
 
 config = {
@@ -39,6 +45,41 @@ class TestGithub(TestCase):
             actual = gh.session.get_adapter(proto).max_retries.backoff_factor
             self.assertEqual(actual, 42)
 
+    def test_get_session__records_metrics(self):
+        session = github.get_session()
+        self.assertIn(github.record_response, session.hooks['response'])
+
+    @patch('lintreview.github.metrics')
+    def test_record_response(self, metrics):
+        response = Mock(status_code=304)
+        response.request.method = 'GET'
+        response.elapsed.total_seconds.return_value = 0.25
+        github.record_response(response)
+
+        metrics.GITHUB_REQUESTS.inc.assert_called_with(
+            method='GET', status=304)
+        metrics.GITHUB_LATENCY.observe.assert_called_with(
+            0.25, method='GET')
+
+    def test_get_session__response_cache(self):
+        responses = Mock()
+        limiter = Mock()
+        session = github.get_session(None, responses, limiter)
+        adapter = session.get_adapter('https://')
+        self.assertIsInstance(adapter, github.GithubAdapter)
+        self.assertIs(responses, adapter.response_cache)
+        self.assertIs(limiter, adapter.rate_limiter)
+
+    @patch('lintreview.github.metrics')
+    def test_record_response__revalidated(self, metrics):
+        response = Mock(status_code=200, revalidated=True)
+        response.request.method = 'GET'
+        response.elapsed.total_seconds.return_value = 0.1
+        github.record_response(response)
+
+        metrics.GITHUB_REQUESTS.inc.assert_called_with(
+            method='GET', status=304)
+
     def test_get_lintrc(self):
         repo = Mock(spec=Repository)
         github.get_lintrc(repo, 'HEAD')
@@ -255,3 +296,216 @@ class TestGithub(TestCase):
 
         with patch('lintreview.github.get_client', mock_get_client):
             self.assertEqual(github.get_organization(mock_config, 'org_name'), mock_org)
+
+
+class TestLintrcCache(TestCase):
+
+    sha = 'a' * 40
+
+    def response(self, status):
+        return Mock(status_code=status, headers={})
+
+    def repo(self, responses, content=u'[tools]\nlinters = flake8\n'):
+        repo = Mock(spec=Repository, full_name='markstory/lint-test')
+        repo._api = 'https://api.github.com/repos/markstory/lint-test'
+        repo._build_url.return_value = repo._api + '/contents/.lintrc'
+        repo._get.side_effect = responses
+        repo._json.return_value = {
+            'sha': 'blob-sha',
+            'content': base64.b64encode(content.encode('utf-8')),
+        }
+        return repo
+
+    def test_fetch(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(200)])
+
+        result = cache.fetch(repo, self.sha)
+        self.assertEqual(u'[tools]\nlinters = flake8\n', result)
+        repo._get.assert_called_with(
+            repo._api + '/contents/.lintrc',
+            params={'ref': self.sha})
+
+    def test_fetch__branch_requested_again(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(200), self.response(200)])
+
+        first = cache.fetch(repo, 'master')
+        second = cache.fetch(repo, 'master')
+        self.assertEqual(first, second)
+        self.assertEqual(2, repo._get.call_count)
+        self.assertEqual({}, cache._refs)
+
+    def test_fetch__commit_sha_not_requested_again(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(200)])
+
+        first = cache.fetch(repo, self.sha)
+        second = cache.fetch(repo, self.sha)
+        self.assertEqual(first, second)
+        self.assertEqual(1, repo._get.call_count)
+
+    def test_fetch__evicted_blob(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(200), self.response(200)])
+        first = cache.fetch(repo, self.sha)
+        cache._blobs.clear()
+
+        second = cache.fetch(repo, self.sha)
+        self.assertEqual(first, second)
+        self.assertEqual(2, repo._get.call_count)
+
+    def test_fetch__shared_blob(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(200), self.response(200)])
+        cache.fetch(repo, self.sha)
+        cache.fetch(repo, 'b' * 40)
+
+        self.assertEqual(2, len(cache._refs))
+        self.assertEqual(['blob-sha'], list(cache._blobs))
+
+    def test_fetch__missing_file(self):
+        cache = github.LintrcCache()
+        repo = self.repo([self.response(404)])
+        repo._json.side_effect = github3.exceptions.NotFoundError(
+            Mock(status_code=404))
+
+        with self.assertRaises(github3.exceptions.NotFoundError):
+            cache.fetch(repo, 'master')
+
+
+class TestGithubAdapter(TestCase):
+
+    url = 'https://api.github.com/repos/markstory/lint-test/pulls/1'
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.responses = cache.ResultCache(self.tmp_dir)
+        self.adapter = github.GithubAdapter(self.responses)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def request(self, method='GET', **headers):
+        headers.setdefault('Authorization', 'token a-token')
+        return Request(method, self.url, headers=headers).prepare()
+
+    def response(self, status, body=b'', **headers):
+        response = Response()
+        response.status_code = status
+        response._content = body
+        response.headers.update(headers)
+        response.url = self.url
+        return response
+
+    def send(self, request, response):
+        send = 'requests.adapters.HTTPAdapter.send'
+        with patch(send, return_value=response) as mock_send:
+            result = self.adapter.send(request)
+        return result, mock_send.call_args[0][0]
+
+    def test_send__stores_etag(self):
+        response = self.response(200, b'{"number": 1}', ETag='"abc"')
+        result, sent = self.send(self.request(), response)
+
+        self.assertIs(response, result)
+        self.assertNotIn('If-None-Match', sent.headers)
+        self.assertEqual(1, len(self._entries()))
+
+    def test_send__not_modified(self):
+        self.send(self.request(), self.response(
+            200, b'{"number": 1}', ETag='"abc"',
+            **{'Content-Type': 'application/json',
+               'Link': '<next>; rel="next"'}))
+
+        not_modified = self.response(
+            304, ETag='"abc"', **{'X-RateLimit-Remaining': '4999'})
+        result, sent = self.send(self.request(), not_modified)
+
+        self.assertEqual('"abc"', sent.headers['If-None-Match'])
+        self.assertEqual(200, result.status_code)
+        self.assertTrue(result.revalidated)
+        self.assertEqual({'number': 1}, result.json())
+        self.assertEqual('<next>; rel="next"', result.headers['Link'])
+        self.assertEqual('application/json', result.headers['Content-Type'])
+        self.assertEqual('4999', result.headers['X-RateLimit-Remaining'])
+
+    def test_send__varies_by_credentials(self):
+        self.send(self.request(), self.response(
+            200, b'{}', ETag='"abc"'))
+        request = self.request(Authorization='token other')
+        _, sent = self.send(request, self.response(200, b'{}'))
+        self.assertNotIn('If-None-Match', sent.headers)
+
+    def test_send__ignores_other_methods(self):
+        response = self.response(200, b'{}', ETag='"abc"')
+        self.send(self.request('POST'), response)
+        self.assertEqual([], self._entries())
+
+    def test_send__explicit_condition(self):
+        self.send(self.request(), self.response(
+            200, b'{}', ETag='"abc"'))
+        request = self.request(**{'If-None-Match': '"other"'})
+        response = self.response(304)
+        result, sent = self.send(request, response)
+
+        self.assertEqual('"other"', sent.headers['If-None-Match'])
+        self.assertEqual(304, result.status_code)
+
+    def _entries(self):
+        entries = []
+        for _, _, filenames in os.walk(self.tmp_dir):
+            entries.extend(n for n in filenames if n.endswith('.json'))
+        return entries
+
+
+class TestGithubAdapterRateLimit(TestCase):
+
+    url = 'https://api.github.com/repos/markstory/lint-test/pulls/1/reviews'
+
+    def setUp(self):
+        self.limiter = Mock(max_wait=60)
+        self.limiter.update.return_value = None
+        self.adapter = github.GithubAdapter(rate_limiter=self.limiter)
+
+    def response(self, status):
+        response = Response()
+        response.status_code = status
+        response._content = b''
+        return response
+
+    def test_send__paced(self):
+        request = Request('POST', self.url, data='{}').prepare()
+        response = self.response(200)
+        send = 'requests.adapters.HTTPAdapter.send'
+        with patch(send, return_value=response):
+            self.assertIs(response, self.adapter.send(request))
+        self.limiter.acquire.assert_called_with('POST')
+        self.limiter.update.assert_called_with(response)
+
+    def test_send__retries_rate_limited(self):
+        self.limiter.update.side_effect = [10, None]
+        request = Request('POST', self.url, data='{}').prepare()
+        limited = self.response(403)
+        ok = self.response(200)
+        send = 'requests.adapters.HTTPAdapter.send'
+        with patch(send, side_effect=[limited, ok]) as mock_send:
+            self.assertIs(ok, self.adapter.send(request))
+        self.assertEqual(2, mock_send.call_count)
+        self.assertEqual(2, self.limiter.acquire.call_count)
+
+    def test_send__gives_up(self):
+        self.limiter.update.return_value = 10
+        request = Request('GET', self.url).prepare()
+        send = 'requests.adapters.HTTPAdapter.send'
+        with patch(send, return_value=self.response(429)) as mock_send:
+            self.assertEqual(429, self.adapter.send(request).status_code)
+        self.assertEqual(3, mock_send.call_count)
+
+    def test_send__long_wait_not_retried(self):
+        self.limiter.update.return_value = 3600
+        request = Request('GET', self.url).prepare()
+        send = 'requests.adapters.HTTPAdapter.send'
+        with patch(send, return_value=self.response(403)) as mock_send:
+            self.assertEqual(403, self.adapter.send(request).status_code)
+        self.assertEqual(1, mock_send.call_count)
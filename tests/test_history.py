@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+from mock import patch
+
+from lintreview.history import ReviewHistory, history_path
+from lintreview.review import Problems, IssueComment
+
+
+def _git(path, *args):
+    command = ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    command.extend(args)
+    return subprocess.check_output(command, cwd=path).decode('utf8').strip()
+
+
+class TestReviewHistory(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.tmp_dir, 'repo')
+        os.mkdir(self.repo)
+        _git(self.repo, 'init', '-q')
+        self.write('a.py', 'a')
+        self.write('b.py', 'b')
+        _git(self.repo, 'add', '.')
+        _git(self.repo, 'commit', '-q', '-m', 'first')
+        self.old = _git(self.repo, 'rev-parse', 'HEAD')
+
+        self.write('b.py', 'bb')
+        _git(self.repo, 'commit', '-q', '-a', '-m', 'second')
+        self.new = _git(self.repo, 'rev-parse', 'HEAD')
+
+        self.path = os.path.join(self.tmp_dir, 'history', '1.json')
+        self.image_patcher = patch('lintreview.docker.image_id')
+        self.image_id = self.image_patcher.start()
+        self.image_id.return_value = 'sha256:abc'
+
+    def tearDown(self):
+        self.image_patcher.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.repo, name), 'w') as f:
+            f.write(content)
+
+    def save_old(self):
+        problems = Problems()
+        problems.add('a.py', 1, 'Bad a')
+        problems.add('b.py', 1, 'Bad b')
+        history = ReviewHistory(self.path)
+        history.save(self.old, 'config', ['a.py', 'b.py'], problems,
+                     set(['python2']))
+        return history
+
+    def test_history_path(self):
+        config = {'WORKSPACE': '/tmp/workspace'}
+        self.assertEqual(
+            os.path.realpath('/tmp/workspace/.reviews/markstory/lint-test/3.json'),
+            history_path(config, 'markstory', 'lint-test', 3))
+
+    def test_changed_files__no_history(self):
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'config', ['a.py', 'b.py']))
+
+    def test_changed_files(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        self.assertEqual(self.old, history.head)
+        changed = history.changed_files(
+            self.repo, self.new, 'config', ['a.py', 'b.py', 'c.py'])
+        self.assertEqual(['b.py', 'c.py'], changed)
+
+    def test_changed_files__config_changed(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'new config', ['a.py', 'b.py']))
+
+    def test_changed_files__tool_config_changed(self):
+        self.save_old()
+        self.write('setup.cfg', '[flake8]\nmax-line-length = 120\n')
+        _git(self.repo, 'add', 'setup.cfg')
+        _git(self.repo, 'commit', '-q', '-m', 'config')
+        head = _git(self.repo, 'rev-parse', 'HEAD')
+
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, head, 'config', ['a.py', 'b.py']),
+            'Config outside of the pull request files')
+        self.assertIsNone(history.changed_files(
+            self.repo, head, 'config', ['a.py', 'b.py', 'setup.cfg']),
+            'Config in the pull request files')
+
+    def test_changed_files__config_option_changed(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'config', ['a.py', 'b.py'],
+            config_files=set(['b.py'])))
+
+    def test_changed_files__outside_files(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'config', ['a.py']))
+
+    def test_changed_files__image_changed(self):
+        self.save_old()
+        self.image_id.return_value = 'sha256:def'
+        history = ReviewHistory(self.path)
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'config', ['a.py', 'b.py']))
+
+    def test_changed_files__unknown_head(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        history.data['head'] = 'f' * 40
+        self.assertIsNone(history.changed_files(
+            self.repo, self.new, 'config', ['a.py', 'b.py']))
+
+    def test_carry_forward(self):
+        self.save_old()
+        history = ReviewHistory(self.path)
+        problems = Problems()
+        history.carry_forward(problems, ['a.py'])
+        self.assertEqual(1, len(problems))
+        self.assertEqual('Bad a', problems.all('a.py')[0].body)
+
+    def test_save__tool_failed(self):
+        history = self.save_old()
+        problems = Problems()
+        problems.add(IssueComment('Failed to run flake8 linter.'))
+        history.save(self.new, 'config', ['a.py'], problems, set())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(ReviewHistory(self.path).head)
@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from lintreview.jobs import JobRegistry, registry_path
+
+
+class TestJobRegistry(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.registry = JobRegistry(os.path.join(self.tmp_dir, 'jobs.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_registry_path(self):
+        self.assertEqual(
+            '/tmp/workspace/.jobs.sqlite',
+            registry_path({'WORKSPACE': '/tmp/workspace'}))
+        self.assertEqual(
+            '/var/jobs.db',
+            registry_path({'WORKSPACE': '/tmp', 'JOB_REGISTRY': '/var/jobs.db'}))
+
+    def test_start(self):
+        job_id, superseded = self.registry.start('markstory', 'lint', 1, 'abc')
+        self.assertEqual([], superseded)
+        self.assertEqual('running', self.registry.state(job_id))
+        self.assertFalse(self.registry.is_superseded(job_id))
+
+    def test_start__supersedes_running_jobs(self):
+        first, _ = self.registry.start('markstory', 'lint', 1, 'abc')
+        other, _ = self.registry.start('markstory', 'lint', 2, 'abc')
+        second, superseded = self.registry.start('markstory', 'lint', 1, 'def')
+
+        self.assertEqual([first], superseded)
+        self.assertTrue(self.registry.is_superseded(first))
+        self.assertFalse(self.registry.is_superseded(second))
+        self.assertFalse(self.registry.is_superseded(other))
+
+    def test_finish(self):
+        first, _ = self.registry.start('markstory', 'lint', 1, 'abc')
+        self.registry.finish(first)
+        self.assertEqual('done', self.registry.state(first))
+
+        second, superseded = self.registry.start('markstory', 'lint', 1, 'def')
+        self.assertEqual([], superseded, 'Finished jobs are not superseded')
+
+    def test_finish__superseded(self):
+        first, _ = self.registry.start('markstory', 'lint', 1, 'abc')
+        self.registry.start('markstory', 'lint', 1, 'def')
+        self.registry.finish(first)
+        self.assertTrue(self.registry.is_superseded(first))
+
+    def test_state__missing(self):
+        self.assertIsNone(self.registry.state(99))
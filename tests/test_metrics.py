@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+import os
+import shutil
+import socket
+import tempfile
+from unittest import TestCase
+
+import lintreview.cache as cache
+import lintreview.metrics as metrics
+import lintreview.timing as timing
+from mock import patch
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved = dict(
+            (metric, metric.values) for metric in metrics._registry.values())
+        metrics.configure({'METRICS': True, 'METRICS_DIR': self.tmp_dir})
+        metrics._state['pid'] = None
+
+    def tearDown(self):
+        for metric, values in self.saved.items():
+            metric.values = values
+        metrics._state['pid'] = None
+        metrics.configure({'METRICS': False})
+        shutil.rmtree(self.tmp_dir)
+
+    def test_counter(self):
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.WEBHOOKS.inc(2, action='closed')
+        text = metrics.render(metrics.collect())
+        self.assertIn('# TYPE lintreview_webhooks_total counter', text)
+        self.assertIn('lintreview_webhooks_total{action="opened"} 2', text)
+        self.assertIn('lintreview_webhooks_total{action="closed"} 2', text)
+
+    def test_histogram(self):
+        metrics.TOOL_DURATION.observe(0.7, tool='flake8')
+        metrics.TOOL_DURATION.observe(12, tool='flake8')
+        text = metrics.render(metrics.collect())
+        name = 'lintreview_tool_duration_seconds'
+        self.assertIn('# TYPE {} histogram'.format(name), text)
+        self.assertIn(name + '_bucket{tool="flake8",le="0.5"} 0', text)
+        self.assertIn(name + '_bucket{tool="flake8",le="1"} 1', text)
+        self.assertIn(name + '_bucket{tool="flake8",le="30"} 2', text)
+        self.assertIn(name + '_bucket{tool="flake8",le="+Inf"} 2', text)
+        self.assertIn(name + '_sum{tool="flake8"} 12.7', text)
+        self.assertIn(name + '_count{tool="flake8"} 2', text)
+
+    def test_render__escapes_labels(self):
+        values = {'lintreview_webhooks_total': {('a"b\\c\n',): 1}}
+        text = metrics.render(values)
+        self.assertIn(
+            'lintreview_webhooks_total{action="a\\"b\\\\c\\n"} 1', text)
+
+    def test_collect__other_processes(self):
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.QUEUE_LATENCY.observe(3)
+        other = os.path.join(self.tmp_dir, '1.json')
+        cache.write_json(other, {
+            'lintreview_webhooks_total': [[['opened'], 4]],
+            'lintreview_job_queue_seconds': [
+                [[], [[0] * 7 + [1] * 4, 100.0, 1]]
+            ],
+            'removed_metric': [[[], 1]],
+        })
+        combined = metrics.collect()
+        self.assertEqual(
+            5, combined['lintreview_webhooks_total'][('opened',)])
+        queue = combined['lintreview_job_queue_seconds'][()]
+        self.assertEqual(2, queue[2])
+        self.assertEqual(103.0, queue[1])
+
+    def test_flush(self):
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.flush()
+        path = metrics._process_file(os.getpid())
+        data = cache.read_json(path)
+        self.assertEqual(
+            [[['opened'], 1]], data['lintreview_webhooks_total'])
+
+    def test_flush__max_age(self):
+        path = metrics._process_file(os.getpid())
+        metrics.flush(max_age=60)
+        self.assertTrue(os.path.exists(path))
+
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.flush(max_age=60)
+        data = cache.read_json(path)
+        self.assertEqual([], data['lintreview_webhooks_total'],
+                         'Not stored again within max_age')
+
+        metrics.flush()
+        data = cache.read_json(path)
+        self.assertEqual(
+            [[['opened'], 1]], data['lintreview_webhooks_total'])
+
+    def test_flush__max_age_timer(self):
+        path = metrics._process_file(os.getpid())
+        metrics.flush(max_age=0.1)
+        metrics.WEBHOOKS.inc(action='opened')
+        metrics.flush(max_age=0.1)
+
+        metrics._state['timer'].join(5)
+        data = cache.read_json(path)
+        self.assertEqual(
+            [[['opened'], 1]], data['lintreview_webhooks_total'],
+            'Stored by the timer once max_age passed')
+
+    def test_flush__textfile(self):
+        textfile = os.path.join(self.tmp_dir, 'prom', 'lintreview.prom')
+        metrics.configure({
+            'METRICS': True,
+            'METRICS_DIR': self.tmp_dir,
+            'METRICS_TEXTFILE': textfile,
+        })
+        metrics.GITHUB_REQUESTS.inc(method='GET', status=304)
+        metrics.flush()
+        with open(textfile) as f:
+            text = f.read()
+        self.assertIn(
+            'lintreview_github_requests_total{method="GET",status="304"} 1',
+            text)
+
+    def test_fork_starts_over(self):
+        metrics.WEBHOOKS.inc(action='opened')
+        with patch('lintreview.metrics.os.getpid', return_value=12345):
+            cache.write_json(metrics._process_file(12345), {
+                'lintreview_webhooks_total': [[['opened'], 7]],
+            })
+            metrics.WEBHOOKS.inc(action='opened')
+            self.assertEqual(
+                {('opened',): 1}, metrics.WEBHOOKS.values,
+                'Values of an earlier process with the same pid are '
+                'not continued')
+
+    @patch('lintreview.metrics._pid_exists')
+    def test_collect__prunes_exited_processes(self, pid_exists):
+        pid_exists.side_effect = lambda pid: pid == 1
+        data = {'lintreview_webhooks_total': [[['opened'], 1]]}
+        host = socket.gethostname()
+        running = os.path.join(self.tmp_dir, '{}-1.json'.format(host))
+        exited = os.path.join(self.tmp_dir, '{}-2.json'.format(host))
+        other_host = os.path.join(self.tmp_dir, 'elsewhere-2.json')
+        for path in (running, exited, other_host):
+            cache.write_json(path, data)
+
+        combined = metrics.collect()
+        self.assertEqual(
+            2, combined['lintreview_webhooks_total'][('opened',)])
+        self.assertTrue(os.path.exists(running))
+        self.assertFalse(os.path.exists(exited))
+        self.assertTrue(os.path.exists(other_host),
+                        'Pids of other hosts are not checked')
+
+    def test_pid_exists(self):
+        self.assertTrue(metrics._pid_exists(os.getpid()))
+
+    def test_observe_review(self):
+        with timing.record() as timings:
+            with timing.span('flake8', timing.TOOLS):
+                pass
+            timing.count('problems', 12)
+        metrics.observe_review(timings)
+        self.assertEqual(
+            1, metrics.TOOL_DURATION.values[('flake8',)][2])
+        self.assertEqual(1, metrics.JOB_DURATION.values[()][2])
+        self.assertEqual(12, metrics.PROBLEMS.values[()][1])
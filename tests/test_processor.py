@@ -51,6 +51,133 @@ class TestProcessor(TestCase):
         self.assertEqual(1, len(subject._changes), 'File count is wrong')
         assert isinstance(subject._changes, DiffCollection)
 
+    @patch('lintreview.processor.git')
+    def test_load_changes__local(self, git):
+        pull = self.get_pull_request()
+        pull.pull.files = Mock()
+        git.mirror_diff.return_value = iter(
+            load_fixture('diff/two_files.txt').split('\n'))
+
+        config = build_review_config('', dict(
+            app_config, GIT_LOCAL_DIFF=True, GIT_MIRROR_CACHE=True))
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+
+        self.assertEqual(['lintreview/git.py', 'tests/test_git.py'],
+                         subject._changes.get_files())
+        git.mirror_diff.assert_called_with(
+            config, pull.clone_url, pull.head, pull.base_clone_url, pull.base)
+        self.assertFalse(pull.pull.files.called)
+
+    @patch('lintreview.processor.git')
+    def test_load_changes__local_fallback(self, git):
+        pull = self.get_pull_request()
+        git.mirror_diff.side_effect = IOError('no merge base')
+
+        config = build_review_config('', dict(
+            app_config, GIT_LOCAL_DIFF=True, GIT_MIRROR_CACHE=True))
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+
+        self.assertEqual(['View/Helper/AssetCompressHelper.php'],
+                         subject._changes.get_files())
+
+    @patch('lintreview.processor.git')
+    def test_load_changes__local_requires_mirror(self, git):
+        pull = self.get_pull_request()
+        config = build_review_config('', dict(app_config, GIT_LOCAL_DIFF=True))
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+
+        self.assertFalse(git.mirror_diff.called)
+        self.assertEqual(1, len(subject._changes))
+
+    def test_checkout_paths__disabled(self):
+        pull = self.get_pull_request()
+        config = build_review_config(fixer_ini, app_config)
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+        self.assertIsNone(subject.checkout_paths())
+
+    def test_checkout_paths(self):
+        pull = self.get_pull_request()
+        tool = Mock()
+        tool.needs_full_checkout.return_value = False
+        tool.checkout_paths.return_value = ['config']
+        self.tool_stub.factory.return_value = [tool]
+
+        config = build_review_config(
+            fixer_ini, dict(app_config, GIT_SPARSE_CHECKOUT=True))
+        subject = Processor(Mock(), pull, './tests', config)
+        self.assertRaises(RuntimeError, subject.checkout_paths)
+
+        subject.load_changes()
+        self.assertEqual(['View/Helper', 'config'], subject.checkout_paths())
+
+    def test_checkout_paths__full_checkout(self):
+        pull = self.get_pull_request()
+        tool = Mock()
+        tool.needs_full_checkout.return_value = True
+        self.tool_stub.factory.return_value = [tool]
+
+        config = build_review_config(
+            fixer_ini, dict(app_config, GIT_SPARSE_CHECKOUT=True))
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+        self.assertIsNone(subject.checkout_paths())
+
+    def test_run_tools__labels(self):
+        pull = self.get_pull_request()
+        tool = Mock()
+        self.tool_stub.factory.return_value = [tool]
+
+        config = build_review_config('', app_config)
+        subject = Processor(Mock(), pull, './tests', config,
+                            {'lintreview.job': '3'})
+        subject.load_changes()
+        subject.run_tools()
+        self.assertEqual({'lintreview.job': '3'}, tool.labels)
+
+    def test_run_tools__history(self):
+        pull = self.get_pull_request()
+        tool = Mock(images_used=set(['php']))
+        tool.config_files.return_value = ['phpcs/ruleset.xml']
+        self.tool_stub.factory.return_value = [tool]
+        history = Mock(head='abc123')
+        history.changed_files.return_value = []
+
+        config = build_review_config('', app_config)
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+        subject.run_tools(history)
+
+        filename = 'View/Helper/AssetCompressHelper.php'
+        history.changed_files.assert_called_with(
+            './tests', pull.head, config.fingerprint(), [filename],
+            set(['phpcs/ruleset.xml']))
+        history.carry_forward.assert_called_with(subject.problems, [filename])
+        self.tool_stub.run.assert_called_with([tool], [], ANY, 1)
+        history.save.assert_called_with(
+            pull.head, config.fingerprint(), [filename], subject.problems,
+            set(['php']))
+
+    def test_run_tools__history_full_review(self):
+        pull = self.get_pull_request()
+        tool = Mock(images_used=set())
+        tool.can_cache.return_value = False
+        self.tool_stub.factory.return_value = [tool]
+        history = Mock()
+
+        config = build_review_config('', app_config)
+        subject = Processor(Mock(), pull, './tests', config)
+        subject.load_changes()
+        subject.run_tools(history)
+
+        history.changed_files.assert_not_called()
+        self.tool_stub.run.assert_called_with(
+            [tool], ['View/Helper/AssetCompressHelper.php'], ANY, 1)
+        self.assertTrue(history.save.called)
+
     def test_run_tools__no_changes(self):
         pull = self.get_pull_request()
         repo = Mock()
@@ -75,7 +202,8 @@ class TestProcessor(TestCase):
         self.tool_stub.run.assert_called_with(
             ANY,
             [],
-            ANY
+            ANY,
+            1
         )
 
     def test_run_tools__execute_fixers(self):
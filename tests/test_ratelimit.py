@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import time
+from mock import Mock, patch
+from unittest import TestCase
+
+import lintreview.cache as cache
+import lintreview.ratelimit as ratelimit
+
+
+class TestConfigure(TestCase):
+
+    def tearDown(self):
+        ratelimit.configure({})
+
+    def test_configure__disabled(self):
+        self.assertIsNone(ratelimit.configure({}))
+        self.assertIsNone(ratelimit.limiter())
+
+    def test_configure(self):
+        limiter = ratelimit.configure({
+            'GITHUB_RATE_LIMIT': True,
+            'GITHUB_REQUESTS_PER_SECOND': 2,
+            'GITHUB_REQUEST_BURST': 4,
+            'WORKSPACE': '/tmp/workspace',
+        })
+        self.assertIs(limiter, ratelimit.limiter())
+        self.assertEqual('/tmp/workspace/.github-ratelimit.json',
+                         limiter.path)
+        self.assertEqual(2.0, limiter.rate)
+        self.assertEqual(4, limiter.burst)
+        self.assertEqual(100, limiter.reserve)
+
+
+class TestRateLimiter(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'ratelimit.json')
+        self.limiter = ratelimit.RateLimiter(
+            self.path, rate=10.0, burst=2, reserve=5, max_wait=60)
+        self.now = 1000.0
+        time_patch = patch('lintreview.ratelimit.time')
+        self.time = time_patch.start()
+        self.addCleanup(time_patch.stop)
+        self.time.time.side_effect = lambda: self.now
+        self.time.sleep.side_effect = self.sleep
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def state(self):
+        return cache.read_json(self.path)
+
+    def response(self, status=200, **headers):
+        return Mock(status_code=status, headers=headers, url='/repos')
+
+    def test_acquire__burst(self):
+        self.assertEqual(0, self.limiter.acquire())
+        self.assertEqual(0, self.limiter.acquire())
+        self.assertEqual(0, self.state()['tokens'])
+        self.assertFalse(self.time.sleep.called)
+
+    def test_acquire__reads_wait_for_tokens(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+
+        waited = self.limiter.acquire('GET')
+        self.assertAlmostEqual(0.1, waited)
+
+    def test_acquire__writes_take_priority(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+
+        self.assertEqual(0, self.limiter.acquire('POST'))
+        self.assertEqual(0, self.limiter.acquire('POST'))
+        self.assertEqual(-2, self.state()['tokens'])
+
+        waited = self.limiter.acquire('GET')
+        self.assertAlmostEqual(0.3, waited)
+
+    def test_acquire__refills(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+        self.now += 5
+        self.assertEqual(0, self.limiter.acquire())
+        self.assertEqual(1, self.state()['tokens'])
+
+    def test_acquire__shared_state(self):
+        other = ratelimit.RateLimiter(self.path, rate=10.0, burst=2)
+        self.limiter.acquire()
+        other.acquire()
+        self.assertAlmostEqual(0.1, self.limiter.acquire())
+
+    def test_update__remaining(self):
+        response = self.response(**{
+            'X-RateLimit-Remaining': '4',
+            'X-RateLimit-Reset': '1030',
+        })
+        self.assertIsNone(self.limiter.update(response))
+        self.assertEqual(4, self.state()['remaining'])
+
+        self.assertEqual(0, self.limiter.acquire('PATCH'),
+                         'Writes can use the reserve')
+        self.assertEqual(30, self.limiter.acquire('GET'),
+                         'Reads wait for the reset')
+
+    def test_update__retry_after(self):
+        response = self.response(403, **{'Retry-After': '20'})
+        self.assertEqual(20, self.limiter.update(response))
+
+        self.assertEqual(20, self.limiter.acquire('POST'))
+
+    def test_update__exhausted(self):
+        response = self.response(403, **{
+            'X-RateLimit-Remaining': '0',
+            'X-RateLimit-Reset': '1010',
+        })
+        self.assertEqual(10, self.limiter.update(response))
+        self.assertEqual(10, self.limiter.acquire('POST'))
+
+    def test_update__no_headers(self):
+        self.assertIsNone(self.limiter.update(self.response()))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_acquire__max_wait(self):
+        response = self.response(429, **{'Retry-After': '3600'})
+        self.limiter.update(response)
+
+        self.assertEqual(0, self.limiter.acquire('GET'),
+                         'Sent without waiting')
+
+
+class TestRetryAfter(TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(30, ratelimit._retry_after('30', time.time()))
+
+    def test_http_date(self):
+        now = 784111777 - 60
+        value = 'Sun, 06 Nov 1994 08:49:37 GMT'
+        self.assertEqual(60, ratelimit._retry_after(value, now))
+
+    def test_invalid(self):
+        self.assertIsNone(ratelimit._retry_after('', 0))
+        self.assertIsNone(ratelimit._retry_after('soon', 0))
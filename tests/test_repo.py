@@ -8,7 +8,7 @@ from github3.pulls import PullRequest
 from github3.session import GitHubSession
 from lintreview.config import load_config
 from lintreview.repo import GithubRepository
-from lintreview.repo import GithubPullRequest
+from lintreview.repo import GithubPullRequest, ReplayIterator
 from mock import Mock, patch, sentinel
 from unittest import TestCase
 
@@ -41,6 +41,16 @@ class TestGithubRepository(TestCase):
         self.assertIsInstance(pull, GithubPullRequest,
                               'Should be wrapped object')
 
+    @patch('lintreview.repo.github')
+    def test_lintrc(self, github_mock):
+        github_mock.fetch_lintrc.return_value = '[tools]'
+        repo = GithubRepository(config, 'markstory', 'lint-test')
+        repo.repository = lambda: self.repo_model
+
+        self.assertEqual('[tools]', repo.lintrc('abc123'))
+        github_mock.fetch_lintrc.assert_called_with(
+            self.repo_model, 'abc123')
+
     def test_ensure_label__missing(self):
         model = self.repo_model
         model.label = Mock(return_value=None)
@@ -194,6 +204,38 @@ class TestGithubPullRequest(TestCase):
             data=review)
         assert self.model._json.called
 
+    def test_base(self):
+        pull = GithubPullRequest(self.model)
+        data = self.model.as_dict()
+        self.assertEqual(data['base']['sha'], pull.base)
+        self.assertEqual(data['base']['repo']['clone_url'],
+                         pull.base_clone_url)
+
+    def test_data__memoized(self):
+        self.model.as_dict = Mock(wraps=self.model.as_dict)
+        pull = GithubPullRequest(self.model)
+        self.assertEqual(pull.head, pull.data['head']['sha'])
+        pull.clone_url
+        pull.target_branch
+        pull.maintainer_can_modify
+        self.assertEqual(1, self.model.as_dict.call_count)
+
+    def test_files_commits_comments__memoized(self):
+        self.model.files = Mock(return_value=iter([sentinel.file]))
+        self.model.commits = Mock(return_value=iter([sentinel.commit]))
+        self.model.review_comments = Mock(
+            return_value=iter([sentinel.comment]))
+        pull = GithubPullRequest(self.model)
+
+        for _ in range(2):
+            self.assertEqual([sentinel.file], pull.files())
+            self.assertEqual([sentinel.commit], list(pull.commits()))
+            self.assertEqual([sentinel.comment],
+                             list(pull.review_comments()))
+        self.assertEqual(1, self.model.files.call_count)
+        self.assertEqual(1, self.model.commits.call_count)
+        self.assertEqual(1, self.model.review_comments.call_count)
+
     def test_maintainer_can_modify__same_repo(self):
         pull = GithubPullRequest(self.model)
         self.assertEqual(True, pull.maintainer_can_modify)
@@ -257,6 +299,26 @@ class TestGithubPullRequest(TestCase):
         self.assertEqual('refs/pull/1/head', pull.head_branch)
 
 
+class TestReplayIterator(TestCase):
+
+    def test_iter__reads_once(self):
+        source = Mock(side_effect=[1, 2, StopIteration])
+        items = ReplayIterator(iter(source, None))
+        self.assertEqual([1, 2], list(items))
+        self.assertEqual([1, 2], list(items))
+        self.assertEqual(3, source.call_count)
+
+    def test_iter__lazy(self):
+        source = Mock(side_effect=[1, 2, StopIteration])
+        items = ReplayIterator(iter(source, None))
+        self.assertEqual(0, source.call_count)
+
+        first = iter(items)
+        self.assertEqual(1, next(first))
+        self.assertEqual([1, 2], list(items))
+        self.assertEqual([2], list(first))
+
+
 @contextmanager
 def add_ok_label(pull_request, *labels, **kw):
     if labels:
@@ -617,6 +617,40 @@ class TestProblems(TestCase):
         assert 1 == self.problems.error_count()
         assert 2 == len(self.problems)
 
+    def test_error_count__replaced_and_removed(self):
+        self.problems.add(Comment('some/file.py', 10, 10, 'Thing is wrong'))
+        self.problems.add(InfoComment('some content'))
+        self.problems.add(Comment('some/file.py', 12, 12, 'Not good'))
+        self.assertEqual(2, self.problems.error_count())
+
+        # Replacing a problem with the same key doesn't count twice.
+        self.problems.add(Comment('some/file.py', 10, 10, 'Other thing'))
+        self.assertEqual(2, self.problems.error_count())
+        self.assertEqual(3, len(self.problems))
+
+        self.problems.remove(Comment('some/file.py', 12, 12, 'Not good'))
+        self.assertEqual(1, self.problems.error_count())
+        self.assertEqual(2, len(self.problems))
+
+    def test_remove(self):
+        self.problems.add('file.py', 10, 'Not good', 10)
+        self.problems.add('file.py', 11, 'Not good', 11)
+        self.problems.add(IssueComment('Tool failed'))
+
+        self.problems.remove(Comment('file.py', 10, 10, 'Not good'))
+        self.problems.remove(IssueComment('Tool failed'))
+        result = self.problems.all()
+        self.assertEqual([Comment('file.py', 11, 11, 'Not good')], result)
+
+    def test_remove__different_body(self):
+        self.problems.add('file.py', 10, 'Not good', 10)
+        self.problems.add('file.py', 10, 'Also bad', 10)
+
+        self.problems.remove(Comment('file.py', 10, 10, 'Not good'))
+        self.problems.remove(Comment('file.py', 11, 11, 'Not good'))
+        self.assertEqual(1, len(self.problems))
+        self.assertEqual(1, self.problems.error_count())
+
     def test_limit_to_changes__remove_problems(self):
         res = [
             PullFile(f, self.session) for f in json.loads(self.two_files_json)
@@ -656,6 +690,7 @@ class TestProblems(TestCase):
             Comment(filename_2, 3, 3, 'Something bad')
         ]
         self.assertEqual(result, expected)
+        self.assertEqual(3, self.problems.error_count())
 
     def test_limit_to_changes__first_line_in_diff(self):
         res = [
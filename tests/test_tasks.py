@@ -0,0 +1,34 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from mock import Mock, patch
+
+from github3.exceptions import NotFoundError, ServerError
+import lintreview.tasks as tasks
+
+
+def error_response(status):
+    return Mock(status_code=status, headers={}, content=b'{}')
+
+
+class TestReviewPullRequest(TestCase):
+
+    def setUp(self):
+        patcher = patch('lintreview.tasks.GithubRepository')
+        self.repo = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = patch('lintreview.tasks.Processor')
+        self.processor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pull_request_errors_raise(self):
+        self.repo.pull_request.side_effect = ServerError(error_response(502))
+        with self.assertRaises(ServerError):
+            tasks.review_pull_request(Mock(), 'markstory', 'lint-test', 1,
+                                      None)
+        self.assertFalse(self.processor.called)
+
+    def test_lintrc_missing(self):
+        self.repo.lintrc.side_effect = NotFoundError(error_response(404))
+        tasks.review_pull_request(Mock(), 'markstory', 'lint-test', 1, None)
+        self.assertTrue(self.repo.pull_request.called)
+        self.assertFalse(self.processor.called)
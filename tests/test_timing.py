@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+import json
+import threading
+from unittest import TestCase
+
+import lintreview.timing as timing
+from mock import patch
+
+
+class TestTiming(TestCase):
+
+    def test_span__not_recording(self):
+        self.assertIsNone(timing.current())
+        with timing.span('clone'):
+            pass
+        timing.count('files', 3)
+        self.assertIsNone(timing.current())
+
+    @patch('lintreview.timing.time')
+    def test_span(self, mock_time):
+        mock_time.time.side_effect = [0, 1, 3, 10, 14, 20]
+        with timing.record() as timings:
+            with timing.span('clone'):
+                pass
+            with timing.span('flake8', timing.TOOLS):
+                pass
+        self.assertIsNone(timing.current())
+        self.assertEqual(
+            {'count': 1, 'seconds': 2},
+            timings.spans[timing.STAGES]['clone'])
+        self.assertEqual(
+            {'count': 1, 'seconds': 4},
+            timings.spans[timing.TOOLS]['flake8'])
+
+    def test_span__exception(self):
+        with timing.record() as timings:
+            with self.assertRaises(ValueError):
+                with timing.span('clone'):
+                    raise ValueError('bad')
+        self.assertEqual(1, timings.spans[timing.STAGES]['clone']['count'])
+
+    def test_span__threads(self):
+        def work():
+            for _ in range(50):
+                with timing.span('python3', timing.DOCKER):
+                    pass
+        with timing.record() as timings:
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(200, timings.spans[timing.DOCKER]['python3']['count'])
+
+    def test_timed(self):
+        @timing.timed(timing.GIT, lambda command: ' '.join(command[0:2]))
+        def process(command):
+            return 'done'
+
+        @timing.timed(timing.STAGES, 'publish')
+        def publish():
+            return 'published'
+
+        with timing.record() as timings:
+            self.assertEqual('done', process(['git', 'clone', 'url']))
+            self.assertEqual('done', process(['git', 'clone', 'url']))
+            self.assertEqual('published', publish())
+        self.assertEqual(2, timings.spans[timing.GIT]['git clone']['count'])
+        self.assertEqual(1, timings.spans[timing.STAGES]['publish']['count'])
+
+    def test_summary(self):
+        with timing.record() as timings:
+            with timing.span('clone'):
+                pass
+            timing.count('files', 3)
+            timing.count('problems', 7)
+        summary = timings.summary(pull='markstory/lint-test/1')
+
+        data = json.loads(json.dumps(summary))
+        self.assertEqual('markstory/lint-test/1', data['pull'])
+        self.assertEqual(1, data['stages']['clone']['count'])
+        self.assertEqual(3, data['files'])
+        self.assertEqual(7, data['problems'])
+        self.assertIn('seconds', data)
+
+    def test_record__nested(self):
+        with timing.record() as outer:
+            with timing.record() as inner:
+                self.assertIs(inner, timing.current())
+            self.assertIs(outer, timing.current())
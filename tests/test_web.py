@@ -1,5 +1,5 @@
 from lintreview import web
-from mock import patch, Mock
+from mock import ANY, patch
 from unittest import TestCase
 import json
 
@@ -76,58 +76,28 @@ class WebTest(TestCase):
             self.assertEqual('', res.data.decode('utf-8'))
             self.assertFalse(task.called)
 
-    @patch('lintreview.web.get_lintrc')
     @patch('lintreview.web.process_pull_request')
-    def test_start_request_fail_on_lint_rc_file(self, task, lintrc):
-        lintrc.side_effect = IOError()
-
-        data = json.dumps(test_data)
-        self.app.post('/review/start',
-                      content_type='application/json',
-                      data=data,
-                      headers={
-                          'X-Github-Event': 'pull_request'
-                      })
-        self.assertFalse(task.called, 'No task should have been queued')
-
-    @patch('lintreview.web.get_repository')
-    @patch('lintreview.web.get_lintrc')
-    @patch('lintreview.web.process_pull_request')
-    def test_start_review_schedule_job(self, task, lintrc, get_repo):
-        get_repo.return_value = Mock()
-
+    def test_start_review_schedule_job(self, task):
         opened = test_data.copy()
         opened['action'] = 'opened'
         data = json.dumps(opened)
 
-        lintrc.return_value = """
-[tools]
-linters = pep8"""
-
         res = self.app.post('/review/start',
                             content_type='application/json',
                             data=data,
                             headers={
                                 'X-Github-Event': 'pull_request'
                             })
-        self.assertTrue(task.delay.called, 'Process request should be called')
+        task.delay.assert_called_with('mark', 'testing', '3', queued_at=ANY)
         self.assertEqual(204, res.status_code)
         self.assertEqual('', res.data.decode('utf-8'))
 
-    @patch('lintreview.web.get_repository')
-    @patch('lintreview.web.get_lintrc')
     @patch('lintreview.web.process_pull_request')
-    def test_start_review_schedule_job__on_reopened(self, task, lintrc,
-                                                    get_repo):
-        get_repo.return_value = Mock()
+    def test_start_review_schedule_job__on_reopened(self, task):
         reopened = test_data.copy()
         reopened['action'] = 'reopened'
         data = json.dumps(reopened)
 
-        lintrc.return_value = """
-[tools]
-linters = pep8"""
-
         res = self.app.post('/review/start',
                             content_type='application/json',
                             data=data,
@@ -137,3 +107,61 @@ linters = pep8"""
         self.assertTrue(task.delay.called, 'Process request should be called')
         self.assertEqual(204, res.status_code)
         self.assertEqual('', res.data.decode('utf-8'))
+
+    @patch('lintreview.web.process_pull_request')
+    def test_start_review__publish_failure(self, task):
+        task.delay.side_effect = IOError('broker unavailable')
+        opened = test_data.copy()
+        opened['action'] = 'opened'
+        data = json.dumps(opened)
+
+        res = self.app.post('/review/start',
+                            content_type='application/json',
+                            data=data,
+                            headers={
+                                'X-Github-Event': 'pull_request'
+                            })
+        self.assertEqual(500, res.status_code)
+
+    @patch('lintreview.web.metrics.flush')
+    @patch('lintreview.web.process_pull_request')
+    def test_start_review__records_action(self, task, flush):
+        before = web.metrics.WEBHOOKS.values.get(('closed',), 0)
+        closed = test_data.copy()
+        closed['action'] = 'closed'
+        self.app.post('/review/start',
+                      content_type='application/json',
+                      data=json.dumps(closed),
+                      headers={
+                          'X-Github-Event': 'pull_request'
+                      })
+        after = web.metrics.WEBHOOKS.values.get(('closed',), 0)
+        self.assertEqual(1, after - before)
+        flush.assert_called_with(max_age=web.metrics.FLUSH_INTERVAL)
+
+    @patch('lintreview.web.metrics.flush')
+    @patch('lintreview.web.process_pull_request')
+    def test_start_review__unknown_action(self, task, flush):
+        before = web.metrics.WEBHOOKS.values.get(('other',), 0)
+        unknown = test_data.copy()
+        unknown['action'] = 'made_up_action'
+        self.app.post('/review/start',
+                      content_type='application/json',
+                      data=json.dumps(unknown),
+                      headers={
+                          'X-Github-Event': 'pull_request'
+                      })
+        after = web.metrics.WEBHOOKS.values.get(('other',), 0)
+        self.assertEqual(1, after - before)
+        self.assertNotIn(('made_up_action',), web.metrics.WEBHOOKS.values)
+
+    @patch('lintreview.web.metrics.collect')
+    def test_metrics(self, collect):
+        collect.return_value = {
+            'lintreview_webhooks_total': {('opened',): 3},
+        }
+        res = self.app.get('/metrics')
+        self.assertEqual(200, res.status_code)
+        self.assertIn('text/plain', res.headers['Content-Type'])
+        body = res.data.decode('utf-8')
+        self.assertIn('lintreview_webhooks_total{action="opened"} 3', body)
@@ -242,8 +242,8 @@ class TestEslint(TestCase):
         self.assertTrue(docker.image_exists('eslint'),
                         'original image is present')
 
-        for image in docker.images():
-            self.assertNotIn('eslint-', image, 'no eslint image remains')
+        image = tool.get_image_name([target])
+        self.assertTrue(docker.image_exists(image), 'plugin image is cached')
 
     @requires_image('eslint')
     def test_execute_fixer__install_plugins(self):
@@ -264,11 +264,11 @@ class TestEslint(TestCase):
         read_and_restore_file(target, original)
         self.assertEqual(0, len(self.problems.all()),
                          'All errors should be autofixed')
-        for image in docker.images():
-            self.assertNotIn('eslint-', image, 'no eslint image remains')
+        image = tool.get_image_name(['fixer_errors.js'])
+        self.assertTrue(docker.image_exists(image), 'plugin image is cached')
 
     @requires_image('eslint')
-    def test_execute__install_plugins_cleanup_image_on_failure(self):
+    def test_execute__install_plugins_keeps_image_on_failure(self):
         custom_dir = root_dir + '/tests/fixtures/eslint_custom'
         tool = Eslint(self.problems, {
             'config': 'invalid.json',
@@ -287,5 +287,5 @@ class TestEslint(TestCase):
 
         self.assertTrue(docker.image_exists('eslint'),
                         'original image is present')
-        for image in docker.images():
-            self.assertNotIn('eslint-', image, 'no eslint image remains')
+        image = tool.get_image_name([target])
+        self.assertTrue(docker.image_exists(image), 'plugin image is cached')
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 
 from unittest import TestCase
 
+from mock import patch
+
 from lintreview.review import Problems
 from lintreview.tools.flake8 import Flake8
 import lintreview.docker as docker
@@ -84,8 +86,22 @@ class TestFlake8(TestCase):
         self.tool.process_files([self.fixtures[1]])
         problems = self.problems.all(self.fixtures[1])
         self.assertIn('isort', problems[0].body)
-        for image in docker.images():
-            self.assertNotIn('flake8-', image, 'no flake8 image remains')
+        image = self.tool.get_image_name([self.fixtures[1]])
+        self.assertTrue(docker.image_exists(image), 'plugin image is cached')
+
+    @patch('lintreview.docker.cached_image_name')
+    @patch('lintreview.docker.build_cached_image')
+    def test_get_image_name__install_failed(self, build, name):
+        name.return_value = 'flake8-abc'
+        build.side_effect = docker.CommandError(
+            'ERROR: No matching distribution found for flake8-isort', 1)
+        self.tool.options['plugins'] = ['flake8-isort']
+
+        self.assertEqual('python2', self.tool.get_image_name([]))
+        problems = self.problems.all()
+        self.assertEqual(1, len(problems))
+        self.assertIn('Failed to install flake8-isort', problems[0].body)
+        self.assertIn('No matching distribution', problems[0].body)
 
     @requires_image('python2')
     def test_process_files_with_plugin_invalid_type(self):
@@ -139,8 +155,8 @@ class TestFlake8(TestCase):
         self.tool.process_files([self.fixtures[1]])
         problems = self.problems.all(self.fixtures[1])
         assert 'B004' in problems[-1].body
-        for image in docker.images():
-            self.assertNotIn('flake8-', image, 'no flake8 image remains')
+        image = self.tool.get_image_name([self.fixtures[1]])
+        self.assertTrue(docker.image_exists(image), 'plugin image is cached')
 
     @requires_image('python2')
     def test_config_options_and_process_file(self):
@@ -89,8 +89,8 @@ class TestPhpcs(TestCase):
         problems = self.problems.all(self.fixtures[1])
         assert 'strict_types' in problems[0].body, 'Should use custom rules'
 
-        for image in docker.images():
-            self.assertNotIn('phpcs-', image, 'no phpcs image remains')
+        image = tool.get_image_name([self.fixtures[1]])
+        self.assertTrue(docker.image_exists(image), 'package image is cached')
 
     @requires_image('php')
     def test_process_files__with_ignore(self):
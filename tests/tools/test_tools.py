@@ -1,13 +1,22 @@
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import time
 from unittest import TestCase
 from mock import Mock, patch
 
+import lintreview.cache as cache
+
+import lintreview.docker as docker
 import lintreview.tools as tools
 from lintreview.config import ReviewConfig, build_review_config
-from lintreview.docker import TimeoutError
-from lintreview.review import Review, Problems, Comment
-from lintreview.tools import pep8, jshint
+from lintreview.docker import OutputStream, TimeoutError
+from lintreview.review import Review, Problems, Comment, IssueComment
+from lintreview.tools import pep8, jshint, pytype
 from tests import root_dir, fixtures_path, requires_image
+from xml.etree import ElementTree
 
 import github3
 
@@ -107,6 +116,117 @@ class TestToolBase(TestCase):
         result = tool.apply_base('../../../comments_current.json')
         self.assertEqual(result, 'comments_current.json')
 
+    def test_shard_files__disabled(self):
+        tool = tools.Tool(Problems(), {}, fixtures_path)
+        files = ['/src/a.py', '/src/b.py']
+        self.assertEqual([files], tool.shard_files(files))
+
+        tool = tools.Tool(Problems(), {'shards': 'derp'}, fixtures_path)
+        self.assertEqual([files], tool.shard_files(files))
+
+    def test_shard_files__balanced_by_size(self):
+        tool = tools.Tool(Problems(), {'shards': '2'}, fixtures_path)
+        sizes = {
+            '/src/big.py': 100,
+            '/src/medium.py': 60,
+            '/src/small.py': 30,
+            '/src/tiny.py': 10,
+        }
+        tool._file_size = lambda filename: sizes[filename]
+
+        shards = tool.shard_files(sorted(sizes.keys()))
+        self.assertEqual(2, len(shards))
+        self.assertEqual(['/src/big.py'], shards[0])
+        self.assertEqual(['/src/medium.py', '/src/small.py', '/src/tiny.py'], shards[1])
+
+    def test_shard_files__more_shards_than_files(self):
+        tool = tools.Tool(Problems(), {'shards': 8}, fixtures_path)
+        shards = tool.shard_files(['/src/a.py', '/src/b.py'])
+        self.assertEqual(2, len(shards))
+
+    def test_shard_files__count(self):
+        tool = tools.Tool(Problems(), {'shards': 1000}, fixtures_path)
+        files = ['/src/{}.py'.format(i) for i in range(10)]
+        self.assertEqual(10, len(tool.shard_files(files)))
+
+        shards = tool.shard_files(files, 3)
+        self.assertEqual(3, len(shards))
+        self.assertEqual(files, sorted(sum(shards, []), key=files.index))
+        self.assertEqual([files], tool.shard_files(files, 1))
+
+    def test_shard_files__empty_files(self):
+        tool = tools.Tool(Problems(), {'shards': 2}, fixtures_path)
+        shards = tool.shard_files(['/src/a.py', '/src/b.py', '/src/c.py', '/src/d.py'])
+        self.assertEqual([2, 2], [len(shard) for shard in shards])
+
+    def test_shard_files__not_shardable(self):
+        tool = pytype.Pytype(Problems(), {'shards': 2}, fixtures_path)
+        files = ['/src/a.py', '/src/b.py']
+        self.assertEqual([files], tool.shard_files(files))
+
+    def test_execute__shards(self):
+        problems = Problems()
+        tool = tools.Tool(problems, {'shards': 2}, fixtures_path)
+        tool.budget = tools.ContainerBudget(2)
+        tool.process_files = Mock()
+        tool.process_files.side_effect = lambda files: problems.add(
+            files[0], 1, 'error')
+
+        tool.execute(['/src/a.py', '/src/b.py', '/src/c.py'])
+
+        self.assertEqual(2, tool.process_files.call_count)
+        linted = []
+        for call in tool.process_files.call_args_list:
+            linted.extend(call[0][0])
+        self.assertEqual(['/src/a.py', '/src/b.py', '/src/c.py'], sorted(linted))
+        self.assertEqual(2, len(problems))
+
+    def test_execute__shards_need_budget(self):
+        tool = tools.Tool(Problems(), {'shards': 4}, fixtures_path)
+        tool.process_files = Mock()
+        tool.execute(['/src/a.py', '/src/b.py'])
+        self.assertEqual(1, tool.process_files.call_count)
+
+        tool.budget = tools.ContainerBudget(2)
+        with tool.budget.slot():
+            tool.execute(['/src/a.py', '/src/b.py'])
+        self.assertEqual(3, tool.process_files.call_count,
+                         'Only one free slot for an extra shard')
+
+    def test_run__peak_containers(self):
+        running = {'now': 0, 'peak': 0}
+        lock = threading.Lock()
+        linted = []
+
+        def process_files(files):
+            with lock:
+                running['now'] += 1
+                running['peak'] = max(running['peak'], running['now'])
+                linted.extend(files)
+            time.sleep(0.05)
+            with lock:
+                running['now'] -= 1
+
+        tool_list = []
+        for _ in range(3):
+            tool = tools.Tool(Problems(), {'shards': 4}, fixtures_path)
+            tool.process_files = process_files
+            tool_list.append(tool)
+        files = ['src/{}.py'.format(i) for i in range(8)]
+        tools.run(tool_list, files, [], 3)
+
+        self.assertLessEqual(running['peak'], 3)
+        self.assertGreater(running['peak'], 1)
+        self.assertEqual(24, len(linted))
+
+    def test_container_budget(self):
+        budget = tools.ContainerBudget(3)
+        with budget.slot():
+            self.assertEqual(2, budget.reserve(5))
+            self.assertEqual(0, budget.reserve(1))
+            budget.release(2)
+        self.assertEqual(3, budget.reserve(3))
+
     @requires_image('python2')
     def test_run(self):
         config = build_review_config(simple_ini)
@@ -143,6 +263,248 @@ class TestToolBase(TestCase):
         assert 'timed out during' in errors[0].body
         assert 'run pep8 linter' in errors[0].body
 
+    @patch('lintreview.docker.run')
+    def test_run__applies_limits(self, mock_docker):
+        limits = []
+        mock_docker.side_effect = lambda *args, **kwargs: limits.append(
+            docker.current_limits()) or ''
+        config = build_review_config(simple_ini, {'TOOL_TIMEOUT': 30})
+        problems = Problems()
+        files = ['./tests/fixtures/pep8/has_errors.py']
+        tool_list = tools.factory(config, problems, root_dir)
+        tools.run(tool_list, files, [])
+
+        self.assertEqual([{'timeout': 30}], limits)
+        self.assertEqual({}, docker.current_limits())
+
+    @patch('lintreview.docker.run')
+    def test_run__resource_limit_error(self, mock_docker):
+        mock_docker.side_effect = docker.ResourceLimitError(
+            'The container exceeded its memory limit of 1024 bytes.')
+        config = build_review_config(simple_ini)
+        problems = Problems()
+        files = ['./tests/fixtures/pep8/has_errors.py']
+        tool_list = tools.factory(config, problems, root_dir)
+        tools.run(tool_list, files, [])
+
+        errors = problems.all()
+        self.assertEqual(1, len(errors))
+        self.assertIn('run pep8 linter', errors[0].body)
+        self.assertIn('memory limit of 1024 bytes', errors[0].body)
+
+    def test_needs_full_checkout(self):
+        problems = Problems()
+        self.assertFalse(tools.Tool(problems, {}).needs_full_checkout())
+        self.assertTrue(pytype.Pytype(problems, {}).needs_full_checkout())
+
+        tool = tools.Tool(problems, {'full_checkout': 'yes'})
+        self.assertTrue(tool.needs_full_checkout())
+
+        tool = tools.Tool(problems, {'full_checkout': 'nope'})
+        self.assertFalse(tool.needs_full_checkout())
+
+    def test_checkout_paths(self):
+        problems = Problems()
+        self.assertEqual([], tools.Tool(problems, {}).checkout_paths())
+
+        tool = tools.Tool(problems, {'config': 'build/phpcs.xml'})
+        self.assertEqual(['build'], tool.checkout_paths())
+
+        tool = tools.Tool(problems, {'config': '../outside.xml'})
+        self.assertEqual([], tool.checkout_paths())
+
+    def test_check_truncated(self):
+        problems = Problems()
+        tool = tools.Tool(problems, {}, root_dir)
+        tool.name = 'flake8'
+
+        tool.check_truncated(OutputStream([]))
+        self.assertEqual(0, len(problems))
+
+        output = OutputStream([b'one\ntwo\n'], max_lines=1)
+        list(output)
+        tool.check_truncated(output)
+        errors = problems.all()
+        self.assertEqual(1, len(errors))
+        self.assertIn('`flake8` linter was too large', errors[0].body)
+        self.assertIn('after 1 lines', errors[0].body)
+
+    def test_run__concurrent(self):
+        problems = Problems()
+        files = ['a.py', 'b.py']
+        commits = [Mock()]
+
+        tool_list = []
+        for i in range(3):
+            tool = Mock(spec=tools.Tool, problems=problems)
+            tool.execute.side_effect = lambda files, n=i: problems.add(
+                'a.py', n + 1, 'error %s' % n)
+            tool_list.append(tool)
+
+        tools.run(tool_list, files, commits, max_workers=2)
+
+        for tool in tool_list:
+            tool.execute.assert_called_with(['/src/a.py', '/src/b.py'])
+            tool.execute_commits.assert_called_with(commits)
+        self.assertEqual(3, len(problems))
+
+    def test_run__concurrent_raises_errors(self):
+        problems = Problems()
+        good = Mock(spec=tools.Tool, problems=problems)
+        bad = Mock(spec=tools.Tool, problems=problems)
+        bad.execute.side_effect = RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            tools.run([good, bad], ['a.py'], [], max_workers=2)
+
+
+class FakeTool(tools.Tool):
+
+    name = 'fake'
+
+    def match_file(self, filename):
+        return filename.endswith('.py')
+
+    def process_files(self, files):
+        self.processed.append(files)
+        docker.run('python2', ['lint'] + files, self.base_path)
+        for filename in files:
+            self.problems.add(docker.strip_base(filename), 1, 'Bad code')
+
+
+class TestCachedResults(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.tmp_dir, 'repo')
+        os.makedirs(os.path.join(self.repo, 'lib'))
+        for name in ('a.py', 'b.py'):
+            self.write(os.path.join('lib', name), 'import os\n')
+        self.write('setup.cfg', '[flake8]\n')
+
+        cache.configure_results({
+            'RESULT_CACHE': True,
+            'RESULT_CACHE_DIR': os.path.join(self.tmp_dir, 'results'),
+        })
+        self.run_patcher = patch('lintreview.docker.run')
+        self.run_patcher.start().side_effect = \
+            lambda image, *args, **kwargs: docker._record_image(image)
+        self.image_patcher = patch('lintreview.docker.image_id')
+        self.image_id = self.image_patcher.start()
+        self.image_id.return_value = 'sha256:abc'
+        self.files = ['/src/lib/a.py', '/src/lib/b.py']
+
+    def tearDown(self):
+        self.run_patcher.stop()
+        self.image_patcher.stop()
+        cache.configure_results({})
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.repo, name), 'w') as f:
+            f.write(content)
+
+    def execute(self, options=None):
+        problems = Problems()
+        tool = FakeTool(problems, options or {}, self.repo)
+        tool.processed = []
+        tool.execute(self.files)
+        return tool, problems
+
+    def test_execute__replays_cached(self):
+        tool, problems = self.execute()
+        self.assertEqual([self.files], tool.processed)
+        self.assertEqual(2, len(problems))
+
+        tool, problems = self.execute()
+        self.assertEqual([], tool.processed)
+        self.assertEqual(2, len(problems))
+        self.assertEqual('Bad code', problems.all('lib/a.py')[0].body)
+
+    def test_execute__changed_file(self):
+        self.execute()
+        self.write(os.path.join('lib', 'b.py'), 'import sys\n')
+
+        tool, problems = self.execute()
+        self.assertEqual([['/src/lib/b.py']], tool.processed)
+        self.assertEqual(2, len(problems))
+
+    def test_execute__changed_config_or_options(self):
+        self.execute()
+        self.write('setup.cfg', '[flake8]\nignore = F401\n')
+        tool, _ = self.execute()
+        self.assertEqual([self.files], tool.processed)
+
+        tool, _ = self.execute({'ignore': 'E123'})
+        self.assertEqual([self.files], tool.processed)
+
+    def test_execute__changed_nested_config(self):
+        self.write(os.path.join('lib', 'tox.ini'), '[flake8]\n')
+        self.execute()
+        self.write(os.path.join('lib', 'tox.ini'), '[flake8]\nignore = F401\n')
+        tool, _ = self.execute()
+        self.assertEqual([self.files], tool.processed)
+
+        self.write(os.path.join('lib', 'c.py'), 'import os\n')
+        tool, _ = self.execute()
+        self.assertEqual([], tool.processed,
+                         'Other files in directories are not config')
+
+    def test_execute__changed_image(self):
+        self.execute()
+        self.image_id.return_value = 'sha256:def'
+        tool, _ = self.execute()
+        self.assertEqual([self.files], tool.processed)
+
+    def test_execute__errors_not_cached(self):
+        problems = Problems()
+        tool = FakeTool(problems, {}, self.repo)
+        tool.processed = []
+        tool.process_files = lambda files: tool.problems.add(
+            IssueComment('Tool failed'))
+        tool.execute(self.files)
+
+        tool, _ = self.execute()
+        self.assertEqual([self.files], tool.processed)
+
+    def test_execute__relative_paths(self):
+        problems = Problems()
+        tool = FakeTool(problems, {}, self.repo)
+        tool.processed = []
+        tool.process_files = lambda files: tool.problems.add(
+            './lib/a.py', 1, 'Bad code')
+        tool.execute(self.files)
+
+        tool, problems = self.execute()
+        self.assertEqual([], tool.processed)
+        self.assertEqual(1, len(problems))
+        self.assertEqual('Bad code', problems.all('lib/a.py')[0].body)
+
+    def test_execute__unknown_paths_not_cached(self):
+        problems = Problems()
+        tool = FakeTool(problems, {}, self.repo)
+        tool.processed = []
+        tool.process_files = lambda files: tool.problems.add(
+            'build/lib/a.py', 1, 'Bad code')
+        tool.execute(self.files)
+
+        tool, _ = self.execute()
+        self.assertEqual([self.files], tool.processed)
+
+    def test_relative_path(self):
+        tool = FakeTool(Problems(), {}, self.repo)
+        results = tools.CachedResults(tool, cache.results())
+        host_path = os.path.join(self.repo, 'lib', 'a.py')
+        for name in ('/src/lib/a.py', './lib/a.py', 'lib/./a.py', host_path):
+            self.assertEqual('lib/a.py', results.relative_path(name))
+
+    def test_can_cache(self):
+        problems = Problems()
+        self.assertTrue(FakeTool(problems, {}, self.repo).can_cache())
+        self.assertFalse(FakeTool(problems, {'cache': 'no'}, self.repo).can_cache())
+        self.assertFalse(FakeTool(problems, {}).can_cache())
+        self.assertFalse(pytype.Pytype(problems, {}, self.repo).can_cache())
+
 
 class TestPythonImage(TestCase):
     def test(self):
@@ -218,6 +580,71 @@ class TestProcessCheckstyle(TestCase):
         assert errors[0].line == Comment.FIRST_LINE_IN_DIFF
         assert errors[0].body == 'Not good'
 
+    def test_process__chunks(self):
+        problems = Problems()
+        chunks = [
+            '<?xml version="1.0" encoding="utf-8"?><checkstyle><file na',
+            'me="things.py"><error line="1" message="Not ',
+            'good" /></file><file name="other.py">',
+            '<error line="3" message="Bad" /></file></checkstyle>',
+        ]
+        tools.process_checkstyle(problems, iter(chunks), lambda x: x)
+        self.assertEqual(2, len(problems))
+        self.assertEqual('Not good', problems.all('things.py')[0].body)
+        self.assertEqual(3, problems.all('other.py')[0].line)
+
+    def test_process__trailing_text(self):
+        problems = Problems()
+        xml = """<checkstyle>
+      <file name="things.py">
+        <error line="1" message="Not good" />
+      </file>
+    </checkstyle>
+    Checkstyle ends with 1 errors.
+    """
+        tools.process_checkstyle(problems, xml, lambda x: x)
+        self.assertEqual(1, len(problems))
+
+    def test_process__malformed(self):
+        problems = Problems()
+        xml = """<checkstyle>
+      <file name="things.py">
+        <error line="1" message="Not good" />
+      <fi
+    """
+        with self.assertRaises(ElementTree.ParseError):
+            tools.process_checkstyle(problems, xml, lambda x: x)
+        self.assertEqual(1, len(problems))
+
+
+class TestProcessPmd(TestCase):
+    def test_process(self):
+        problems = Problems()
+        xml = """<?xml version="1.0" encoding="UTF-8" ?>
+<pmd version="@project.version@" timestamp="2020-01-01T00:00:00+00:00">
+  <file name="/src/Test.php">
+    <violation beginline="3" endline="3" rule="UnusedLocalVariable"
+        externalInfoUrl="https://phpmd.org/rules/unusedcode.html">
+      Avoid unused local variables such as '$foo'.
+    </violation>
+    <violation rule="NoLine">Dropped</violation>
+  </file>
+</pmd>
+"""
+        tools.process_pmd(problems, xml.splitlines(True), lambda x: x[5:])
+        self.assertEqual(1, len(problems))
+        error = problems.all('Test.php')[0]
+        self.assertEqual(3, error.line)
+        self.assertEqual(
+            "UnusedLocalVariable: Avoid unused local variables such as "
+            "'$foo'. See: https://phpmd.org/rules/unusedcode.html",
+            error.body)
+
+    def test_process__empty(self):
+        problems = Problems()
+        tools.process_pmd(problems, '', lambda x: x)
+        self.assertEqual(0, len(problems))
+
 
 class ProcessQuickfix(TestCase):
     def test(self):